@@ -0,0 +1,60 @@
+""" Per-query planning overhead of ``compute`` on small in-memory data
+
+Compares the memoized dispatch resolution in ``blaze.compute.core`` against
+probing every ``compute_down``/``compute_up`` call with a failed dispatch, as
+was done before.
+
+    $ python bench/bench_compute_overhead.py
+"""
+from __future__ import absolute_import, division, print_function
+
+import timeit
+
+import numpy as np
+import pandas as pd
+
+import blaze.compute.core as core
+from blaze import symbol, compute, by
+
+
+t = symbol('t', 'var * {name: string, amount: int64, id: int64}')
+
+data = {'list': [('Alice', 100, 1), ('Bob', 200, 2), ('Alice', 50, 3)],
+        'DataFrame': pd.DataFrame([('Alice', 100, 1), ('Bob', 200, 2),
+                                   ('Alice', 50, 3)],
+                                  columns=['name', 'amount', 'id']),
+        'ndarray': np.array([('Alice', 100, 1), ('Bob', 200, 2),
+                             ('Alice', 50, 3)],
+                            dtype=[('name', 'U7'), ('amount', 'i8'),
+                                   ('id', 'i8')])}
+
+queries = {'reduction': t.amount.sum() + 1,
+           'selection': t[t.amount > 75].id.count(),
+           'by': by(t.name, total=t.amount.sum())}
+
+
+def per_query(expr, d, number=1000):
+    """ Mean seconds spent in one call to ``compute`` """
+    return min(timeit.repeat(lambda: compute(expr, {t: d}),
+                             number=number, repeat=3)) / number
+
+
+def main():
+    memoized = core.implemented
+
+    print('%-12s %-10s %14s %14s' % ('query', 'data', 'before (us)',
+                                     'after (us)'))
+    for qname, expr in sorted(queries.items()):
+        for dname, d in sorted(data.items()):
+            core.implemented = lambda func, *args: True
+            try:
+                before = per_query(expr, d)
+            finally:
+                core.implemented = memoized
+            after = per_query(expr, d)
+            print('%-12s %-10s %14.1f %14.1f' % (qname, dname, before * 1e6,
+                                                 after * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,324 @@
-from datashape import dshape, discover
+import atexit
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections import Iterator, MutableMapping, OrderedDict
+
+from datashape import dshape, discover, Option
+from datashape.typesets import floating
 from datashape.predicates import isscalar, isrecord, iscollection
 import numpy as np
 import pandas as pd
 from .dispatch import dispatch
-from .expr import Expr, Field, symbol, ndim
+from .expr import Expr, Field, Projection, By, Summary, symbol, ndim
 from .compute import compute
-from .compatibility import unicode
-from collections import Iterator
-from odo import into
+from .compatibility import unicode, map, _strtypes
+from .utils import available_memory, nbytes
+from odo import Chunks, into
+from toolz import concat, partition_all
+
+
+class Entry(object):
+    """ A cached value and what the cache knows about it """
+    __slots__ = ('value', 'nbytes', 'cost', 'tags', 'expires', 'hits', 'last',
+                 'path')
+
+    def __init__(self, value, nbytes, cost, tags, expires, last):
+        self.value = value
+        self.nbytes = nbytes
+        self.cost = cost
+        self.tags = tags
+        self.expires = expires
+        self.hits = 0
+        self.last = last
+        self.path = None  # set while spilled to disk
+
+
+# Eviction policies score entries, the lowest score leaves memory first
+
+def lru(entry):
+    """ Least recently used """
+    return entry.last
+
+
+def lfu(entry):
+    """ Least frequently used, then least recently used """
+    return entry.hits, entry.last
+
+
+def cost(entry):
+    """ Cheapest to recompute per byte of memory, counting every use """
+    return (entry.hits + 1) * entry.cost / max(entry.nbytes, 1), entry.last
+
+
+policies = {'lru': lru, 'lfu': lfu, 'cost': cost}
+
+
+def spill(value, dirname):
+    """ Write ``value`` to a new file in ``dirname``, return the path """
+    array = isinstance(value, np.ndarray) and not value.dtype.hasobject
+    fd, path = tempfile.mkstemp(suffix='.npy' if array else '.pkl',
+                                dir=dirname)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if array:
+                np.save(f, value)
+            else:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except:
+        os.remove(path)
+        raise
+    return path
+
+
+def remove_on_exit(obj, dirname):
+    """ Remove directory ``dirname`` once ``obj`` is garbage, or at exit """
+    if hasattr(weakref, 'finalize'):
+        weakref.finalize(obj, shutil.rmtree, dirname, True)
+    else:  # Python 2
+        atexit.register(shutil.rmtree, dirname, True)
+
+
+def unspill(path):
+    if path.endswith('.npy'):
+        return np.load(path)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+class Cache(MutableMapping):
+    """ A memory bounded mapping that evicts entries past a budget
+
+    Parameters
+    ----------
+
+    nbytes: int, optional
+        Budget on the total size of the values in memory, see
+        ``blaze.utils.nbytes``
+    ttl: float, optional
+        Seconds after which entries expire
+    policy: str or callable, optional
+        Which entries to evict first, one of
+
+        * ``'lru'``: least recently used, the default
+        * ``'lfu'``: least frequently used
+        * ``'cost'``: cheapest to recompute per byte, using the ``cost`` given
+          to ``put``, e.g. the seconds it took to compute
+
+        or a function scoring an ``Entry``, lowest first
+    spill: str or True, optional
+        Directory in which evicted values are written rather than dropped,
+        True for the system's temporary directory.  Each cache writes to its
+        own private subdirectory, removed when the cache is garbage collected
+        or the interpreter exits.  Spilled values are read back, and count
+        against the budget again, when next used.
+
+        Values other than plain NumPy arrays are pickled, and unpickling runs
+        arbitrary code.  Whoever can write to the spill directory can run
+        code in this process, so only spill to directories that you trust.
+
+    Entries may carry tags, such as the names of the datasets from which they
+    were computed, by which they are invalidated together.
+
+    >>> c = Cache(nbytes=200)
+    >>> c.put('a', np.zeros(10), tags=['accounts'])
+    >>> c.put('b', np.zeros(10), tags=['cities'])
+    >>> c.put('c', np.zeros(10))  # evicts 'a'
+    >>> sorted(c)
+    ['b', 'c']
+    >>> c.invalidate('cities')
+    >>> sorted(c)
+    ['c']
+    >>> c['c'].shape
+    (10,)
+    >>> c.stats['hits'], c.stats['evictions']
+    (1, 1)
+    """
+    def __init__(self, nbytes=None, ttl=None, policy='lru', spill=None):
+        self.available_bytes = nbytes
+        self.ttl = ttl
+        if isinstance(policy, _strtypes) and policy in policies:
+            policy = policies[policy]
+        elif not callable(policy):
+            raise ValueError("Cache policy must be one of %s or a function, "
+                             "got %r" % (', '.join(sorted(policies)), policy))
+        self.policy = policy
+        self.spill = None
+        if spill:
+            parent = None if spill is True else spill
+            if parent and not os.path.isdir(parent):
+                os.makedirs(parent)
+            self.spill = tempfile.mkdtemp(prefix='blaze-cache-', dir=parent)
+            remove_on_exit(self, self.spill)
+        self.entries = OrderedDict()
+        self.tags = dict()
+        self.total_bytes = 0
+        self.tick = 0
+        self.hits = self.misses = self.evictions = 0
+        self.spills = self.loads = 0
+        self.lock = threading.RLock()
+
+    def put(self, key, value, tags=(), cost=1.0):
+        """ Store ``value`` under ``key`` labeled with ``tags``
+
+        ``cost`` is the price of computing ``value`` again, for the
+        ``'cost'`` policy.
+        """
+        size = nbytes(value)
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.tick += 1
+            entry = Entry(value, size, cost, tuple(tags), expires, self.tick)
+            if not self._fits(size):
+                if not (self.spill and self._spill(entry)):
+                    return
+            else:
+                self.total_bytes += size
+            self.entries[key] = entry
+            for tag in entry.tags:
+                self.tags.setdefault(tag, set()).add(key)
+            self._evict(keep=key)
+
+    def _fits(self, size):
+        return self.available_bytes is None or size <= self.available_bytes
+
+    def _evict(self, keep=None):
+        """ Evict entries until the values in memory fit the budget """
+        while (self.available_bytes is not None and
+               self.total_bytes > self.available_bytes):
+            # A linear scan, as scores change with every use
+            key = min((k for k, e in self.entries.items()
+                       if e.path is None and k != keep),
+                      key=lambda k: self.policy(self.entries[k]))
+            entry = self.entries[key]
+            self.evictions += 1
+            if self.spill and self._spill(entry):
+                self.total_bytes -= entry.nbytes
+            else:
+                self._remove(key)
+
+    def _spill(self, entry):
+        """ Move the value of ``entry`` to disk, False if it can not go """
+        try:
+            entry.path = spill(entry.value, self.spill)
+        except Exception:  # e.g. values that do not pickle
+            return False
+        entry.value = None
+        self.spills += 1
+        return True
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        if entry.path is not None:
+            os.remove(entry.path)
+        else:
+            self.total_bytes -= entry.nbytes
+        for tag in entry.tags:
+            keys = self.tags[tag]
+            keys.discard(key)
+            if not keys:
+                del self.tags[tag]
+
+    def _expired(self, key):
+        expires = self.entries[key].expires
+        return expires is not None and time.time() > expires
+
+    def __getitem__(self, key):
+        with self.lock:
+            if key not in self.entries or self._expired(key):
+                if key in self.entries:
+                    self._remove(key)
+                self.misses += 1
+                raise KeyError(key)
+            self.hits += 1
+            self.tick += 1
+            entry = self.entries[key]
+            entry.hits += 1
+            entry.last = self.tick
+            if entry.path is None:
+                return entry.value
+
+            value = unspill(entry.path)
+            self.loads += 1
+            if self._fits(entry.nbytes):
+                os.remove(entry.path)
+                entry.path = None
+                entry.value = value
+                self.total_bytes += entry.nbytes
+                self._evict(keep=key)
+            return value
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __delitem__(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries and not self._expired(key)
+
+    def __iter__(self):
+        with self.lock:
+            return iter([k for k in self.entries if not self._expired(k)])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def invalidate(self, tag):
+        """ Remove all entries labeled with ``tag`` """
+        with self.lock:
+            for key in list(self.tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._remove(key)
+
+    @property
+    def stats(self):
+        """ Counts of hits, misses, evictions and spills, sizes in bytes """
+        with self.lock:
+            spilled = [e for e in self.entries.values() if e.path is not None]
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'count': len(self.entries),
+                    'nbytes': self.total_bytes,
+                    'available_bytes': self.available_bytes,
+                    'spills': self.spills, 'loads': self.loads,
+                    'spilled': len(spilled),
+                    'spilled_nbytes': sum(e.nbytes for e in spilled)}
 
 
 class CachedDataset(object):
-    def __init__(self, data, cache=None):
+    """ Data that remembers the results of the expressions computed on it
+
+    Parameters
+    ----------
+
+    data: object
+        Any data that blaze understands, often a dict of datasets
+    cache: MutableMapping, optional
+        Where to keep results.  Defaults to a ``Cache`` of a quarter of the
+        memory available at creation, built with any further keyword
+        arguments, e.g. ``policy='cost'`` or ``spill='/tmp/blaze'``.
+
+    Results in a ``Cache`` are weighed by the seconds they took to compute and
+    tagged with the names of the datasets of ``data`` that they use, see
+    ``datasets``.
+    """
+    def __init__(self, data, cache=None, **kwargs):
         self.data = data
         if cache is None:
-            cache = dict()
+            kwargs.setdefault('nbytes', available_memory() // 4)
+            cache = Cache(**kwargs)
         self.cache = cache
 
 
@@ -30,25 +334,244 @@ def compute_up(expr, data, **kwargs):
 
 @dispatch(Expr, CachedDataset)
 def compute_down(expr, data, **kwargs):
-    if expr in data.cache:
+    try:
         return data.cache[expr]
+    except KeyError:
+        pass
 
     leaf = expr._leaves()[0]
 
-    # Do work
-    result = compute(expr, {leaf: data.data}, **kwargs)
+    # Do work, starting from what we already know where we can
+    start = time.time()
 
-    # If the result is ephemeral then make it concrete
-    if isinstance(result, Iterator):
-        ds = expr.dshape
-        result = into(concrete_type(ds), result, dshape=ds)
+    def complete(column):
+        return (compute_down(column.count(), data, **kwargs) ==
+                compute_down(column.nrows, data, **kwargs))
+
+    reuse = reusable(expr, data.cache, complete)
+    try:
+        scope = dict((sym, data.cache[key])
+                     for sub, (key, sym, new) in reuse.items())
+    except KeyError:  # expired in the meantime
+        reuse, scope = dict(), dict()
+    remainder = expr._subs(dict((sub, new)
+                                for sub, (key, sym, new) in reuse.items()))
+    if any(leaf.isidentical(l) for l in remainder._leaves()):
+        scope[leaf] = data.data
+    result = compute(remainder, scope, **kwargs)
+
+    # If the result is ephemeral then make it concrete, unless it outgrows
+    # what the cache may hold
+    ds = expr.dshape
+    if isinstance(result, Iterator) or (isinstance(data.cache, Cache) and
+                                        iscollection(ds) and
+                                        not concrete(result)):
+        limit = (data.cache.available_bytes
+                 if isinstance(data.cache, Cache) else None)
+        result, fits = materialize(result, ds, limit)
+        if not fits:
+            return result
+    duration = time.time() - start
 
     # Cache result
-    data.cache[expr] = result
+    if isinstance(data.cache, Cache):
+        data.cache.put(expr, result, tags=datasets(expr), cost=duration)
+    else:
+        data.cache[expr] = result
 
     return result
 
 
+# Rows of an iterator that ``materialize`` reads at a time
+ROWS_PER_PART = 1024
+
+
+def materialize(result, ds, limit=None):
+    """ Lazy ``result`` in memory, if it fits in ``limit`` bytes
+
+    Returns the concrete result and True, or, once the parts read outgrow
+    ``limit``, an iterator (or chunks) over all of ``result`` and False.
+    We read no further than ``limit``.
+
+    >>> materialize(iter([1, 2, 3]), 'var * int64')
+    (array([1, 2, 3]), True)
+    >>> rows, fits = materialize(iter(range(5000)), 'var * int64', limit=100)
+    >>> fits, len(list(rows))
+    (False, 5000)
+    """
+    ds = dshape(ds)
+    if isinstance(result, Chunks):
+        parts, lazy = iter(result), type(result)
+    else:
+        try:
+            rows = into(Iterator, result, dshape=ds)
+        except NotImplementedError:  # no way to stream it, read it whole
+            return into(concrete_type(ds), result, dshape=ds), True
+        parts, lazy = map(list, partition_all(ROWS_PER_PART, rows)), concat
+
+    read, size = [], 0
+    for part in parts:
+        read.append(part)
+        size += nbytes(part)
+        if limit is not None and size > limit:
+            return lazy(concat([read, parts])), False
+
+    if isinstance(result, Chunks):
+        return into(concrete_type(ds), type(result)(read), dshape=ds), True
+    return into(concrete_type(ds), list(concat(read)), dshape=ds), True
+
+
+def reusable(expr, cache, complete=None):
+    """ The largest subterms of ``expr`` that we can answer from ``cache``
+
+    Maps each such subterm to the key of the cached result from which it
+    follows, a symbol standing for that result, and an expression of the
+    subterm on that symbol.  Subterms are either in the cache themselves or
+    are ``By`` expressions that roll up a finer cached grouping, see
+    ``rollup``, which also describes ``complete``.
+
+    >>> t = symbol('t', 'var * {x: int, y: int}')
+    >>> cache = {t[t.x > 0]: None}
+    >>> [(sub, new) for sub, (key, sym, new)
+    ...  in reusable(t[t.x > 0].y.sum(), cache).items()]
+    [(t[t.x > 0], _cached_0)]
+    """
+    groupings = [key for key in list(cache) if isinstance(key, By)]
+    found = dict()
+
+    def walk(e):
+        if e is not expr and e in cache:
+            sym = symbol('_cached_%d' % len(found), e.dshape)
+            found[e] = (e, sym, sym)
+            return
+        if isinstance(e, By):
+            for key in groupings:
+                sym = symbol('_cached_%d' % len(found), key.dshape)
+                new = rollup(e, key, sym, complete)
+                if new is not None:
+                    found[e] = (key, sym, new)
+                    return
+        for i in e._inputs:
+            walk(i)
+
+    walk(expr)
+    return found
+
+
+# Reductions of groups that follow from the same reduction of subgroups
+rollups = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max',
+           'any': 'any', 'all': 'all'}
+
+
+def grouped_columns(grouper, child):
+    """ Names of the columns of ``child`` that ``grouper`` selects, or None """
+    if isinstance(grouper, Field) and grouper._child.isidentical(child):
+        return [grouper._name]
+    if isinstance(grouper, Projection) and grouper._child.isidentical(child):
+        return list(grouper.fields)
+    return None
+
+
+def may_be_missing(measure):
+    """ Can values of this measure be missing?
+
+    >>> may_be_missing(dshape('?int32').measure)
+    True
+    >>> may_be_missing(dshape('float64').measure)
+    True
+    >>> may_be_missing(dshape('int32').measure)
+    False
+    """
+    return isinstance(measure, Option) or measure in floating
+
+
+def rollup(expr, cached, result, complete=None):
+    """ Express By ``expr`` on ``result``, the result of a finer By ``cached``
+
+    Returns None unless ``cached`` groups the same data by a superset of
+    the columns of ``expr`` and holds a reduction for every reduction of
+    ``expr`` that combines across subgroups, like sums, counts, min and max.
+    Backends like pandas drop the groups with missing keys, so neither may
+    the extra columns of ``cached`` hold missing values, whether as options
+    or as floating point NaNs.  ``complete``, if given, tells whether such a
+    column holds none in the data at hand; otherwise we refuse it.
+
+    >>> from blaze import by
+    >>> t = symbol('t', 'var * {a: int, b: int, x: int}')
+    >>> fine = by(t[['a', 'b']], total=t.x.sum(), n=t.x.count())
+    >>> c = symbol('c', fine.dshape)
+    >>> rollup(by(t.a, n=t.x.count()), fine, c)
+    by(c.a, n=sum(c.n))
+    >>> rollup(by(t.a, avg=t.x.mean()), fine, c) is None
+    True
+    >>> u = symbol('u', 'var * {a: int, b: ?int, c: float64, x: int}')
+    >>> fine = by(u[['a', 'b']], n=u.x.count())
+    >>> rollup(by(u.a, n=u.x.count()), fine, symbol('c', fine.dshape)) is None
+    True
+    >>> fine = by(u[['a', 'c']], n=u.x.count())
+    >>> rollup(by(u.a, n=u.x.count()), fine, symbol('c', fine.dshape)) is None
+    True
+    """
+    if not (isinstance(expr, By) and isinstance(cached, By) and
+            isinstance(expr.apply, Summary) and
+            isinstance(cached.apply, Summary)):
+        return None
+    child = expr._child
+    if not cached._child.isidentical(child):
+        return None
+    groups = grouped_columns(expr.grouper, child)
+    finer = grouped_columns(cached.grouper, child)
+    if groups is None or finer is None or not set(groups) <= set(finer):
+        return None
+
+    values = []
+    for value in expr.apply.values:
+        names = [name for name, v in zip(cached.apply.names,
+                                         cached.apply.values)
+                 if v.isidentical(value)]
+        if type(value).__name__ not in rollups or not names:
+            return None
+        values.append(getattr(result[names[0]],
+                              rollups[type(value).__name__])())
+
+    # Checked last as ``complete`` may have to look at the data
+    if any(may_be_missing(child[name].dshape.measure) and
+           not (complete and complete(child[name]))
+           for name in set(finer) - set(groups)):
+        return None
+
+    if isinstance(expr.grouper, Field):
+        grouper = result[groups[0]]
+    else:
+        grouper = result[groups]
+    return By(grouper, Summary(result, expr.apply.names, tuple(values),
+                               axis=expr.apply.axis,
+                               keepdims=expr.apply.keepdims))
+
+
+def concrete(x):
+    """ Is collection ``x`` held in memory rather than, say, a query?
+
+    >>> concrete([1, 2, 3])
+    True
+    >>> concrete(iter([1, 2, 3]))
+    False
+    """
+    return isinstance(x, (np.ndarray, pd.DataFrame, pd.Series, list, tuple))
+
+
+def datasets(expr):
+    """ Names of the datasets of a collection of datasets used by ``expr``
+
+    >>> s = symbol('s', '{accounts: var * {amount: int}, cities: var * string}')
+    >>> sorted(datasets(s.accounts.amount.sum() + s.cities.count()))
+    ['accounts', 'cities']
+    """
+    leaf = expr._leaves()[0]
+    return set(e._name for e in expr._subterms()
+               if isinstance(e, Field) and e._child.isidentical(leaf))
+
+
 def concrete_type(ds):
     """ A type into which we can safely deposit streaming data
 
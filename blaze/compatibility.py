@@ -41,6 +41,14 @@ else:
 from toolz.compatibility import map, zip, range, reduce
 
 
+def with_metaclass(meta, *bases):
+    """ Create a base class with a metaclass, for both Python 2 and 3 """
+    class metaclass(meta):
+        def __new__(cls, name, this_bases, d):
+            return meta(name, bases, d)
+    return type.__new__(metaclass, 'temporary_class', (), {})
+
+
 if PY2:
     _inttypes = (int, long)
     unicode = builtins.unicode
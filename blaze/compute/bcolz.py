@@ -7,13 +7,15 @@ from ..expr import (Selection, Head, Field, Projection, ReLabel, ElemWise,
                     Arithmetic, Broadcast, Symbol, Summary, Like, Sort, Apply,
                     Reduction, symbol)
 from ..expr import Label, Distinct, By, Slice
-from ..expr import Expr
+from ..expr import Expr, Sort
 from ..expr import path
-from ..expr.optimize import lean_projection
-from ..expr.split import split
+from ..expr.optimize import lean_projection, push_predicates, drop_sorts
+from ..expr.split import split, split_combine, path_split
 from ..partition import partitions
 from .core import compute
-from .pmap import get_default_pmap
+from .chunks import (compute_chunks, compute_sorted, compute_grouped,
+                     has_moments, center_moments)
+from ..utils import available_memory
 
 from collections import Iterator, Iterable
 import datashape
@@ -23,7 +25,7 @@ import pandas as pd
 
 
 from ..dispatch import dispatch
-from odo import into
+from odo import into, chunks
 
 __all__ = ['bcolz']
 
@@ -32,7 +34,8 @@ COMFORTABLE_MEMORY_SIZE = 1e9
 
 @dispatch(Expr, (bcolz.ctable, bcolz.carray))
 def optimize(expr, _):
-    return lean_projection(expr)  # This is handled in pre_compute
+    # This is handled in pre_compute
+    return lean_projection(push_predicates(expr))
 
 
 @dispatch(Expr, (bcolz.ctable, bcolz.carray))
@@ -102,11 +105,18 @@ def get_chunksize(data):
 
 
 @dispatch(Expr, (bcolz.carray, bcolz.ctable))
-def compute_down(expr, data, chunksize=None, map=None, **kwargs):
-    if map is None:
-        map = get_default_pmap()
-
+def compute_down(expr, data, chunksize=None, map=None, inflight=None,
+                 comfortable_memory=None, **kwargs):
     leaf = expr._leaves()[0]
+    expr = drop_sorts(expr)
+
+    # Sort in memory unless the data is large, then sort externally below
+    sorting = isinstance(path_split(leaf, expr), Sort)
+    if sorting:
+        comfortable_memory = (comfortable_memory or
+                              min(1e9, available_memory() / 4))
+        if data.nbytes <= comfortable_memory:
+            raise MDNotImplementedError()
 
     if chunksize is None:
         chunksize = get_chunksize(data)
@@ -119,22 +129,81 @@ def compute_down(expr, data, chunksize=None, map=None, **kwargs):
     if len(children) == 1 and isinstance(first(children), (Field, Projection)):
         raise MDNotImplementedError()
 
+    if has_moments(expr):
+        expr = center_moments(expr, leaf, data[:chunksize])
+
     chunk = symbol('chunk', chunksize * leaf.schema)
     (chunk, chunk_expr), (agg, agg_expr) = split(leaf, expr, chunk=chunk)
+    combine_expr = split_combine(leaf, expr, agg)
 
     data_parts = partitions(data, chunksize=(chunksize,))
 
-    parts = list(map(curry(compute_chunk, data, chunk, chunk_expr),
-                     data_parts))
+    if sorting:
+        return compute_sorted(curry(compute_chunk, data, chunk, chunk_expr),
+                              data_parts, leaf, expr, agg, map=map,
+                              inflight=inflight)
 
-    if isinstance(parts[0], np.ndarray):
-        intermediate = np.concatenate(parts)
-    elif isinstance(parts[0], pd.DataFrame):
-        intermediate = pd.concat(parts)
-    elif isinstance(parts[0], Iterable):
-        intermediate = list(concat(parts))
-    else:
-        raise TypeError("Don't know how to concatenate objects of type %r" %
-                        type(parts[0]).__name__)
+    if isinstance(path_split(leaf, expr), By):
+        return compute_grouped(curry(compute_chunk, data, chunk, chunk_expr),
+                               data_parts, leaf, expr, agg, combine_expr,
+                               map=map, inflight=inflight,
+                               comfortable_memory=comfortable_memory)
+
+    intermediate = compute_chunks(curry(compute_chunk, data, chunk, chunk_expr),
+                                  data_parts, agg, combine_expr, map=map,
+                                  inflight=inflight)
 
     return compute(agg_expr, {agg: intermediate})
+
+
+def as_chunks(data, chunksize=None):
+    """ Stream a bcolz container as NumPy chunks """
+    chunksize = chunksize or get_chunksize(data)
+    parts = lambda: (data[i] for i in partitions(data, chunksize=(chunksize,)))
+    return chunks(np.ndarray)(parts)
+
+
+@dispatch(Expr, bcolz.ctable, bcolz.ctable)
+def compute_down(expr, lhs, rhs, comfortable_memory=None, **kwargs):
+    """ Join tables too large for memory
+
+    If the smaller table fits comfortably in memory we load it and stream the
+    larger one through it chunk by chunk.  Otherwise we join both on disk.
+
+    See Also
+    --------
+
+    blaze.compute.chunks.compute_broadcast_join
+    blaze.compute.chunks.grace_join
+    """
+    comfortable_memory = (comfortable_memory or
+                          min(1e9, available_memory() / 4))
+    if lhs.nbytes + rhs.nbytes <= comfortable_memory:
+        raise MDNotImplementedError()
+    if lhs.nbytes <= rhs.nbytes and lhs.nbytes <= comfortable_memory:
+        return compute_down(expr, into(pd.DataFrame, lhs), as_chunks(rhs),
+                            **kwargs)
+    if rhs.nbytes <= comfortable_memory:
+        return compute_down(expr, as_chunks(lhs), into(pd.DataFrame, rhs),
+                            **kwargs)
+    return compute_down(expr, as_chunks(lhs), as_chunks(rhs),
+                        comfortable_memory=comfortable_memory, **kwargs)
+
+
+@dispatch(Expr, bcolz.ctable, pd.DataFrame)
+def compute_down(expr, lhs, rhs, comfortable_memory=None, **kwargs):
+    """ Stream a large table through a join with a small DataFrame """
+    comfortable_memory = (comfortable_memory or
+                          min(1e9, available_memory() / 4))
+    if lhs.nbytes <= comfortable_memory:
+        raise MDNotImplementedError()
+    return compute_down(expr, as_chunks(lhs), rhs, **kwargs)
+
+
+@dispatch(Expr, pd.DataFrame, bcolz.ctable)
+def compute_down(expr, lhs, rhs, comfortable_memory=None, **kwargs):
+    comfortable_memory = (comfortable_memory or
+                          min(1e9, available_memory() / 4))
+    if rhs.nbytes <= comfortable_memory:
+        raise MDNotImplementedError()
+    return compute_down(expr, lhs, as_chunks(rhs), **kwargs)
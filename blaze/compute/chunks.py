@@ -1,18 +1,37 @@
 from __future__ import absolute_import, division, print_function
 
+import heapq
+import os
+import shutil
+import tempfile
+from multiprocessing import cpu_count
 from multipledispatch import MDNotImplementedError
 from odo import Chunks, chunks, convert, discover, into
 from collections import Iterator, Iterable
-from toolz import curry, concat, map
-from datashape.dispatch import dispatch
+from toolz import compose, curry, concat, first, map, partition_all, peek
+from ..dispatch import dispatch
+from datashape.typesets import integral
 
 import pandas as pd
 import numpy as np
 
-from ..expr import Head, ElemWise, Distinct, Symbol, Expr, path
-from ..expr.split import split
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from ..expr import (Head, ElemWise, Distinct, Symbol, Expr, Sort, Join,
+                    Selection, Like, By, Summary, path, symbol, var, std)
+from ..expr.optimize import drop_sorts
+from ..expr.split import split, split_combine, path_split
 from .core import compute
-from .pmap import get_default_pmap
+from .pmap import (get_default_pmap, ProcessPoolMap, share_object,
+                   call_object)
+from .python import sort_key
+from ..utils import available_memory, nbytes
+
+# Number of chunks handed to ``map`` at once by the streaming executor
+CHUNKS_IN_FLIGHT = 2 * cpu_count()
 
 Cheap = (Head, ElemWise, Distinct, Symbol)
 
@@ -29,23 +48,361 @@ def compute_chunk(chunk, chunk_expr, part):
     return compute(chunk_expr, {chunk: part})
 
 
-@dispatch(Expr, Chunks)
-def compute_down(expr, data, map=None, **kwargs):
+def concat_parts(parts):
+    """ Concatenate a sequence of intermediate results into one
+
+    >>> concat_parts([[1, 2], (3,)])
+    [1, 2, 3]
+    """
+    if isinstance(parts[0], np.ndarray):
+        return np.concatenate(parts)
+    elif isinstance(parts[0], (pd.DataFrame, pd.Series)):
+        return pd.concat(parts)
+    elif isinstance(parts[0], (Iterable, Iterator)):
+        return list(concat(parts))
+    else:
+        raise TypeError("Don't know how to concatenate objects of type %r" %
+                        type(parts[0]).__name__)
+
+
+def compute_chunks(func, seq, agg, combine_expr, map=None, inflight=None):
+    """ Map ``func`` over chunks, folding partial results as they arrive
+
+    Chunks are handed to ``map`` ``inflight`` at a time.  When
+    ``combine_expr`` reduces, the partial results of each batch are
+    concatenated onto the running intermediate which is then folded back down
+    with ``combine_expr`` (see ``blaze.expr.split``), so peak memory is bounded
+    by the size of one batch of partial results rather than by the number of
+    chunks.  Otherwise the partial results are the output itself; they are
+    collected and concatenated once at the end.
+
+    >>> from blaze import symbol
+    >>> agg = symbol('aggregate', 'var * int')
+    >>> chunk_sum = lambda part: [sum(part)]
+    >>> compute_chunks(chunk_sum, [[1, 2], [3, 4], [5]], agg,
+    ...                agg.sum(keepdims=True), inflight=2)
+    (15,)
+    >>> compute_chunks(lambda part: part, [[1, 2], [3, 4], [5]], agg, agg)
+    [1, 2, 3, 4, 5]
+
+    See Also
+    --------
+
+    blaze.expr.split.split_combine
+    """
+    if map is None:
+        map = get_default_pmap()
+    if inflight is None:
+        inflight = CHUNKS_IN_FLIGHT
+
+    if combine_expr.isidentical(agg):
+        parts = list(concat(map(func, batch)
+                            for batch in partition_all(inflight, seq)))
+        if not parts:
+            raise ValueError("Can not compute on an empty sequence of chunks")
+        return concat_parts(parts)
+
+    intermediate = None
+    for batch in partition_all(inflight, seq):
+        parts = list(map(func, batch))
+        if intermediate is not None:
+            parts.insert(0, intermediate)
+        intermediate = compute(combine_expr, {agg: concat_parts(parts)})
+
+    if intermediate is None:
+        raise ValueError("Can not compute on an empty sequence of chunks")
+    return intermediate
+
+
+def moments(expr):
+    """ The variances and standard deviations in ``expr``, summaries included
+
+    >>> from blaze import symbol, summary
+    >>> t = symbol('t', 'var * float64')
+    >>> list(moments(summary(a=t.var(), b=t.mean()).a + 1))
+    [var(t, unbiased=False)]
+    """
+    for e in expr._subterms():
+        if isinstance(e, (var, std)):
+            yield e
+        elif isinstance(e, Summary):
+            for v in e.values:
+                for m in moments(v):
+                    yield m
+
+
+def has_moments(expr):
+    return any(True for _ in moments(expr))
+
+
+def center_moments(expr, leaf, part):
+    """ Shift the data of each variance in ``expr`` by its mean on ``part``
+
+    Chunked variances accumulate sums of powers of the data, see
+    ``blaze.expr.split``.  These cancel catastrophically when the data lie far
+    from zero relative to their spread.  Variance is unchanged by subtracting
+    a constant, so we subtract the mean of a sample chunk and keep the sums
+    small.  Integer data shift by an integer and stay exact.
+
+    >>> from blaze import symbol
+    >>> t = symbol('t', 'var * float64')
+    >>> center_moments(t.var() + 1, t, [1e9, 1e9 + 2])
+    (var(t - 1000000001.0, unbiased=False)) + 1
+    """
+    subs = dict()
+    for e in moments(expr):
+        if e in subs:
+            continue
+        try:
+            shift = compute(e._child.mean(), {leaf: part})
+        except (ZeroDivisionError, TypeError, ValueError):
+            continue
+        if shift != shift or not shift:  # NaN or zero
+            continue
+        if e._child.schema[0] in integral:
+            shift = int(round(shift))
+        else:
+            shift = float(shift)
+        subs[e] = e._subs({e._child: e._child - shift})
+    return expr._subs(subs) if subs else expr
+
+
+def peek_chunk(data):
+    """ The first chunk of a ``Chunks`` without losing it from a single pass
+    iterator """
+    if isinstance(data.data, Iterator):
+        part, data.data = peek(data.data)
+        return part
+    return first(data)
+
+
+# Rows per pickled block when spilling sorted runs to disk
+SPILL_BLOCKSIZE = 2**12
+
+
+def to_rows(x):
+    """ Python rows of an in-memory result
+
+    >>> to_rows(np.array([(1, 'a'), (2, 'b')], dtype=[('x', 'i8'), ('y', 'O')]))
+    [(1, 'a'), (2, 'b')]
+    """
+    if isinstance(x, (np.ndarray, pd.Series)):
+        return x.tolist()
+    elif isinstance(x, pd.DataFrame):
+        return map(tuple, x.itertuples(index=False))
+    else:
+        return x
+
+
+def spill(rows, dirname=None, blocksize=None):
+    """ Write rows to a temporary file in pickled blocks, return the path """
+    fd, path = tempfile.mkstemp(suffix='.run', dir=dirname)
+    with os.fdopen(fd, 'wb') as f:
+        for block in partition_all(blocksize or SPILL_BLOCKSIZE, rows):
+            pickle.dump(block, f, pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def read_blocks(path):
+    """ Stream objects pickled one after another into a file """
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                break
+
+
+def read_spilled(path):
+    """ Stream rows back from a file written by ``spill`` one block at a time
+
+    >>> list(read_spilled(spill([1, 2, 3], blocksize=2)))
+    [1, 2, 3]
+    """
+    for block in read_blocks(path):
+        for row in block:
+            yield row
+
+
+class Descending(object):
+    """ Invert the ordering of a key """
+    __slots__ = 'value',
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def merge_sorted_runs(runs, key=None, reverse=False):
+    """ Lazily merge already sorted sequences into one sorted sequence
+
+    Stable: ties come out in the order of the runs they came from
+
+    >>> list(merge_sorted_runs([[1, 4, 5], [2, 3, 6]]))
+    [1, 2, 3, 4, 5, 6]
+    >>> list(merge_sorted_runs([[5, 4, 1], [6, 3, 2]], reverse=True))
+    [6, 5, 4, 3, 2, 1]
+    """
+    if key is None:
+        key = lambda x: x
+    if reverse:
+        key = compose(Descending, key)
+
+    heap = []
+    runs = [iter(run) for run in runs]
+    for i, run in enumerate(runs):
+        for row in run:
+            heap.append((key(row), i, row))
+            break
+    heapq.heapify(heap)
+
+    while heap:
+        _, i, row = heap[0]
+        yield row
+        for row in runs[i]:
+            heapq.heapreplace(heap, (key(row), i, row))
+            break
+        else:
+            heapq.heappop(heap)
+
+
+def external_sort(runs, key=None, reverse=False, dirname=None):
+    """ Spill sorted runs to disk, then stream them back merged
+
+    Only one block of each run is held in memory while merging.  The
+    temporary files are removed once the merged sequence is exhausted.
+    """
+    paths = []
+    try:
+        for run in runs:
+            paths.append(spill(to_rows(run), dirname=dirname))
+    except:
+        for path in paths:
+            os.remove(path)
+        raise
+
+    try:
+        for row in merge_sorted_runs(list(map(read_spilled, paths)),
+                                     key=key, reverse=reverse):
+            yield row
+    finally:
+        for path in paths:
+            os.remove(path)
+
+
+def collect_rows(rows, like, dirname=None, blocksize=None):
+    """ Gather rows into a container of the same type as ``like``
+
+    NumPy rows are written to a file in ``dirname`` and memory mapped, so a
+    result larger than memory stays on disk.  DataFrames, Series and lists are
+    built in memory.
+
+    >>> collect_rows(iter([(1, 'a'), (2, 'b')]), pd.DataFrame(columns=['x', 'y']))
+       x  y
+    0  1  a
+    1  2  b
+    >>> collect_rows(iter([3, 1, 2]), np.arange(2))
+    memmap([3, 1, 2])
+    """
+    blocksize = blocksize or SPILL_BLOCKSIZE
+    blocks = partition_all(blocksize, rows)
+    if isinstance(like, np.ndarray) and not like.dtype.hasobject:
+        dtype = like.dtype
+        fd, path = tempfile.mkstemp(suffix='.sorted', dir=dirname)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for block in blocks:
+                    f.write(np.array(list(block), dtype=dtype).tobytes())
+            if not os.path.getsize(path):
+                return np.empty(0, dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode='r')
+        finally:
+            try:
+                os.remove(path)
+            except OSError:  # Windows can not remove a mapped file
+                pass
+    elif isinstance(like, np.ndarray):
+        return np.array(list(rows), dtype=like.dtype)
+    elif isinstance(like, pd.DataFrame):
+        frames = [pd.DataFrame.from_records(list(block), columns=like.columns)
+                  for block in blocks]
+        if not frames:
+            return like.iloc[:0]
+        return pd.concat(frames, ignore_index=True)
+    elif isinstance(like, pd.Series):
+        return pd.Series(list(rows), name=like.name, dtype=like.dtype)
+    else:
+        return list(rows)
+
+
+def compute_sorted(func, seq, leaf, expr, agg, map=None, inflight=None,
+                   dirname=None):
+    """ Compute a sorting expression with an external merge sort
+
+    ``func`` sorts one element of ``seq``, see ``blaze.expr.split``.  Sorted
+    runs are produced ``inflight`` at a time and spilled to ``dirname``.  The
+    merged rows are gathered into the type of the runs (see
+    ``collect_rows``), which is what sorting in memory would give, and the
+    rest of the expression is computed on them.
+
+    >>> from blaze import symbol
+    >>> t = symbol('t', 'var * int')
+    >>> agg = symbol('aggregate', 'var * int')
+    >>> list(compute_sorted(sorted, [[3, 1], [2, 5, 4]], t, t.sort() + 1, agg))
+    [2, 3, 4, 5, 6]
+    """
     if map is None:
         map = get_default_pmap()
+    if inflight is None:
+        inflight = CHUNKS_IN_FLIGHT
+
+    sort = path_split(leaf, expr)
+    sort = sort._subs({sort._child: agg})
+    runs = concat(map(func, batch) for batch in partition_all(inflight, seq))
+    try:
+        like, runs = peek(runs)
+    except StopIteration:
+        raise ValueError("Can not compute on an empty sequence of chunks")
+    rows = external_sort(runs, key=sort_key(sort, []),
+                         reverse=not sort.ascending, dirname=dirname)
+    result = collect_rows(rows, like, dirname=dirname)
+
+    return compute(expr._subs({path_split(leaf, expr): agg}), {agg: result})
 
+
+@dispatch(Expr, Chunks)
+def compute_down(expr, data, map=None, inflight=None, comfortable_memory=None,
+                 nbuckets=None, dirname=None, **kwargs):
     leaf = expr._leaves()[0]
+    expr = drop_sorts(expr)
+
+    if has_moments(expr):
+        expr = center_moments(expr, leaf, peek_chunk(data))
 
     (chunk, chunk_expr), (agg, agg_expr) = split(leaf, expr)
 
-    parts = list(map(curry(compute_chunk, chunk, chunk_expr), data))
+    if isinstance(path_split(leaf, expr), Sort):
+        return compute_sorted(curry(compute_chunk, chunk, chunk_expr), data,
+                              leaf, expr, agg, map=map, inflight=inflight,
+                              dirname=dirname)
 
-    if isinstance(parts[0], np.ndarray):
-        intermediate = np.concatenate(parts)
-    elif isinstance(parts[0], pd.DataFrame):
-        intermediate = pd.concat(parts)
-    elif isinstance(parts[0], (Iterable, Iterator)):
-        intermediate = list(concat(parts))
+    combine_expr = split_combine(leaf, expr, agg)
+
+    if isinstance(path_split(leaf, expr), By):
+        return compute_grouped(curry(compute_chunk, chunk, chunk_expr), data,
+                               leaf, expr, agg, combine_expr, map=map,
+                               inflight=inflight,
+                               comfortable_memory=comfortable_memory,
+                               nbuckets=nbuckets, dirname=dirname)
+
+    intermediate = compute_chunks(curry(compute_chunk, chunk, chunk_expr),
+                                  data, agg, combine_expr, map=map,
+                                  inflight=inflight)
 
     return compute(agg_expr, {agg: intermediate})
 
@@ -59,3 +416,508 @@ def compute_down(expr, data, **kwargs):
         return compute(expr, {leaf: into(Iterator, data)}, **kwargs)
     else:
         raise MDNotImplementedError()
+
+
+# Number of on-disk buckets per side of a partitioned hash join
+JOIN_BUCKETS = 64
+
+# Times a pair of join buckets too large for memory is hashed again
+JOIN_LEVELS = 3
+
+
+def to_frame(part, fields):
+    """ DataFrame of an in-memory chunk """
+    if isinstance(part, pd.DataFrame):
+        return part
+    elif isinstance(part, np.ndarray) and part.dtype.names:
+        return pd.DataFrame(part)
+    else:
+        return pd.DataFrame.from_records(list(part), columns=fields)
+
+
+def key_hashes(values, level):
+    """ Hash each of ``values`` with a seed that depends on ``level`` """
+    if values.dtype.kind in 'iuf':
+        # Equal keys of different numeric dtypes hash alike, and 0.0 == -0.0
+        values = values.astype('f8') + 0.0
+    if values.dtype.kind == 'O':
+        # NaN != NaN, so its hash is not stable; pandas joins NaN keys alike
+        hashes = np.array([hash(v) if v == v else 0 for v in values],
+                          dtype='i8').view('u8')
+    else:
+        hashes = pd.util.hash_array(values)
+    if level:
+        hashes = pd.util.hash_array(hashes ^ np.uint64(level))
+    return hashes
+
+
+def bucket_index(frame, keys, nbuckets, level=0):
+    """ Bucket of each row of ``frame``, found by hashing its ``keys``
+
+    Equal keys land in the same bucket whichever side of a join they are on.
+    Each ``level`` hashes differently, so rows that shared a bucket at one
+    level spread over several at the next.
+
+    >>> bucket_index(pd.DataFrame({'id': [1, 2, 5]}), ['id'], 4)
+    array([2, 1, 0])
+    >>> bucket_index(pd.DataFrame({'id': [1.0, 2.0, 5.0]}), ['id'], 4)
+    array([2, 1, 0])
+    >>> bucket_index(pd.DataFrame({'id': [1, 2, 5]}), ['id'], 4, level=1)
+    array([2, 2, 0])
+    """
+    hashes = np.zeros(len(frame), dtype='u8')
+    for key in keys:
+        hashes = hashes * np.uint64(1000003) ^ key_hashes(frame[key].values,
+                                                          level)
+    return (hashes % np.uint64(nbuckets)).astype('i8')
+
+
+def partition_frames(frames, fields, keys, nbuckets, dirname, prefix,
+                     level=0):
+    """ Hash rows into on-disk bucket files
+
+    Returns the path of each bucket, None for buckets that receive no rows,
+    and an empty frame with the columns and dtypes of the input.
+    """
+    paths = [None] * nbuckets
+    files = dict()
+    empty = None
+    try:
+        for frame in frames:
+            if empty is None:
+                empty = frame.iloc[:0]
+            if not len(frame):
+                continue
+            index = bucket_index(frame, keys, nbuckets, level)
+            for b, group in frame.groupby(index):
+                if b not in files:
+                    paths[b] = os.path.join(dirname, '%s-%d' % (prefix, b))
+                    files[b] = open(paths[b], 'wb')
+                pickle.dump(group, files[b], pickle.HIGHEST_PROTOCOL)
+    finally:
+        for f in files.values():
+            f.close()
+    if empty is None:
+        empty = pd.DataFrame(columns=fields)
+    return paths, empty
+
+
+def read_bucket(path, empty):
+    if path is None:
+        return empty
+    return pd.concat(list(read_blocks(path)))
+
+
+def join_buckets(expr, left_empty, right_empty, paths):
+    """ Join one pair of buckets in memory """
+    left, right = paths
+    return compute(expr, {expr.lhs: read_bucket(left, left_empty),
+                          expr.rhs: read_bucket(right, right_empty)})
+
+
+def bucket_needed(how, left, right):
+    if how == 'inner':
+        return left is not None and right is not None
+    elif how == 'left':
+        return left is not None
+    elif how == 'right':
+        return right is not None
+    else:
+        return left is not None or right is not None
+
+
+def bucket_size(path):
+    return 0 if path is None else os.path.getsize(path)
+
+
+def bucket_pairs(expr, left, right, keys, nbuckets, budget, dirname, prefix,
+                 level=0):
+    """ Pairs of bucket files to join, re-partitioning pairs over ``budget``
+
+    A pair of buckets larger than ``budget`` bytes on disk is hashed again,
+    with the hash of the next level, into ``nbuckets`` smaller pairs.  We
+    stop after ``JOIN_LEVELS`` levels; rows sharing a single key can not be
+    split further.
+    """
+    on_left, on_right = keys
+    pairs = []
+    for b, (l, r) in enumerate(zip(left, right)):
+        if not bucket_needed(expr.how, l, r):
+            continue
+        if (bucket_size(l) + bucket_size(r) <= budget or
+                level + 1 >= JOIN_LEVELS):
+            pairs.append((l, r))
+            continue
+        name = '%s-%d' % (prefix, b)
+        left2, _ = partition_frames(read_blocks(l) if l else [],
+                                    expr.lhs.fields, on_left, nbuckets,
+                                    dirname, 'lhs-' + name, level + 1)
+        right2, _ = partition_frames(read_blocks(r) if r else [],
+                                     expr.rhs.fields, on_right, nbuckets,
+                                     dirname, 'rhs-' + name, level + 1)
+        for path in (l, r):
+            if path is not None:
+                os.remove(path)
+        pairs.extend(bucket_pairs(expr, left2, right2, keys, nbuckets, budget,
+                                  dirname, name, level + 1))
+    return pairs
+
+
+def grace_join(expr, lhs_frames, rhs_frames, nbuckets=None, map=None,
+               inflight=None, dirname=None, comfortable_memory=None):
+    """ Join two streams of DataFrames in bounded memory
+
+    A partitioned (grace) hash join.  Both inputs are hashed on their join
+    columns into ``nbuckets`` files each.  Matching rows share a bucket, so
+    pairs of buckets are then joined in memory, ``inflight`` pairs at a time
+    through ``map``.  Pairs of buckets larger than ``comfortable_memory``,
+    e.g. because the inputs are much larger than ``nbuckets`` times memory,
+    are partitioned again into smaller pairs first.  Memory use is bounded
+    by the largest pair of buckets.
+
+    ``expr`` is a ``Join`` of two symbols.  The result is a single pass
+    ``Chunks`` of joined DataFrames.  Inputs are partitioned when it is first
+    read.  Temporary files are removed once it has been consumed or
+    discarded.
+
+    >>> from blaze import symbol, join
+    >>> a = symbol('a', 'var * {id: int64, x: int64}')
+    >>> b = symbol('b', 'var * {id: int64, y: int64}')
+    >>> left = [pd.DataFrame({'id': [1, 2], 'x': [10, 20]})]
+    >>> right = [pd.DataFrame({'id': [2, 3], 'y': [200, 300]})]
+    >>> result = grace_join(join(a, b, 'id'), left, right)
+    >>> into(pd.DataFrame, result).values.tolist()
+    [[2, 20, 200]]
+    """
+    nbuckets = nbuckets or JOIN_BUCKETS
+    if map is None:
+        map = get_default_pmap()
+    if inflight is None:
+        inflight = CHUNKS_IN_FLIGHT
+    if comfortable_memory is None:
+        comfortable_memory = min(1e9, available_memory() / 4)
+
+    on_left, on_right = expr.on_left, expr.on_right
+    if not isinstance(on_left, list):
+        on_left, on_right = [on_left], [on_right]
+
+    def joined():
+        # Partition only once the result is read, so that the temporary
+        # files live exactly as long as this generator
+        tmp = tempfile.mkdtemp(suffix='-join', dir=dirname)
+        try:
+            left, left_empty = partition_frames(lhs_frames, expr.lhs.fields,
+                                                on_left, nbuckets, tmp, 'lhs')
+            right, right_empty = partition_frames(rhs_frames, expr.rhs.fields,
+                                                  on_right, nbuckets, tmp,
+                                                  'rhs')
+            # Inflight pairs share memory
+            pairs = bucket_pairs(expr, left, right, (on_left, on_right),
+                                 nbuckets, comfortable_memory / inflight, tmp,
+                                 'bucket')
+            func = curry(join_buckets, expr, left_empty, right_empty)
+            for batch in partition_all(inflight, pairs):
+                for result in map(func, batch):
+                    yield result
+        finally:
+            shutil.rmtree(tmp)
+
+    return chunks(pd.DataFrame)(joined())
+
+
+def row_local(expr, leaf):
+    """ Can ``expr`` be computed one chunk of ``leaf`` at a time? """
+    return all(isinstance(e, (ElemWise, Selection, Like))
+               for e in list(path(expr, leaf))[:-1])
+
+
+def side_frame(expr, leaf, part):
+    """ Compute one side of a join on a chunk of its leaf """
+    frame = to_frame(part, leaf.fields)
+    if expr.isidentical(leaf):
+        return frame
+    return compute(expr, {leaf: frame})
+
+
+def side_frames(expr, leaf, parts):
+    for part in parts:
+        yield side_frame(expr, leaf, part)
+
+
+def single_join(expr):
+    """ The only join within ``expr`` and the leaves of its two sides
+
+    Raises ``MDNotImplementedError`` unless there is exactly one join whose
+    sides are row-local over two different leaves.
+    """
+    joins = [e for e in expr._subterms() if isinstance(e, Join)]
+    if len(joins) != 1:
+        raise MDNotImplementedError()
+    j = joins[0]
+    lleaves, rleaves = j.lhs._leaves(), j.rhs._leaves()
+    if len(lleaves) != 1 or len(rleaves) != 1:
+        raise MDNotImplementedError()
+    [lleaf], [rleaf] = lleaves, rleaves
+    if (lleaf.isidentical(rleaf) or not row_local(j.lhs, lleaf)
+            or not row_local(j.rhs, rleaf)):
+        raise MDNotImplementedError()
+    return j, lleaf, rleaf
+
+
+def compute_above_join(expr, j, joined, **kwargs):
+    """ Finish ``expr`` given the (chunked) result of its join ``j`` """
+    if j.isidentical(expr):
+        return joined
+    result = symbol('joined', j.dshape)
+    return compute(expr._subs({j: result}), {result: joined}, **kwargs)
+
+
+@dispatch(Expr, Chunks, Chunks)
+def compute_down(expr, lhs, rhs, nbuckets=None, map=None, inflight=None,
+                 dirname=None, comfortable_memory=None, **kwargs):
+    """ Join two chunked datasets out of core, see ``grace_join`` """
+    j, lleaf, rleaf = single_join(expr)
+    data = dict(zip(expr._leaves(), [lhs, rhs]))
+
+    a, b = symbol('lhs', j.lhs.dshape), symbol('rhs', j.rhs.dshape)
+    joined = grace_join(Join(a, b, j._on_left, j._on_right, j.how),
+                        side_frames(j.lhs, lleaf, data[lleaf]),
+                        side_frames(j.rhs, rleaf, data[rleaf]),
+                        nbuckets=nbuckets, map=map, inflight=inflight,
+                        dirname=dirname, comfortable_memory=comfortable_memory)
+    return compute_above_join(expr, j, joined, map=map, inflight=inflight)
+
+
+def join_names(expr):
+    """ Names that the columns of each side of a join take in its output
+
+    >>> from blaze import symbol, join
+    >>> a = symbol('a', 'var * {id: int, x: int, v: int}')
+    >>> b = symbol('b', 'var * {key: int, v: int}')
+    >>> left, right = join_names(join(a, b, 'id', 'key'))
+    >>> sorted(left.items())
+    [('id', 'id'), ('v', 'v_left'), ('x', 'x')]
+    >>> sorted(right.items())
+    [('key', 'id'), ('v', 'v_right')]
+    """
+    on_left, on_right = expr.on_left, expr.on_right
+    if not isinstance(on_left, list):
+        on_left, on_right = [on_left], [on_right]
+    left_other = [f for f in expr.lhs.fields if f not in on_left]
+    right_other = [f for f in expr.rhs.fields if f not in on_right]
+    overlap = set(left_other) & set(right_other)
+
+    left = dict((f, f + '_left' if f in overlap else f) for f in left_other)
+    right = dict((f, f + '_right' if f in overlap else f) for f in right_other)
+    left.update(zip(on_left, on_left))
+    right.update(zip(on_right, on_left))
+    return left, right
+
+
+class BroadcastJoin(object):
+    """ Join chunks of a large table against a small in-memory table
+
+    The small side is indexed on its join columns once, on construction.
+    Calling this on a chunk of the large side's leaf computes the large
+    side on it and joins through that index.  It returns the joined frame
+    and, when unmatched rows of the small side must appear in the output,
+    a mask of the small rows that this chunk matched.
+
+    Parameters
+    ----------
+
+    expr: Join
+    small: DataFrame
+        The computed small side
+    big_side: 'lhs' or 'rhs'
+        Which side of ``expr`` is large
+    leaf: Symbol
+        Leaf of the large side, chunks are chunks of this
+    """
+    def __init__(self, expr, small, big_side, leaf):
+        left, right = join_names(expr)
+        big_names, small_names = ((left, right) if big_side == 'lhs' else
+                                  (right, left))
+        keys = expr.on_left
+        self.keys = keys if isinstance(keys, list) else [keys]
+        self.fields = expr.fields
+        self.big_names = big_names
+        self.big = expr.lhs if big_side == 'lhs' else expr.rhs
+        self.leaf = leaf
+        self.small = small.rename(columns=small_names)
+        self.table = self.small.set_index(self.keys)
+
+        preserve_big = 'left' if big_side == 'lhs' else 'right'
+        self.how = 'left' if expr.how in (preserve_big, 'outer') else 'inner'
+        self.keep_small = expr.how not in ('inner', preserve_big)
+
+    def __call__(self, part):
+        frame = side_frame(self.big, self.leaf, part)
+        frame = frame.rename(columns=self.big_names)
+        joined = pd.merge(frame, self.table, left_on=self.keys,
+                          right_index=True, how=self.how)[self.fields]
+        if not self.keep_small:
+            return joined, None
+        if len(self.keys) == 1:
+            keys = frame[self.keys[0]].values
+        else:
+            keys = list(zip(*[frame[k].values for k in self.keys]))
+        return joined, self.table.index.isin(keys)
+
+    def unmatched(self, matched):
+        """ Rows of the small side that no chunk matched """
+        if matched is None:
+            matched = np.zeros(len(self.small), dtype=bool)
+        return self.small[~matched].reindex(columns=self.fields)
+
+
+def broadcast_join(table, parts, map=None, inflight=None):
+    """ Stream chunks through a ``BroadcastJoin``, ``inflight`` at a time
+
+    Under a ``ProcessPoolMap`` the table is pickled once into a file that
+    each worker loads on its first chunk, see ``SharedObject``.
+    """
+    if map is None:
+        map = get_default_pmap()
+    if inflight is None:
+        inflight = CHUNKS_IN_FLIGHT
+
+    # Send the small table to each worker process once, not with every chunk
+    shared = None
+    func = table
+    if isinstance(map, ProcessPoolMap):
+        shared = share_object(table, map.dirname)
+        func = curry(call_object, shared)
+
+    matched = None
+    try:
+        for batch in partition_all(inflight, parts):
+            for joined, mask in map(func, batch):
+                if mask is not None:
+                    matched = mask if matched is None else matched | mask
+                yield joined
+    finally:
+        if shared is not None:
+            os.remove(shared.path)
+    if table.keep_small:
+        yield table.unmatched(matched)
+
+
+def compute_broadcast_join(expr, lhs, rhs, map=None, inflight=None,
+                           **kwargs):
+    """ Join a chunked dataset against an in-memory DataFrame
+
+    The DataFrame side is computed and indexed once.  The chunked side
+    streams through it in parallel with ``map``.
+    """
+    j, lleaf, rleaf = single_join(expr)
+    data = dict(zip(expr._leaves(), [lhs, rhs]))
+
+    if isinstance(data[lleaf], Chunks):
+        big_side, big_leaf, small, small_leaf = 'lhs', lleaf, j.rhs, rleaf
+    else:
+        big_side, big_leaf, small, small_leaf = 'rhs', rleaf, j.lhs, lleaf
+    small = compute(small, {small_leaf: data[small_leaf]})
+
+    table = BroadcastJoin(j, small, big_side, big_leaf)
+    joined = chunks(pd.DataFrame)(broadcast_join(table, data[big_leaf],
+                                                 map=map, inflight=inflight))
+    return compute_above_join(expr, j, joined, map=map, inflight=inflight)
+
+
+@dispatch(Expr, Chunks, pd.DataFrame)
+def compute_down(expr, lhs, rhs, **kwargs):
+    return compute_broadcast_join(expr, lhs, rhs, **kwargs)
+
+
+@dispatch(Expr, pd.DataFrame, Chunks)
+def compute_down(expr, lhs, rhs, **kwargs):
+    return compute_broadcast_join(expr, lhs, rhs, **kwargs)
+
+
+# Number of on-disk buckets used by a group-by that outgrows memory
+GROUPBY_BUCKETS = 64
+
+
+def compute_grouped(func, seq, leaf, expr, agg, combine_expr, map=None,
+                    inflight=None, comfortable_memory=None, nbuckets=None,
+                    dirname=None):
+    """ Compute a split-apply-combine expression with a streaming hash
+    aggregation
+
+    ``func`` computes the partial group table of one element of ``seq``, see
+    ``blaze.expr.split``.  Partial tables are merged into one running table of
+    per-group states with ``combine_expr`` as each batch of ``inflight``
+    chunks finishes.  Whenever the running table grows past
+    ``comfortable_memory`` bytes its rows are hashed on their group columns
+    into ``nbuckets`` files in ``dirname`` and the table starts over empty.
+    Each group then lives in a single bucket so buckets are finished one at a
+    time in memory.
+
+    >>> from blaze import symbol, by
+    >>> t = symbol('t', 'var * {name: string, amount: int64}')
+    >>> expr = by(t.name, total=t.amount.sum())
+    >>> (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+    >>> combine_expr = split_combine(t, expr, agg)
+    >>> data = [[('Alice', 1), ('Bob', 2)], [('Alice', 3)]]
+    >>> func = curry(compute_chunk, chunk, chunk_expr)
+    >>> result = compute_grouped(func, data, t, expr, agg, combine_expr,
+    ...                          comfortable_memory=1)
+    >>> result.values.tolist()
+    [['Alice', 4], ['Bob', 2]]
+    """
+    if map is None:
+        map = get_default_pmap()
+    if inflight is None:
+        inflight = CHUNKS_IN_FLIGHT
+    if comfortable_memory is None:
+        comfortable_memory = min(1e9, available_memory() / 4)
+    nbuckets = nbuckets or GROUPBY_BUCKETS
+
+    center = path_split(leaf, expr)
+    group_fields = agg.fields[:len(center.grouper.fields)]
+    grouped = symbol('grouped', center.dshape)
+    (_, _), (_, group_expr) = split(leaf, center, agg=agg)
+
+    running = None
+    spills = []
+    tmp = None
+    try:
+        for batch in partition_all(inflight, seq):
+            parts = list(map(func, batch))
+            if running is not None:
+                parts.insert(0, running)
+            running = compute(combine_expr, {agg: concat_parts(parts)})
+            if nbytes(running) > comfortable_memory:
+                if tmp is None:
+                    tmp = tempfile.mkdtemp(suffix='-groupby', dir=dirname)
+                spills.append(partition_frames(
+                    [to_frame(running, agg.fields)], agg.fields,
+                    group_fields, nbuckets, tmp, 'spill-%d' % len(spills)))
+                running = None
+
+        if not spills:
+            if running is None:
+                raise ValueError("Can not compute on an empty sequence of "
+                                 "chunks")
+            result = compute(group_expr, {agg: running})
+        else:
+            if running is not None:
+                spills.append(partition_frames(
+                    [to_frame(running, agg.fields)], agg.fields,
+                    group_fields, nbuckets, tmp, 'spill-%d' % len(spills)))
+            parts = []
+            for b in range(nbuckets):
+                frames = [read_bucket(paths[b], empty)
+                          for paths, empty in spills if paths[b] is not None]
+                if frames:
+                    states = compute(combine_expr, {agg: pd.concat(frames)})
+                    parts.append(compute(group_expr, {agg: states}))
+            keys = list(center.fields[:len(group_fields)])
+            result = compute(grouped.sort(keys),
+                             {grouped: concat_parts(parts)})
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp)
+
+    return compute(expr._subs({center: grouped}), {grouped: result})
@@ -5,11 +5,13 @@ from datetime import date, datetime
 import toolz
 from toolz import first, concat, memoize, unique, assoc
 import itertools
+import threading
 from collections import Iterator
+from contextlib import contextmanager
 
 from ..compatibility import basestring
 from ..expr import Expr, Field, Symbol, symbol, eval_str
-from ..dispatch import dispatch
+from ..dispatch import dispatch, resolve
 
 __all__ = ['compute', 'compute_up']
 
@@ -81,6 +83,20 @@ def compute_down(expr, **kwargs):
     return expr
 
 
+def implemented(func, *args):
+    """ Does dispatched ``func`` have an implementation for these inputs?
+
+    Lookups are memoized on the input types, so probing for a missing
+    ``compute_down`` costs a dictionary lookup rather than a failed dispatch.
+
+    >>> implemented(compute_down, symbol('x', 'int'))
+    True
+    >>> implemented(compute_down, symbol('x', 'int'), object())
+    False
+    """
+    return resolve(func, *map(type, args)) is not None
+
+
 def issubtype(a, b):
     """ A custom issubclass """
     if issubclass(a, b):
@@ -113,7 +129,7 @@ def type_change(old, new):
     return not all(map(issubtype, new_types, old_types))
 
 
-def top_then_bottom_then_top_again_etc(expr, scope, **kwargs):
+def top_then_bottom_then_top_again_etc(expr, scope, trace=None, **kwargs):
     """ Compute expression against scope
 
     Does the following interpreter strategy:
@@ -143,25 +159,40 @@ def top_then_bottom_then_top_again_etc(expr, scope, **kwargs):
     bottom_up_until_type_break  -- uses this for bottom-up traversal
     top_to_bottom -- older version
     bottom_up -- older version still
+    replay -- re-runs a ``trace`` recorded by this function
     """
     # 0. Base case: expression is in dict, return associated data
     if expr in scope:
+        if trace is not None:
+            trace.append(('result', expr))
         return scope[expr]
 
     if not hasattr(expr, '_leaves'):
+        if trace is not None:
+            trace.append(('const', expr))
         return expr
 
     leaf_exprs = list(expr._leaves())
     leaf_data = [scope.get(leaf) for leaf in leaf_exprs]
 
     # 1. See if we have a direct computation path with compute_down
-    try:
-        return compute_down(expr, *leaf_data, **kwargs)
-    except NotImplementedError:
-        pass
+    if implemented(compute_down, expr, *leaf_data):
+        try:
+            result = compute_down(expr, *leaf_data, **kwargs)
+        except NotImplementedError:
+            pass
+        else:
+            if trace is not None:
+                trace.append(('down', expr, tuple(leaf_exprs)))
+            return result
 
     # 2. Compute from the bottom until there is a data type change
-    expr2, scope2 = bottom_up_until_type_break(expr, scope, **kwargs)
+    if trace is not None:
+        trace.append(('stage', expr))
+    expr2, scope2 = bottom_up_until_type_break(expr, scope, trace=trace,
+                                               **kwargs)
+    if trace is not None:
+        trace.append(('select', tuple(scope2)))
 
     # 3. Re-optimize data and expressions
     optimize_ = kwargs.get('optimize', optimize)
@@ -170,6 +201,9 @@ def top_then_bottom_then_top_again_etc(expr, scope, **kwargs):
         scope3 = dict((e, pre_compute_(expr2, datum,
                                        **assoc(kwargs, 'scope', scope2)))
                         for e, datum in scope2.items())
+        if trace is not None:
+            trace.append(('pre', expr2, dict((e, type(d))
+                                             for e, d in scope3.items())))
     else:
         scope3 = scope2
     if optimize_:
@@ -177,6 +211,9 @@ def top_then_bottom_then_top_again_etc(expr, scope, **kwargs):
             expr3 = optimize_(expr2, *[scope3[leaf] for leaf in expr2._leaves()])
             _d = dict(zip(expr2._leaves(), expr3._leaves()))
             scope4 = dict((e._subs(_d), d) for e, d in scope3.items())
+            if trace is not None:
+                trace.append(('optimize', dict((e, e._subs(_d))
+                                               for e in scope3)))
         except NotImplementedError:
             expr3 = expr2
             scope4 = scope3
@@ -190,7 +227,94 @@ def top_then_bottom_then_top_again_etc(expr, scope, **kwargs):
                 "expr: %s\n"
                 "data: %s" % (expr3, scope4))
     else:
-        return top_then_bottom_then_top_again_etc(expr3, scope4, **kwargs)
+        return top_then_bottom_then_top_again_etc(expr3, scope4, trace=trace,
+                                                  **kwargs)
+
+
+class TraceMismatch(Exception):
+    """ Data no longer follows the path recorded in a trace """
+
+
+def replay(trace, scope, **kwargs):
+    """ Re-run a computation recorded by ``top_then_bottom_then_top_again_etc``
+
+    The trace holds the sequence of ``compute_down``/``compute_up`` calls,
+    type breaks and re-optimized expressions from an earlier run.  Replaying
+    it on new data skips the traversal, leaf naming and ``optimize`` calls
+    entirely.
+
+    If intermediate results have different types than when the trace was
+    recorded, or a recorded implementation declines the new data, we go on
+    with ``top_then_bottom_then_top_again_etc`` from the results computed so
+    far.  Inputs such as iterators may already be consumed at that point so
+    we never start over.  A trace that ends without a result raises
+    ``TraceMismatch``.
+
+    >>> s = symbol('s', 'var * {name: string, amount: int}')
+    >>> trace = []
+    >>> top_then_bottom_then_top_again_etc(s.amount.sum() + 1,
+    ...                                    {s: [('Alice', 100), ('Bob', 200)]},
+    ...                                    trace=trace)
+    301
+    >>> replay(trace, {s: [('Charlie', 10), ('Dan', 20)]})
+    31
+    """
+    pre_compute_ = kwargs.get('pre_compute', pre_compute)
+
+    def resume(expr, scope, **kwargs):
+        # New leaves must not reuse the names of the recorded ones in scope
+        _, used_tokens = _leaf_names()
+        used_tokens.update((e._name, e._token) for e in scope
+                           if isinstance(e, Symbol))
+        return top_then_bottom_then_top_again_etc(expr, scope, **kwargs)
+
+    stage, done = None, dict()
+    for event in trace:
+        kind = event[0]
+        if kind == 'result':
+            return scope[event[1]]
+        elif kind == 'const':
+            return event[1]
+        elif kind == 'down':
+            _, expr, leaves = event
+            try:
+                return compute_down(expr, *[scope.get(leaf)
+                                            for leaf in leaves], **kwargs)
+            except NotImplementedError:
+                return resume(expr, scope, **kwargs)
+        elif kind == 'stage':
+            stage, done = event[1], dict()
+        elif kind == 'rename':
+            _, leaf, expr = event
+            scope[leaf] = scope[expr]
+        elif kind == 'up':
+            _, leaf, expr, new_expr, typ = event
+            try:
+                result = compute_up(new_expr,
+                                    *[scope[i] for i in new_expr._inputs],
+                                    scope=scope, **kwargs)
+            except NotImplementedError:
+                return resume(stage._subs(done), scope, **kwargs)
+            scope[leaf] = result
+            done[expr] = leaf
+            if type(result) is not typ:
+                return resume(stage._subs(done), scope, **kwargs)
+        elif kind == 'share':
+            _, leaf, expr = event
+            scope[leaf] = share_result(expr, scope[leaf])
+        elif kind == 'select':
+            scope = dict((e, scope[e]) for e in event[1])
+        elif kind == 'pre':
+            _, expr, types = event
+            scope = dict((e, pre_compute_(expr, datum,
+                                          **assoc(kwargs, 'scope', scope)))
+                         for e, datum in scope.items())
+            if any(type(d) is not types[e] for e, d in scope.items()):
+                return resume(expr, scope, **kwargs)
+        elif kind == 'optimize':
+            mapping = event[1]
+            scope = dict((mapping[e], d) for e, d in scope.items())
+    raise TraceMismatch()
 
 
 def top_to_bottom(d, expr, **kwargs):
@@ -206,10 +330,11 @@ def top_to_bottom(d, expr, **kwargs):
     data = [d.get(leaf) for leaf in leaves]
 
     # See if we have a direct computation path with compute_down
-    try:
-        return compute_down(expr, *data, **kwargs)
-    except NotImplementedError:
-        pass
+    if implemented(compute_down, expr, *data):
+        try:
+            return compute_down(expr, *data, **kwargs)
+        except NotImplementedError:
+            pass
 
     optimize_ = kwargs.get('optimize', optimize)
     pre_compute_ = kwargs.get('pre_compute', pre_compute)
@@ -242,11 +367,44 @@ def top_to_bottom(d, expr, **kwargs):
 
 _names = ('leaf_%d' % i for i in itertools.count(1))
 
-_leaf_cache = dict()
-_used_tokens = set()
+# Leaf naming state is kept per thread, one entry per running ``compute``, so
+# that concurrent and nested computations don't see each other's leaves
+_leaf_state = threading.local()
+
+
+def _leaf_names():
+    """ The (leaf cache, used tokens) pair of the innermost ``compute`` """
+    try:
+        stack = _leaf_state.stack
+    except AttributeError:
+        stack = _leaf_state.stack = [(dict(), set())]
+    return stack[-1]
+
+
+@contextmanager
+def leaf_names():
+    """ Give leaves created within this block fresh names
+
+    >>> t = symbol('t', '{x: int, y: int, z: int}')
+    >>> with leaf_names():
+    ...     outer = makeleaf(t.x)
+    ...     with leaf_names():
+    ...         inner = makeleaf(t.y)
+    >>> outer.isidentical(inner)
+    False
+    """
+    _leaf_names()
+    _leaf_state.stack.append((dict(), set()))
+    try:
+        yield
+    finally:
+        _leaf_state.stack.pop()
+
+
 def _reset_leaves():
-    _leaf_cache.clear()
-    _used_tokens.clear()
+    leaf_cache, used_tokens = _leaf_names()
+    leaf_cache.clear()
+    used_tokens.clear()
 
 def makeleaf(expr):
     """ Name of a new leaf replacement for this expression
@@ -273,19 +431,20 @@ def makeleaf(expr):
     >>> makeleaf(t) is t  # makeleaf passes on Symbols
     True
     """
+    leaf_cache, used_tokens = _leaf_names()
     name = expr._name or '_'
     token = None
-    if expr in _leaf_cache:
-        return _leaf_cache[expr]
+    if expr in leaf_cache:
+        return leaf_cache[expr]
     if isinstance(expr, Symbol):  # Idempotent on symbols
         return expr
-    if (name, token) in _used_tokens:
+    if (name, token) in used_tokens:
         for token in itertools.count():
-            if (name, token) not in _used_tokens:
+            if (name, token) not in used_tokens:
                 break
     result = symbol(name, expr.dshape, token)
-    _used_tokens.add((name, token))
-    _leaf_cache[expr] = result
+    used_tokens.add((name, token))
+    leaf_cache[expr] = result
     return result
 
 
@@ -293,7 +452,32 @@ def data_leaves(expr, scope):
     return [scope[leaf] for leaf in expr._leaves()]
 
 
-def bottom_up_until_type_break(expr, scope, **kwargs):
+def repeated_subterms(expr):
+    """ Subexpressions that occur more than once within an expression
+
+    >>> t = symbol('t', 'var * {a: int, b: int}')
+    >>> e = (t.a + t.b) / (t.a + t.b).sum()
+    >>> sorted(map(str, repeated_subterms(e)))
+    ['t', 't.a', 't.a + t.b', 't.b']
+    """
+    counts = dict()
+    for term in expr._subterms():
+        if isinstance(term, Expr):
+            counts[term] = counts.get(term, 0) + 1
+    return set(term for term, n in counts.items() if n > 1)
+
+
+@dispatch(Expr, object)
+def share_result(expr, data):
+    """ Prepare the result of a repeated subexpression for reuse
+
+    Backends may override this, e.g. to turn a query into a common table
+    expression that later references select from rather than recompute.
+    """
+    return data
+
+
+def bottom_up_until_type_break(expr, scope, trace=None, common=None, **kwargs):
     """ Traverse bottom up until data changes significantly
 
     Parameters
@@ -334,17 +518,32 @@ def bottom_up_until_type_break(expr, scope, **kwargs):
     >>> e = s.amount.sum() + 1
     >>> bottom_up_until_type_break(e, {s: data})
     (amount_sum + 1, {amount_sum: 600})
+
+    Subexpressions that occur several times are computed only once.  Their
+    results, or their partial results if they span a type break, are held in
+    ``common``, a dict keyed by the repeated subexpressions of the top-level
+    call.
     """
     # 0. Base case.  Return if expression is in scope
     if expr in scope:
         leaf = makeleaf(expr)
+        if trace is not None and leaf is not expr:
+            trace.append(('rename', leaf, expr))
         return leaf, {leaf: scope[expr]}
 
+    if common is None:
+        common = dict((e, None) for e in repeated_subterms(expr))
+    elif common.get(expr) is not None:
+        return common[expr]
+
     inputs = list(unique(expr._inputs))
 
     # 1. Recurse down the tree, calling this function on children
     #    (this is the bottom part of bottom up)
-    exprs, new_scopes = zip(*[bottom_up_until_type_break(i, scope, **kwargs)
+    exprs, new_scopes = zip(*[bottom_up_until_type_break(i, scope,
+                                                         trace=trace,
+                                                         common=common,
+                                                         **kwargs)
                              for i in inputs])
 
     # 2. Form new (much shallower) expression and new (more computed) scope
@@ -355,10 +554,15 @@ def bottom_up_until_type_break(expr, scope, **kwargs):
     old_expr_leaves = expr._leaves()
     old_data_leaves = [scope.get(leaf) for leaf in old_expr_leaves]
 
-    # 3. If the leaves have changed substantially then stop
+    # 3. If the leaves have changed substantially then stop.  Repeated
+    #    subexpressions keep this partial result so that later references
+    #    stop here too rather than walking down to the type break again.
     key = lambda x: str(type(x))
     if type_change(sorted(new_scope.values(), key=key),
                    sorted(old_data_leaves, key=key)):
+        if expr in common and not any(isinstance(v, Iterator)
+                                      for v in new_scope.values()):
+            common[expr] = new_expr, new_scope
         return new_expr, new_scope
     # 4. Otherwise try to do some actual work
     try:
@@ -366,11 +570,23 @@ def bottom_up_until_type_break(expr, scope, **kwargs):
         _data = [new_scope[i] for i in new_expr._inputs]
     except KeyError:
         return new_expr, new_scope
+    if not implemented(compute_up, new_expr, *_data):
+        return new_expr, new_scope
     try:
-        return leaf, {leaf: compute_up(new_expr, *_data, scope=new_scope,
-                                       **kwargs)}
+        result = compute_up(new_expr, *_data, scope=new_scope, **kwargs)
     except NotImplementedError:
         return new_expr, new_scope
+    if trace is not None:
+        trace.append(('up', leaf, expr, new_expr, type(result)))
+
+    # 5. Keep results of repeated subexpressions for reuse.  Iterators can
+    #    only be consumed once so we recompute those instead.
+    if expr in common and not isinstance(result, Iterator):
+        result = share_result(new_expr, result)
+        if trace is not None:
+            trace.append(('share', leaf, new_expr))
+        common[expr] = leaf, {leaf: result}
+    return leaf, {leaf: result}
 
 
 def bottom_up(d, expr):
@@ -442,36 +658,182 @@ def compute(expr, d, **kwargs):
     >>> list(compute(deadbeats, {t: data}))
     ['Bob', 'Charlie']
     """
-    _reset_leaves()
-    optimize_ = kwargs.get('optimize', optimize)
-    pre_compute_ = kwargs.get('pre_compute', pre_compute)
-    post_compute_ = kwargs.get('post_compute', post_compute)
+    with leaf_names():
+        optimize_ = kwargs.get('optimize', optimize)
+        pre_compute_ = kwargs.get('pre_compute', pre_compute)
+        post_compute_ = kwargs.get('post_compute', post_compute)
 
-    expr2, d2 = swap_resources_into_scope(expr, d)
-    if pre_compute_:
-        d3 = dict([(e, pre_compute_(expr2, dat, **kwargs))
-                        for e, dat in d2.items()
-                        if e in expr2])
-    else:
-        d3 = d2
+        expr2, d2 = swap_resources_into_scope(expr, d)
+        if pre_compute_:
+            d3 = dict([(e, pre_compute_(expr2, dat, **kwargs))
+                            for e, dat in d2.items()
+                            if e in expr2])
+        else:
+            d3 = d2
 
-    if optimize_:
-        try:
-            expr3 = optimize_(expr2, *[v for e, v in d3.items() if e in expr2])
-            _d = dict(zip(expr2._leaves(), expr3._leaves()))
-            d4 = dict((e._subs(_d), d) for e, d in d3.items())
-        except NotImplementedError:
+        if optimize_:
+            try:
+                expr3 = optimize_(expr2, *[v for e, v in d3.items()
+                                             if e in expr2])
+                _d = dict(zip(expr2._leaves(), expr3._leaves()))
+                d4 = dict((e._subs(_d), d) for e, d in d3.items())
+            except NotImplementedError:
+                expr3 = expr2
+                d4 = d3
+        else:
             expr3 = expr2
             d4 = d3
-    else:
-        expr3 = expr2
-        d4 = d3
 
-    result = top_then_bottom_then_top_again_etc(expr3, d4, **kwargs)
-    if post_compute_:
-        result = post_compute_(expr3, result, scope=d4)
+        result = top_then_bottom_then_top_again_etc(expr3, d4, **kwargs)
+        if post_compute_:
+            result = post_compute_(expr3, result, scope=d4)
 
-    return result
+        return result
+
+
+class Plan(object):
+    """ A reusable plan to compute an expression
+
+    Computing an expression involves more than the backend calls themselves.
+    We swap resources into scope, ``pre_compute`` and ``optimize`` the
+    expression, traverse it to find type breaks and name new leaves.  A
+    ``Plan`` does all of this once per combination of input types, records the
+    resulting sequence of ``compute_down``/``compute_up`` calls, and replays
+    that sequence on later inputs of the same types.
+
+    Plans assume that ``optimize`` depends only on the expression and the
+    types of its inputs.  Traces are kept per combination of input types and
+    of the ``optimize``, ``pre_compute`` and ``post_compute`` keywords.  If, on
+    replay, ``pre_compute`` returns other types than when the trace was
+    recorded (e.g. chunks for a large CSV file where a small one gave a
+    DataFrame) we compute from the pre-computed data without a trace.  If
+    intermediate results stop following the trace, or a recorded
+    implementation declines the new data, we go on from the results computed
+    so far.  Either way no input is read twice.  Errors raised by compute
+    functions propagate.
+
+    Use ``compile_plan`` to construct plans.
+
+    >>> t = symbol('t', 'var * {name: string, balance: int}')
+    >>> plan = compile_plan(t[t.balance < 0].name)
+    >>> list(plan({t: [['Alice', 100], ['Bob', -50]]}))
+    ['Bob']
+    >>> list(plan({t: [['Charlie', -20], ['Dan', 10]]}))
+    ['Charlie']
+    """
+    def __init__(self, expr, leaf_types=None):
+        self.expr, self.resources = swap_resources_into_scope(expr, {})
+        self.leaves = tuple(leaf for leaf in self.expr._leaves()
+                            if leaf not in self.resources)
+        self.leaf_types = leaf_types
+        self.traces = dict()
+
+    def __call__(self, data, **kwargs):
+        if isinstance(data, dict):
+            scope = toolz.merge(self.resources, data)
+        elif len(self.leaves) == 1:
+            scope = toolz.merge(self.resources, {self.leaves[0]: data})
+        else:
+            raise ValueError("Give plan dictionary input, got %s" % str(data))
+
+        types = tuple(type(scope[leaf]) for leaf in self.leaves)
+        if self.leaf_types is not None:
+            expected = tuple(self.leaf_types[leaf] for leaf in self.leaves)
+            if not all(map(issubclass, types, expected)):
+                raise TypeError("Plan compiled for inputs of types %s, got %s"
+                                % (expected, types))
+
+        key = types, tuple((k, kwargs[k]) for k in _plan_keywords
+                           if k in kwargs)
+        with leaf_names():
+            if key in self.traces:
+                return self._replay(self.traces[key], scope, **kwargs)
+            return self._record(key, scope, **kwargs)
+
+    def _pre_compute(self, scope, **kwargs):
+        pre_compute_ = kwargs.get('pre_compute', pre_compute)
+        if pre_compute_:
+            scope = dict((e, pre_compute_(self.expr, dat, **kwargs))
+                         for e, dat in scope.items()
+                         if e in self.expr)
+        return scope
+
+    def _record(self, key, scope, **kwargs):
+        """ Compute as ``compute(Expr, dict)`` does, recording a trace """
+        scope = self._pre_compute(scope, **kwargs)
+        pre_types = dict((e, type(d)) for e, d in scope.items())
+        trace = []
+        mapping, expr, result = self._compute(scope, trace=trace, **kwargs)
+        self.traces[key] = (pre_types, mapping, expr, trace)
+        return result
+
+    def _compute(self, scope, trace=None, **kwargs):
+        """ Optimize, compute and post-compute on pre-computed data """
+        optimize_ = kwargs.get('optimize', optimize)
+        post_compute_ = kwargs.get('post_compute', post_compute)
+
+        expr = self.expr
+        mapping = dict((e, e) for e in scope)
+        if optimize_:
+            try:
+                expr2 = optimize_(expr, *[v for e, v in scope.items()
+                                            if e in expr])
+                _d = dict(zip(expr._leaves(), expr2._leaves()))
+                mapping = dict((e, e._subs(_d)) for e in scope)
+                scope = dict((mapping[e], d) for e, d in scope.items())
+                expr = expr2
+            except NotImplementedError:
+                pass
+
+        result = top_then_bottom_then_top_again_etc(expr, scope, trace=trace,
+                                                    **kwargs)
+        if post_compute_:
+            result = post_compute_(expr, result, scope=scope)
+        return mapping, expr, result
+
+    def _replay(self, recorded, scope, **kwargs):
+        pre_types, mapping, expr, trace = recorded
+        post_compute_ = kwargs.get('post_compute', post_compute)
+
+        scope = self._pre_compute(scope, **kwargs)
+        if (set(scope) != set(pre_types) or
+            any(type(d) is not pre_types[e] for e, d in scope.items())):
+            return self._compute(scope, **kwargs)[2]
+        scope = dict((mapping[e], d) for e, d in scope.items())
+
+        result = replay(trace, dict(scope), **kwargs)
+
+        if post_compute_:
+            result = post_compute_(expr, result, scope=scope)
+        return result
+
+
+# Keywords of ``compute`` that change the path a computation takes
+_plan_keywords = ('optimize', 'pre_compute', 'post_compute')
+
+
+def compile_plan(expr, leaf_types=None):
+    """ Plan the computation of ``expr`` for repeated use on fresh data
+
+    Returns a ``Plan``, a callable that computes ``expr`` against a
+    dictionary mapping leaves to data (or against a single piece of data if
+    there is only one leaf).  Planning work is done on the first call for each
+    combination of input types and reused afterwards.
+
+    Parameters
+    ----------
+
+    expr: Expr
+        The expression to compute
+    leaf_types: dict, optional
+        Mapping of leaf symbols to the types of data that the plan accepts
+
+    >>> t = symbol('t', 'var * {name: string, balance: int}')
+    >>> total = compile_plan(t.balance.sum(), {t: list})
+    >>> total([['Alice', 100], ['Bob', -50]])
+    50
+    """
+    return Plan(expr, leaf_types)
 
 
 @dispatch(Field, dict)
@@ -2,7 +2,7 @@ from __future__ import absolute_import, division, print_function
 
 import pandas
 import os
-from toolz import curry, concat, map
+from toolz import curry, concat, map, peek
 import pandas as pd
 import numpy as np
 from collections import Iterator, Iterable
@@ -12,23 +12,27 @@ from odo.backends.csv import CSV, csv_to_DataFrame
 from multipledispatch import MDNotImplementedError
 
 from ..dispatch import dispatch
-from ..expr import Expr, Head, ElemWise, Distinct, Symbol, Projection, Field
+from ..expr import (Expr, Head, ElemWise, Distinct, Symbol, Projection, Field,
+                    Sort, By)
 from ..expr.core import path
 from ..utils import available_memory
-from ..expr.split import split
+from ..expr.split import split, split_combine, path_split
 from .core import compute
-from ..expr.optimize import lean_projection
-from .pmap import get_default_pmap
+from ..expr.optimize import lean_projection, push_predicates, drop_sorts
+from .chunks import (compute_chunks, compute_sorted, compute_grouped,
+                     has_moments, center_moments)
 
 
 @dispatch(Expr, CSV)
 def optimize(expr, _):
-    return lean_projection(expr)  # This is handled in pre_compute
+    # This is handled in pre_compute
+    return lean_projection(push_predicates(expr))
 
 
 @dispatch(Expr, CSV)
 def pre_compute(expr, data, comfortable_memory=None, chunksize=2**18, **kwargs):
     comfortable_memory = comfortable_memory or min(1e9, available_memory() / 4)
+    scope = kwargs.get('scope') or dict()
 
     kwargs = dict()
 
@@ -39,8 +43,12 @@ def pre_compute(expr, data, comfortable_memory=None, chunksize=2**18, **kwargs):
         chunksize = None
 
     # Insert projection into read_csv
-    oexpr = optimize(expr, data)
-    leaf = oexpr._leaves()[0]
+    try:
+        oexpr = optimize(expr, data)
+    except NotImplementedError:  # e.g. joins
+        oexpr = expr
+    leaves = oexpr._leaves()
+    leaf = ([l for l in leaves if scope.get(l) is data] or leaves)[0]
     pth = list(path(oexpr, leaf))
     if len(pth) >= 2 and isinstance(pth[-2], (Projection, Field)):
         kwargs['usecols'] = pth[-2].fields
@@ -67,20 +75,45 @@ def compute_chunk(chunk, chunk_expr, part):
 
 
 @dispatch(Expr, pandas.io.parsers.TextFileReader)
-def compute_down(expr, data, map=None, **kwargs):
-    if map is None:
-        map = get_default_pmap()
+def compute_down(expr, data, map=None, inflight=None, comfortable_memory=None,
+                 nbuckets=None, dirname=None, **kwargs):
     leaf = expr._leaves()[0]
+    expr = drop_sorts(expr)
+
+    if has_moments(expr):
+        part, data = peek(data)
+        expr = center_moments(expr, leaf, part)
 
     (chunk, chunk_expr), (agg, agg_expr) = split(leaf, expr)
 
-    parts = list(map(curry(compute_chunk, chunk, chunk_expr), data))
+    # Only large files are read in chunks, sort those externally
+    if isinstance(path_split(leaf, expr), Sort):
+        return compute_sorted(curry(compute_chunk, chunk, chunk_expr), data,
+                              leaf, expr, agg, map=map, inflight=inflight,
+                              dirname=dirname)
+
+    combine_expr = split_combine(leaf, expr, agg)
 
-    if isinstance(parts[0], np.ndarray):
-        intermediate = np.concatenate(parts)
-    elif isinstance(parts[0], pd.DataFrame):
-        intermediate = pd.concat(parts)
-    elif isinstance(parts[0], (Iterable, Iterator)):
-        intermediate = concat(parts)
+    if isinstance(path_split(leaf, expr), By):
+        return compute_grouped(curry(compute_chunk, chunk, chunk_expr), data,
+                               leaf, expr, agg, combine_expr, map=map,
+                               inflight=inflight,
+                               comfortable_memory=comfortable_memory,
+                               nbuckets=nbuckets, dirname=dirname)
+
+    intermediate = compute_chunks(curry(compute_chunk, chunk, chunk_expr),
+                                  data, agg, combine_expr, map=map,
+                                  inflight=inflight)
 
     return compute(agg_expr, {agg: intermediate})
+
+
+@dispatch(Expr, pandas.io.parsers.TextFileReader, pd.DataFrame)
+def compute_down(expr, lhs, rhs, **kwargs):
+    """ Stream a large CSV file through a join with a small DataFrame """
+    return compute_down(expr, chunks(pd.DataFrame)(lhs), rhs, **kwargs)
+
+
+@dispatch(Expr, pd.DataFrame, pandas.io.parsers.TextFileReader)
+def compute_down(expr, lhs, rhs, **kwargs):
+    return compute_down(expr, lhs, chunks(pd.DataFrame)(rhs), **kwargs)
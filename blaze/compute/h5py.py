@@ -8,12 +8,15 @@ from toolz import curry
 
 from ..partition import partitions
 from ..expr import Reduction, Field, symbol
-from ..expr import Expr, Slice, ElemWise
+from ..expr import Expr, Slice, ElemWise, Head, TopK, Sort
 from ..expr import nelements
 from ..expr import path, shape, Symbol
-from ..expr.split import split
+from ..expr.optimize import drop_sorts
+from ..expr.split import split, split_combine, path_split
 
 from .core import compute
+from .chunks import (compute_chunks, compute_sorted, has_moments,
+                     center_moments)
 from ..dispatch import dispatch
 from ..utils import available_memory, thread_pool
 
@@ -123,8 +126,14 @@ def compute_chunk(source, target, chunk, chunk_expr, parts):
     target[target_part] = result
 
 
+def compute_part(source, chunk, chunk_expr, part):
+    """ Pull out a part and compute on it """
+    return compute(chunk_expr, {chunk: source[part]})
+
+
 @dispatch(Expr, h5py.Dataset)
-def compute_down(expr, data, map=thread_pool.map, **kwargs):
+def compute_down(expr, data, map=thread_pool.map, comfortable_memory=None,
+                 **kwargs):
     """ Compute expressions on H5Py datasets by operating on chunks
 
     This uses blaze.expr.split to break a full-array-computation into a
@@ -140,12 +149,41 @@ def compute_down(expr, data, map=thread_pool.map, **kwargs):
     result and the final result are assumed to fit into memory
     """
     leaf = expr._leaves()[0]
-    if not any(isinstance(node, Reduction) for node in path(expr, leaf)):
-        raise MDNotImplementedError()
+    expr = drop_sorts(expr)
 
     # Compute chunksize (this should be improved)
     chunksize = kwargs.get('chunksize', data.chunks)
 
+    # Top-k: keep the best elements of each chunk, folding as we go
+    if leaf.ndim == 1 and isinstance(path_split(leaf, expr), (Head, TopK)):
+        chunk = symbol('chunk', DataShape(*(chunksize + (leaf.dshape.measure,))))
+        (chunk, chunk_expr), (agg, agg_expr) = split(leaf, expr, chunk=chunk)
+        intermediate = compute_chunks(curry(compute_part, data, chunk,
+                                            chunk_expr),
+                                      partitions(data, chunksize=chunksize),
+                                      agg, split_combine(leaf, expr, agg),
+                                      map=map)
+        return compute(agg_expr, {agg: intermediate})
+
+    # Sort: merge sorted runs from disk if the dataset is large
+    if leaf.ndim == 1 and isinstance(path_split(leaf, expr), Sort):
+        comfortable_memory = (comfortable_memory or
+                              min(1e9, available_memory() / 4))
+        if data.dtype.itemsize * data.size <= comfortable_memory:
+            raise MDNotImplementedError()
+        chunk = symbol('chunk', DataShape(*(chunksize + (leaf.dshape.measure,))))
+        (chunk, chunk_expr), (agg, agg_expr) = split(leaf, expr, chunk=chunk)
+        return compute_sorted(curry(compute_part, data, chunk, chunk_expr),
+                              partitions(data, chunksize=chunksize),
+                              leaf, expr, agg, map=map)
+
+    if not any(isinstance(node, Reduction) for node in path(expr, leaf)):
+        raise MDNotImplementedError()
+
+    if has_moments(expr):
+        part = next(iter(partitions(data, chunksize=chunksize)))
+        expr = center_moments(expr, leaf, data[part])
+
     # Split expression into per-chunk and on-aggregate pieces
     chunk = symbol('chunk', DataShape(*(chunksize + (leaf.dshape.measure,))))
     (chunk, chunk_expr), (agg, agg_expr) = \
@@ -115,10 +115,11 @@ class MongoQuery(object):
 
 
 from ..expr.broadcast import broadcast_collect
+from ..expr.optimize import push_predicates
 
 @dispatch(Expr, (MongoQuery, Collection))
 def optimize(expr, seq):
-    return broadcast_collect( expr)
+    return broadcast_collect(push_predicates(expr))
 
 
 @dispatch(Head, MongoQuery)
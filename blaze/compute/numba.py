@@ -1,28 +1,50 @@
+""" Numba compiled kernels for Broadcast expressions
+
+Elementwise arithmetic, math and maps over NumPy arrays and pandas Series are
+fused into ``Broadcast`` expressions.  Each fused scalar expression compiles
+to a single numba ufunc, typed by the dtypes of the data it meets, so that we
+make one pass over memory rather than one per operation.
+
+Kernels are kept in memory per expression and dtypes.  If ``cache_dir`` is set,
+either directly or with the ``BLAZE_NUMBA_CACHE_DIR`` environment variable,
+kernels built only from arithmetic and the ``math`` module are also written as
+small modules there; numba caches their machine code next to them so that
+other processes skip compilation.  Expressions numba can not compile, like those on
+strings or Python objects, fall back to NumPy and pandas (see
+``broadcast_ndarray`` in ``blaze.compute.numpy``).
+"""
 from __future__ import absolute_import, division, print_function
 
+import hashlib
+import os
+import tempfile
+
 import numpy as np
+import pandas as pd
 
-from .core import compute, optimize
-from ..expr import Expr, Arithmetic, Math, Map, UnaryOp
+from ..expr import Expr, Arithmetic, Math, Map, UnaryOp, symbol
 from ..expr.broadcast import broadcast_collect, Broadcast
+from ..expr.optimize import fuse_top_k
 from toolz import memoize
 import datashape
+from datashape import discover
+from datashape.typesets import floating
 import numba
 from .pyfunc import funcstr
 
 
+# Directory of generated kernel modules, None compiles in memory only
+cache_dir = os.environ.get('BLAZE_NUMBA_CACHE_DIR') or None
+
+
 Broadcastable = Arithmetic, Math, Map, UnaryOp
 
 
 def optimize_ndarray(expr, *data, **kwargs):
-    return broadcast_collect(expr, Broadcastable=Broadcastable,
+    return broadcast_collect(fuse_top_k(expr), Broadcastable=Broadcastable,
                              WantToBroadcast=Broadcastable)
 
 
-for i in range(1, 11):
-    optimize.register(Expr, *([np.ndarray] * i))(optimize_ndarray)
-
-
 def get_numba_type(dshape):
     """Get the ``numba`` type corresponding to the ``datashape.Mono`` instance
     `dshape`
@@ -115,7 +137,7 @@ def get_numba_type(dshape):
     return restype
 
 
-def compute_signature(expr):
+def compute_signature(expr, leaves=None):
     """Get the ``numba`` *function signature* corresponding to ``DataShape``
 
     Examples
@@ -137,6 +159,11 @@ def compute_signature(expr):
     >>> compute_signature(expr)  # only looks at leaf nodes
     int64(datetime64(us))
 
+    Pass ``leaves`` to fix the order of the arguments
+
+    >>> compute_signature(s + t, leaves=[t, s])
+    float64(float32, int64)
+
     Notes
     -----
     * This could potentially be adapted/refactored to deal with
@@ -145,7 +172,7 @@ def compute_signature(expr):
     """
     assert datashape.isscalar(expr.schema)
     restype = get_numba_type(expr.schema)
-    argtypes = [get_numba_type(e.schema) for e in expr._leaves()]
+    argtypes = [get_numba_type(e.schema) for e in (leaves or expr._leaves())]
     return restype(*argtypes)
 
 
@@ -191,11 +218,17 @@ def _get_numba_ufunc(expr):
     # we may not have a Broadcast instance because arithmetic expressions can
     # be vectorized so we use getattr
     s, scope = funcstr(leaves, expr)
+    sig = compute_signature(expr, leaves)
+
+    if cache_dir and set(scope) <= set(['math']) and cacheable(sig):
+        try:
+            return load_kernel(s, sig)
+        except (IOError, OSError):  # read-only or full disk, compile anyway
+            pass
 
     scope = dict((k, numba.jit(nopython=True)(v) if callable(v) else v)
                  for k, v in scope.items())
     func = eval(s, scope)
-    sig = compute_signature(expr)
     return numba.vectorize([sig], nopython=True)(func)
 
 
@@ -203,10 +236,303 @@ def _get_numba_ufunc(expr):
 get_numba_ufunc = memoize(_get_numba_ufunc)
 
 
+def cacheable(sig):
+    """ Can we spell this signature in the source of a kernel module? """
+    return all(isinstance(t, (numba.types.Boolean, numba.types.Number))
+               for t in (sig.return_type,) + tuple(sig.args))
+
+
+def type_source(t):
+    """ Source of a numba type
+
+    >>> type_source(numba.float64)
+    'numba.float64'
+    >>> type_source(numba.bool_)
+    'numba.boolean'
+    """
+    if isinstance(t, numba.types.Boolean):
+        return 'numba.boolean'
+    return 'numba.%s' % t
+
+
+def kernel_source(s, sig):
+    """ Source of a module defining lambda string ``s`` as a cached ufunc
+
+    >>> print(kernel_source('lambda x, y: x + y',
+    ...                     numba.float64(numba.float64, numba.int64)))
+    import math
+    import numba
+    <BLANKLINE>
+    <BLANKLINE>
+    @numba.vectorize([numba.float64(numba.float64, numba.int64)],
+                     nopython=True, cache=True)
+    def kernel(x, y):
+        return x + y
+    <BLANKLINE>
+    """
+    args, body = s[len('lambda '):].split(': ', 1)
+    signature = '%s(%s)' % (type_source(sig.return_type),
+                            ', '.join(map(type_source, sig.args)))
+    return ('import math\n'
+            'import numba\n\n\n'
+            '@numba.vectorize([%s],\n'
+            '                 nopython=True, cache=True)\n'
+            'def kernel(%s):\n'
+            '    return %s\n' % (signature, args, body))
+
+
+def load_module(name, path):
+    try:
+        from importlib.util import spec_from_file_location, module_from_spec
+    except ImportError:  # Python 2
+        import imp
+        return imp.load_source(name, path)
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_kernel(s, sig):
+    """ Ufunc of lambda string ``s`` from a module in ``cache_dir`` """
+    return load_source(kernel_source(s, sig)).kernel
+
+
+def load_source(source):
+    """ Module of ``source`` written to ``cache_dir``
+
+    The module is named by a hash of its source so every process that meets
+    the same expression and dtypes finds the same module, and with it the
+    machine code that numba cached on first compilation.
+    """
+    name = 'kernel_' + hashlib.sha1(source.encode('utf-8')).hexdigest()
+    path = os.path.join(cache_dir, name + '.py')
+    if not os.path.exists(path):
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:  # made by another process in the meantime
+                if not os.path.isdir(cache_dir):
+                    raise
+        # Write then rename so that no process reads a partial module
+        fd, tmp = tempfile.mkstemp(suffix='.py', dir=cache_dir)
+        with os.fdopen(fd, 'w') as f:
+            f.write(source)
+        os.rename(tmp, path)
+    return load_module(name, path)
+
+
+def measure_of(x):
+    """ Datashape measure of the elements of ``x``
+
+    >>> measure_of(np.array([1, 2], dtype='i4'))
+    ctype("int32")
+    >>> measure_of(1.0)
+    ctype("float64")
+    """
+    if isinstance(x, (np.ndarray, pd.Series)):
+        return datashape.from_numpy((), x.dtype).measure
+    return discover(x).measure
+
+
+def retype(expr, data):
+    """ Broadcast ``expr`` with its scalar leaves typed like ``data``
+
+    Kernels are typed by the data they meet rather than by the declared
+    datashape so that, say, an ``int32`` column declared as ``int64`` does not
+    cast on the way in.
+
+    >>> from blaze import symbol
+    >>> x = symbol('x', 'int64')
+    >>> expr = Broadcast((symbol('a', 'var * int64'),), (x,), x + 1)
+    >>> retype(expr, [np.array([1, 2], dtype='i4')])._scalar_expr.dshape
+    dshape("int32")
+    """
+    scalars = tuple(symbol(s._name, measure_of(d))
+                    if datashape.isscalar(s.dshape) else s
+                    for s, d in zip(expr._scalars, data))
+    return Broadcast(expr._children, scalars,
+                     expr._scalar_expr._subs(dict(zip(expr._scalars,
+                                                      scalars))))
+
+
+failed = set()
+
+
+def get_kernel(expr, data):
+    """ Compiled ufunc for Broadcast ``expr`` on ``data``, None if numba can
+    not compile it """
+    try:
+        expr = retype(expr, data)
+    except (TypeError, ValueError, NotImplementedError):
+        return None
+    if expr in failed:
+        return None
+    try:
+        return get_numba_ufunc(expr)
+    except Exception:  # numba raises many kinds of typing and lowering errors
+        failed.add(expr)
+        return None
+
+
+def aligned(data):
+    """ Do all of the Series in ``data`` share an index? """
+    indexes = [d.index for d in data if isinstance(d, pd.Series)]
+    return all(ind is indexes[0] or ind.equals(indexes[0])
+               for ind in indexes[1:])
+
+
 def broadcast_numba(t, *data, **kwargs):
+    """ Evaluate Broadcast ``t`` on arrays or Series with a numba ufunc
+
+    Raises ``NotImplementedError`` on expressions or data that numba can not
+    compile so that callers may fall back to another engine.
+    """
+    kernel = get_kernel(t, data) if aligned(data) else None
+    if kernel is None:
+        raise NotImplementedError("Numba can not compile %s" % t)
+
+    result = kernel(*[d.values if isinstance(d, pd.Series) else d
+                      for d in data])
+    series = [d for d in data if isinstance(d, pd.Series)]
+    if series:
+        return pd.Series(result, index=series[0].index, name=t._name)
+    return result
+
+
+# Neumaier's compensated sum of floats.  ``comp`` gathers the low order bits
+# that adding ``x`` to ``acc`` rounds away.  It turns NaN once ``acc`` reaches
+# infinity, then we return ``acc`` alone.
+compensated = ('acc = 0.0\n    comp = 0.0',
+               'total = acc + x\n'
+               '        if abs(acc) >= abs(x):\n'
+               '            comp += (acc - total) + x\n'
+               '        else:\n'
+               '            comp += (x - total) + acc\n'
+               '        acc = total',
+               '(acc + comp if comp == comp else acc)')
+
+# Initial accumulator, loop body and result of each fusable reduction.  The
+# loop binds each element of the Broadcast to ``x``.  ``x != x`` is true for
+# NaN, which min and max propagate as NumPy does.  Sums and means of floats
+# use the compensated loops ``fsum`` and ``fmean``.
+loops = {
+    'sum': ('acc = 0', 'acc += x', 'acc'),
+    'mean': ('acc = 0.0', 'acc += x', 'acc / n'),
+    'fsum': compensated,
+    'fmean': compensated[:2] + (compensated[2] + ' / n',),
+    'min': (None, 'if x < acc or x != x:\n            acc = x', 'acc'),
+    'max': (None, 'if x > acc or x != x:\n            acc = x', 'acc'),
+    'any': ('', 'if x:\n            return True', 'False'),
+    'all': ('', 'if not x:\n            return False', 'True'),
+}
+
+
+def reduction_source(reduction, s, arrays, cache=True):
+    """ Source of a module that folds lambda string ``s`` over arrays
+
+    ``arrays`` flags which arguments are arrays rather than scalars.
+
+    >>> print(reduction_source('sum', 'lambda _0, _1: _0 * _1 + 1',
+    ...                        (True, False)))
+    import math
+    import numba
+    <BLANKLINE>
+    <BLANKLINE>
+    @numba.njit(nogil=True, cache=True)
+    def f(_0, _1):
+        return _0 * _1 + 1
+    <BLANKLINE>
+    <BLANKLINE>
+    @numba.njit(nogil=True, cache=True)
+    def kernel(_0, _1):
+        n = _0.shape[0]
+        acc = 0
+        for i in range(0, n):
+            x = f(_0[i], _1)
+            acc += x
+        return acc
+    <BLANKLINE>
+    """
+    args, body = s[len('lambda '):].split(': ', 1)
+    names = args.split(', ')
+    init, update, result = loops[reduction]
+    start = 0
+    if init is None:  # start from the first element
+        init = 'acc = f(%s)' % ', '.join('%s[0]' % name if array else name
+                                        for name, array in zip(names, arrays))
+        start = 1
+    items = ', '.join('%s[i]' % name if array else name
+                      for name, array in zip(names, arrays))
+    decorator = '@numba.njit(nogil=True%s)' % (', cache=True' if cache else '')
+    return ('import math\n'
+            'import numba\n\n\n'
+            '%s\n'
+            'def f(%s):\n'
+            '    return %s\n\n\n'
+            '%s\n'
+            'def kernel(%s):\n'
+            '    n = %s.shape[0]\n'
+            '%s'
+            '    for i in range(%d, n):\n'
+            '        x = f(%s)\n'
+            '        %s\n'
+            '    return %s\n' % (decorator, args, body, decorator, args,
+                                  names[arrays.index(True)],
+                                  '    %s\n' % init if init else '',
+                                  start, items, update, result))
+
+
+@memoize
+def get_reduction_kernel(reduction, expr, scalars, arrays):
+    """ Compiled loop of ``reduction`` over scalar expression ``expr`` """
+    s, scope = funcstr(scalars, expr)
+    if cache_dir and set(scope) <= set(['math']):
+        try:
+            return load_source(reduction_source(reduction, s, arrays)).kernel
+        except (IOError, OSError):  # read-only or full disk, compile anyway
+            pass
+
+    namespace = dict((k, numba.njit(v) if callable(v) else v)
+                     for k, v in scope.items())
+    exec(reduction_source(reduction, s, arrays, cache=False), namespace)
+    return namespace['kernel']
+
+
+def reduce_numba(t, *data, **kwargs):
+    """ Evaluate BroadcastReduction ``t`` on arrays in one compiled loop
+
+    The elements of the Broadcast are folded into the accumulator as they are
+    computed and never stored.  Raises ``NotImplementedError`` on expressions
+    or data that numba can not compile.
+    """
+    reduction = type(t._reduction).__name__
+    b = t._broadcast
+    arrays = tuple(isinstance(d, np.ndarray) for d in data)
+    lengths = set(len(d) for d in data if isinstance(d, np.ndarray))
+    if (reduction not in loops or
+            len(lengths) != 1 or 0 in lengths or
+            not all(datashape.isscalar(s.dshape) for s in b._scalars) or
+            any(d.ndim != 1 or d.dtype.kind not in 'bif'
+                for d in data if isinstance(d, np.ndarray))):
+        raise NotImplementedError("Numba can not fold %s" % t)
+
+    names = ['_%d' % i for i in range(len(data))]
+    scalars = tuple(symbol(name, measure_of(d))
+                    for name, d in zip(names, data))
+    expr = b._scalar_expr._subs(dict(zip(b._scalars, scalars)))
+    if reduction in ('sum', 'mean') and expr.dshape.measure in floating:
+        reduction = 'f' + reduction
+    key = reduction, expr, scalars, arrays
+    if key in failed:
+        raise NotImplementedError("Numba can not fold %s" % t)
     try:
-        ufunc = get_numba_ufunc(t)
-    except TypeError:  # strings and objects aren't supported very well yet
-        return compute(t, dict(zip(t._leaves(), data)))
-    else:
-        return ufunc(*data)
+        result = get_reduction_kernel(*key)(*data)
+    except Exception:  # numba raises many kinds of typing and lowering errors
+        failed.add(key)
+        raise NotImplementedError("Numba can not fold %s" % t)
+    # numba returns Python scalars, type them like the reduction
+    measure = t.dshape.measure
+    if isinstance(measure, datashape.Option):
+        measure = measure.ty
+    return measure.to_numpy_dtype().type(result)
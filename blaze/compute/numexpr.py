@@ -1,3 +1,11 @@
+""" Numexpr evaluation of Broadcast expressions
+
+Elementwise arithmetic, math and comparisons over NumPy arrays and pandas
+Series are fused into ``Broadcast`` expressions, see ``blaze.expr.broadcast``.
+Numexpr evaluates each fused expression in one multithreaded pass over blocks
+of the inputs that fit in cache, rather than allocating a full temporary for
+every intermediate operation.
+"""
 from __future__ import absolute_import, division, print_function
 
 from ..expr import (Expr, Symbol, Field, Arithmetic, RealMath, Map, Not,
@@ -5,14 +13,32 @@ from ..expr import (Expr, Symbol, Field, Arithmetic, RealMath, Map, Not,
         cos, isnan, UnaryOp, symbol)
 import datetime
 from datashape import iscollection
+from datashape.predicates import isboolean
+from datashape.typesets import floating
+import datashape
 import math
 from toolz import curry
 import itertools
+import numexpr
+import numpy as np
+import pandas as pd
 from ..expr.broadcast import broadcast_collect
 
 
 funcnames = ('func_%d' % i for i in itertools.count())
 
+# Binary operators that numexpr shares with Python
+operators = set(['+', '-', '*', '/', '%', '**',
+                 '==', '!=', '<', '>', '<=', '>=', '&', '|'])
+
+# Names of blaze math functions in numexpr
+functions = dict((name, name) for name in ['abs', 'sqrt', 'sin', 'sinh',
+                                           'cos', 'cosh', 'tan', 'tanh',
+                                           'exp', 'expm1', 'log', 'log10',
+                                           'log1p'])
+functions.update(acos='arccos', acosh='arccosh', asin='arcsin',
+                 asinh='arcsinh', atan='arctan', atanh='arctanh')
+
 def parenthesize(s):
     if ' ' in s:
         return '(%s)' % s
@@ -34,6 +60,13 @@ def print_numexpr(leaves, expr):
     >>> print_numexpr([t], sin(t.x) > cos(t.y))
     'sin(x) > cos(y)'
 
+    and raises ``NotImplementedError`` on anything numexpr lacks
+
+    >>> print_numexpr([t], t.x // t.y)
+    Traceback (most recent call last):
+      ...
+    NotImplementedError: Operation FloorDiv not supported by numexpr
+
     Returns
     -------
 
@@ -48,28 +81,103 @@ def print_numexpr(leaves, expr):
         return expr._name
     if isinstance(expr, Field):
         return expr._name
-    if isinstance(expr, Arithmetic):
+    if isinstance(expr, Arithmetic) and expr.symbol in operators:
         lhs = print_numexpr(leaves, expr.lhs)
         rhs = print_numexpr(leaves, expr.rhs)
         return '%s %s %s' % (parenthesize(lhs),
                              expr.symbol,
                              parenthesize(rhs))
-    if isinstance(expr, RealMath):
+    if isinstance(expr, RealMath) and type(expr).__name__ in functions:
         child = print_numexpr(leaves, expr._child)
-        return '%s(%s)' % (type(expr).__name__, child)
+        return '%s(%s)' % (functions[type(expr).__name__], child)
     if isinstance(expr, UnaryOp) and hasattr(expr, 'symbol'):
         child = print_numexpr(leaves, expr._child)
         return '%s%s' % (expr.symbol, parenthesize(child))
     if isinstance(expr, isnan):
         child = print_numexpr(leaves, expr._child)
-        return '%s != %s' % (parenthsize(child), parenthesize(child))
+        return '%s != %s' % (parenthesize(child), parenthesize(child))
     raise NotImplementedError("Operation %s not supported by numexpr" %
             type(expr).__name__)
 
 
-WantToBroadcast = (Arithmetic, RealMath, Not, USub)
-Broadcastable = (Arithmetic, RealMath, Not, USub)
+WantToBroadcast = (Arithmetic, RealMath, isnan, Not, USub)
+Broadcastable = (Arithmetic, RealMath, isnan, Not, USub)
 
 broadcast_numexpr_collect = curry(broadcast_collect,
         Broadcastable=Broadcastable,
         WantToBroadcast=WantToBroadcast)
+
+
+def numexpr_inputs(t, data):
+    """ Numexpr string and local variables to evaluate Broadcast ``t``
+
+    Inputs are renamed so that column names never shadow numexpr functions.
+
+    >>> x = symbol('x', 'float64')
+    >>> sin = symbol('sin', 'float64')
+    >>> t = broadcast(x + sin, [symbol('a', 'var * float64'),
+    ...                         symbol('b', 'var * float64')], [x, sin])
+    >>> s, local_dict = numexpr_inputs(t, [np.ones(2), 1.0])
+    >>> s
+    '_0 + _1'
+    >>> sorted(local_dict)
+    ['_0', '_1']
+    """
+    if not all(datashape.isscalar(s.dshape) for s in t._scalars):
+        raise NotImplementedError("Numexpr needs one input per column")
+    names = ['_%d' % i for i in range(len(t._scalars))]
+    renamed = [symbol(name, s.dshape) for name, s in zip(names, t._scalars)]
+    expr = t._scalar_expr._subs(dict(zip(t._scalars, renamed)))
+    local_dict = dict()
+    for name, datum in zip(names, data):
+        if isinstance(datum, pd.Series):
+            datum = datum.values
+        if isinstance(datum, np.ndarray) and datum.dtype.kind not in 'biuf':
+            raise NotImplementedError("Numexpr can not evaluate %s data" %
+                                      datum.dtype)
+        local_dict[name] = datum
+    return print_numexpr(renamed, expr), local_dict
+
+
+def broadcast_numexpr(t, *data, **kwargs):
+    """ Evaluate Broadcast ``t`` on arrays or Series with numexpr
+
+    Raises ``NotImplementedError`` on expressions or data that numexpr can not
+    handle so that callers may fall back to another engine.
+    """
+    series = [d for d in data if isinstance(d, pd.Series)]
+    if any(not s.index.equals(series[0].index) for s in series[1:]):
+        raise NotImplementedError("Series must share an index")
+
+    s, local_dict = numexpr_inputs(t, data)
+    result = numexpr.evaluate(s, local_dict=local_dict, global_dict={},
+                              truediv=True)
+    if series:
+        return pd.Series(result, index=series[0].index, name=t._name)
+    return result
+
+
+def reduce_numexpr(t, *data, **kwargs):
+    """ Evaluate a sum or mean of a Broadcast in blocks with numexpr
+
+    Numexpr accumulates the sum as it evaluates each block of the inputs, so
+    the elementwise result is never materialized.  It does so naively though,
+    so we leave floating point sums to engines that compensate for rounding
+    or to NumPy's pairwise summation.  Raises ``NotImplementedError`` on
+    those and on other reductions so that callers may fall back to another
+    engine.
+    """
+    reduction = type(t._reduction).__name__
+    arrays = [d for d in data if isinstance(d, np.ndarray)]
+    measure = t._broadcast._scalar_expr.dshape.measure
+    if (reduction not in ('sum', 'mean') or
+            isboolean(measure) or measure in floating or
+            not arrays or any(a.ndim != 1 or not len(a) for a in arrays)):
+        raise NotImplementedError("Numexpr can not fold %s" % t)
+
+    s, local_dict = numexpr_inputs(t._broadcast, data)
+    result = numexpr.evaluate('sum(%s)' % s, local_dict=local_dict,
+                              global_dict={}, truediv=True)[()]
+    if reduction == 'mean':
+        return result / len(arrays[0])
+    return result
@@ -8,15 +8,25 @@ from datashape import to_numpy, to_numpy_dtype
 from numbers import Number
 
 from ..expr import Reduction, Field, Projection, Broadcast, Selection, ndim
-from ..expr import Distinct, Sort, Head, Label, ReLabel, Expr, Slice, Join
-from ..expr import std, var, count, nunique, Summary
+from ..expr import (Distinct, Sort, Head, TopK, Label, ReLabel, Expr, Slice,
+                    Join)
+from ..expr import std, var, count, nunique, Summary, hll, hll_union, hll_count
+from ..expr import quantile, median, tdigest, tdigest_union, tdigest_quantile
 from ..expr import BinOp, UnaryOp, USub, Not, nelements
 from ..expr import UTCFromTimestamp, DateTimeTruncate
 from ..expr import Transpose, TensorDot
+from ..expr.optimize import fuse_top_k
+from ..expr.broadcast import (broadcast_collect, BroadcastReduction,
+        fuse_broadcast_reductions)
 from ..utils import keywords
-
-from .core import base, compute
-from ..dispatch import dispatch
+from ..compatibility import _strtypes
+from .. import hyperloglog
+from ..hyperloglog import HyperLogLog
+from .. import tdigest as td
+from ..tdigest import TDigest
+
+from .core import base, compute, optimize
+from ..dispatch import dispatch, register
 from odo import into
 import pandas as pd
 
@@ -41,18 +51,81 @@ def compute_up(t, x, **kwargs):
     raise NotImplementedError()  # pragma: no cover
 
 
+# Compiled engines for fused elementwise expressions, tried in turn.  Each
+# raises NotImplementedError on expressions or data that it can not handle.
+broadcast_engines = []
+Broadcastable = ()
+
+# We register Broadcast on up to this many inputs, optimize fuses no more
+MAX_BROADCAST_INPUTS = 5
+
+# Engines that fold a fused elementwise expression into a reduction.  Numba
+# comes first as its loops handle every fusable reduction.
+reduction_engines = []
+
 try:
-    from .numba import broadcast_numba as broadcast_ndarray
+    from . import numexpr as _numexpr
 except ImportError:
-    def broadcast_ndarray(t, *data, **kwargs):
-        scope = kwargs.pop('scope')
-        d = dict(zip(t._scalar_expr._leaves(), data))
-        return compute(t._scalar_expr, d, **kwargs)
+    pass
+else:
+    broadcast_engines.append(_numexpr.broadcast_numexpr)
+    reduction_engines.append(_numexpr.reduce_numexpr)
+    Broadcastable += _numexpr.Broadcastable
+
+try:
+    from . import numba as _numba
+except ImportError:
+    pass
+else:
+    broadcast_engines.append(_numba.broadcast_numba)
+    reduction_engines.insert(0, _numba.reduce_numba)
+    Broadcastable += _numba.Broadcastable
+
+
+def broadcast_ndarray(t, *data, **kwargs):
+    for engine in broadcast_engines:
+        try:
+            return engine(t, *data)
+        except NotImplementedError:
+            pass
+    return compute(t._scalar_expr, dict(zip(t._scalars, data)))
+
+
+def optimize_ndarray(expr, *data, **kwargs):
+    expr = fuse_top_k(expr)
+    if broadcast_engines:
+        expr = broadcast_collect(expr, Broadcastable=Broadcastable,
+                                 WantToBroadcast=Broadcastable,
+                                 maxleaves=MAX_BROADCAST_INPUTS)
+    if reduction_engines:
+        expr = fuse_broadcast_reductions(expr)
+    return expr
+
+
+for i in range(1, 11):
+    register(optimize, Expr, *([np.ndarray] * i))(optimize_ndarray)
+
+
+register(compute_up, Broadcast, np.ndarray)(broadcast_ndarray)
+for i in range(2, MAX_BROADCAST_INPUTS + 1):
+    register(compute_up, Broadcast,
+             *([(np.ndarray, Number)] * i))(broadcast_ndarray)
+
+
+def reduce_broadcast_ndarray(t, *data, **kwargs):
+    for engine in reduction_engines:
+        try:
+            result = engine(t, *data)
+        except NotImplementedError:
+            continue
+        return np.array([result]) if t._reduction.keepdims else result
+    return compute_up(t._reduction, broadcast_ndarray(t._broadcast, *data))
 
 
-compute_up.register(Broadcast, np.ndarray)(broadcast_ndarray)
-for i in range(2, 6):
-    compute_up.register(Broadcast, *([(np.ndarray, Number)] * i))(broadcast_ndarray)
+register(compute_up, BroadcastReduction, np.ndarray)(reduce_broadcast_ndarray)
+for i in range(2, MAX_BROADCAST_INPUTS + 1):
+    register(compute_up, BroadcastReduction,
+             *([(np.ndarray, Number)] * i))(reduce_broadcast_ndarray)
 
 
 @dispatch(BinOp, np.ndarray, (np.ndarray, base))
@@ -109,7 +182,65 @@ def compute_up(t, x, **kwargs):
 @dispatch(nunique, np.ndarray)
 def compute_up(t, x, **kwargs):
     assert t.axis == tuple(range(ndim(t._child)))
-    result = len(np.unique(x))
+    if t.approx:
+        result = HyperLogLog().update(x).count()
+    else:
+        result = len(np.unique(x))
+    if t.keepdims:
+        result = np.array([result])
+    return result
+
+
+def keep_object(result, keepdims):
+    """ Wrap a Python object in a one element array if keeping dimensions """
+    if not keepdims:
+        return result
+    out = np.empty(1, dtype=object)
+    out[0] = result
+    return out
+
+
+@dispatch(hll, np.ndarray)
+def compute_up(t, x, **kwargs):
+    return keep_object(HyperLogLog().update(x), t.keepdims)
+
+
+@dispatch(hll_union, np.ndarray)
+def compute_up(t, x, **kwargs):
+    return keep_object(hyperloglog.union(x.ravel()), t.keepdims)
+
+
+@dispatch(hll_count, np.ndarray)
+def compute_up(t, x, **kwargs):
+    result = hyperloglog.union(x.ravel()).count()
+    if t.keepdims:
+        result = np.array([result])
+    return result
+
+
+@dispatch(quantile, np.ndarray)
+def compute_up(t, x, **kwargs):
+    return np.percentile(x, t.q * 100, axis=t.axis, keepdims=t.keepdims)
+
+
+@dispatch(median, np.ndarray)
+def compute_up(t, x, **kwargs):
+    return np.median(x, axis=t.axis, keepdims=t.keepdims)
+
+
+@dispatch(tdigest, np.ndarray)
+def compute_up(t, x, **kwargs):
+    return keep_object(TDigest().update(x), t.keepdims)
+
+
+@dispatch(tdigest_union, np.ndarray)
+def compute_up(t, x, **kwargs):
+    return keep_object(td.union(x.ravel()), t.keepdims)
+
+
+@dispatch(tdigest_quantile, np.ndarray)
+def compute_up(t, x, **kwargs):
+    result = td.union(x.ravel()).quantile(t.q)
     if t.keepdims:
         result = np.array([result])
     return result
@@ -136,7 +267,9 @@ def axify(expr, axis, keepdims=False):
     >>> axify(expr, axis=0)
     sum(s, axis=(0,))
     """
-    return type(expr)(expr._child, axis=axis, keepdims=keepdims)
+    options = dict((slot, getattr(expr, slot)) for slot in expr.__slots__
+                   if slot not in ('_hash', '_child', 'axis', 'keepdims'))
+    return type(expr)(expr._child, axis=axis, keepdims=keepdims, **options)
 
 
 @dispatch(Summary, np.ndarray)
@@ -183,6 +316,81 @@ def compute_up(t, x, **kwargs):
     return x[:t.n]
 
 
+def can_partition(values):
+    """ Whether ``top_k_index`` orders ``values`` exactly as ``np.sort``
+
+    Restricted to one dimensional numbers without NaNs, on which partitioning
+    agrees with sorting for every NumPy version
+    """
+    if values.ndim != 1 or values.dtype.kind not in 'biuf':
+        return False
+    return values.dtype.kind != 'f' or not np.isnan(values).any()
+
+
+def top_k_index(values, n, ascending=True):
+    """ Positions of the first ``n`` elements of ``values`` in sorted order
+
+    Uses ``np.argpartition`` and only sorts the ``n`` selected elements
+
+    >>> top_k_index(np.array([5, 1, 4, 2, 3]), 2)
+    array([1, 3])
+    >>> top_k_index(np.array([5, 1, 4, 2, 3]), 2, ascending=False)
+    array([0, 2])
+    """
+    length = len(values)
+    n = min(n, length)
+    if n == 0:
+        return np.arange(0)
+    if ascending:
+        index = np.argpartition(values, n - 1)[:n]
+    else:
+        index = np.argpartition(values, length - n)[length - n:]
+    index = index[np.argsort(values[index], kind='mergesort')]
+    return index if ascending else index[::-1]
+
+
+def top_k_candidates(values, n, ascending=True):
+    """ Positions of the elements that sort among the first ``n`` of
+    ``values`` or tie with the ``n``-th
+
+    A full sort of rows decides between rows with tied keys, e.g. by their
+    other fields.  Sorting only these candidates the same way yields the same
+    first ``n`` rows.
+
+    >>> top_k_candidates(np.array([5, 1, 4, 1, 3]), 1)
+    array([1, 3])
+    >>> top_k_candidates(np.array([5, 1, 4, 5, 3]), 1, ascending=False)
+    array([0, 3])
+    """
+    length = len(values)
+    n = min(n, length)
+    if n == 0:
+        return np.arange(0)
+    if ascending:
+        kth = np.partition(values, n - 1)[n - 1]
+        return np.flatnonzero(values <= kth)
+    kth = np.partition(values, length - n)[length - n]
+    return np.flatnonzero(values >= kth)
+
+
+@dispatch(TopK, np.ndarray)
+def compute_up(t, x, **kwargs):
+    if x.dtype.names is None:
+        values = x
+    elif isinstance(t.key, _strtypes) and t.key in x.dtype.names:
+        values = x[t.key]
+    else:
+        values = None
+    if values is not None and can_partition(values):
+        if x.dtype.names is None or x.dtype.names == (t.key,):
+            return x[top_k_index(values, t.n, t.ascending)]
+        # Sorting orders rows with equal keys by their remaining fields, so
+        # sort every row tied with the n-th rather than picking among them
+        x = x[top_k_candidates(values, t.n, t.ascending)]
+    sort = Sort(t._child, t._key, t.ascending)
+    return compute_up(sort, x, **kwargs)[:t.n]
+
+
 @dispatch(Label, np.ndarray)
 def compute_up(t, x, **kwargs):
     return np.array(x, dtype=[(t.label, x.dtype.type)])
@@ -297,9 +505,9 @@ def compute_up(expr, lhs, rhs, **kwargs):
     return np.tensordot(lhs, rhs, axes=[expr._left_axes, expr._right_axes])
 
 
-@compute_up.register(Join, DataFrame, np.ndarray)
-@compute_up.register(Join, np.ndarray, DataFrame)
-@compute_up.register(Join, np.ndarray, np.ndarray)
+@register(compute_up, Join, DataFrame, np.ndarray)
+@register(compute_up, Join, np.ndarray, DataFrame)
+@register(compute_up, Join, np.ndarray, np.ndarray)
 def join_ndarray(expr, lhs, rhs, **kwargs):
     if isinstance(lhs, np.ndarray):
         lhs = DataFrame(lhs)
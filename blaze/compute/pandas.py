@@ -27,23 +27,50 @@ import fnmatch
 from datashape.predicates import isscalar
 import datashape
 import itertools
+from functools import partial
+from numbers import Number
 
 from odo import into
-from ..dispatch import dispatch
-from ..expr import (Projection, Field, Sort, Head, Broadcast, Selection,
+from ..dispatch import dispatch, register
+from ..expr import (Projection, Field, Sort, Head, TopK, Broadcast, Selection,
                     Reduction, Distinct, Join, By, Summary, Label, ReLabel,
                     Map, Apply, Merge, std, var, Like, Slice, summary,
                     ElemWise, DateTime, Millisecond, Expr, Symbol,
                     UTCFromTimestamp, nelements, DateTimeTruncate, count,
-                    UnaryStringFunction)
+                    UnaryStringFunction, nunique, hll, hll_union, hll_count,
+                    quantile, median, tdigest, tdigest_union,
+                    tdigest_quantile)
 from ..expr import UnaryOp, BinOp
 from ..expr import symbol, common_subexpression
-from .core import compute, compute_up, base
-from ..compatibility import _inttypes
+from ..expr.optimize import push_predicates, fuse_top_k
+from ..expr.broadcast import broadcast_collect
+from .core import compute, compute_up, optimize, base
+from ..compatibility import _inttypes, _strtypes
+from .numpy import can_partition, top_k_index, top_k_candidates
+from .numpy import (broadcast_engines, broadcast_ndarray, Broadcastable,
+                    MAX_BROADCAST_INPUTS)
+from .. import hyperloglog
+from ..hyperloglog import HyperLogLog
+from .. import tdigest as td
+from ..tdigest import TDigest
 
 __all__ = []
 
 
+def optimize_pandas(expr, *data):
+    expr = fuse_top_k(push_predicates(expr))
+    if broadcast_engines:
+        # Fuse elementwise arithmetic into compiled kernels over columns
+        expr = broadcast_collect(expr, Broadcastable=Broadcastable,
+                                 WantToBroadcast=Broadcastable,
+                                 maxleaves=MAX_BROADCAST_INPUTS)
+    return expr
+
+
+for i in range(1, 11):
+    register(optimize, Expr, *([NDFrame] * i))(optimize_pandas)
+
+
 @dispatch(Projection, DataFrame)
 def compute_up(t, df, **kwargs):
     return df[list(t.fields)]
@@ -76,6 +103,12 @@ def compute_up(t, s, **kwargs):
     return compute_up(t, s.to_frame(), **kwargs)
 
 
+if broadcast_engines:
+    for i in range(1, MAX_BROADCAST_INPUTS + 1):
+        register(compute_up, Broadcast,
+                 *([(Series, Number)] * i))(broadcast_ndarray)
+
+
 @dispatch(BinOp, Series)
 def compute_up(t, data, **kwargs):
     if isinstance(t.lhs, Expr):
@@ -155,6 +188,95 @@ def compute_up(t, s, **kwargs):
     return result
 
 
+@dispatch(nunique, Series)
+def compute_up(t, s, **kwargs):
+    if t.approx:
+        result = HyperLogLog().update(s.values).count()
+    else:
+        result = get_scalar(s.nunique())
+    if t.keepdims:
+        result = Series([result], name=s.name)
+    return result
+
+
+@dispatch(hll, Series)
+def compute_up(t, s, **kwargs):
+    result = HyperLogLog().update(s.values)
+    if t.keepdims:
+        result = Series([result], name=s.name)
+    return result
+
+
+@dispatch(hll_union, Series)
+def compute_up(t, s, **kwargs):
+    result = hyperloglog.union(s)
+    if t.keepdims:
+        result = Series([result], name=s.name)
+    return result
+
+
+@dispatch(hll_count, Series)
+def compute_up(t, s, **kwargs):
+    result = hyperloglog.union(s).count()
+    if t.keepdims:
+        result = Series([result], name=s.name)
+    return result
+
+
+@dispatch(quantile, (Series, SeriesGroupBy))
+def compute_up(t, s, **kwargs):
+    result = get_scalar(s.quantile(t.q))
+    if t.keepdims:
+        result = Series([result], name=s.name)
+    return result
+
+
+@dispatch(tdigest, Series)
+def compute_up(t, s, **kwargs):
+    result = TDigest().update(s.values)
+    if t.keepdims:
+        result = Series([result], name=s.name)
+    return result
+
+
+@dispatch(tdigest_union, Series)
+def compute_up(t, s, **kwargs):
+    result = td.union(s)
+    if t.keepdims:
+        result = Series([result], name=s.name)
+    return result
+
+
+@dispatch(tdigest_quantile, Series)
+def compute_up(t, s, **kwargs):
+    result = td.union(s).quantile(t.q)
+    if t.keepdims:
+        result = Series([result], name=s.name)
+    return result
+
+
+# Reductions that pandas can not name in ``groups.agg``
+sketches = hll, hll_union, hll_count, tdigest, tdigest_union, tdigest_quantile
+
+
+@dispatch(sketches, SeriesGroupBy)
+def compute_up(t, s, **kwargs):
+    return s.agg(partial(compute_up, t))
+
+
+def agg_func(expr):
+    """ The name or function to pass to ``groups.agg`` for a reduction
+
+    >>> t = symbol('t', 'var * {name: string, amount: float64}')
+    >>> agg_func(t.amount.sum())
+    'sum'
+    """
+    if (isinstance(expr, sketches + (quantile,)) or
+            getattr(expr, 'approx', False)):
+        return partial(compute_up, expr)
+    return expr.symbol
+
+
 @dispatch(Distinct, (DataFrame, Series))
 def compute_up(t, df, **kwargs):
     return df.drop_duplicates().reset_index(drop=True)
@@ -302,7 +424,7 @@ def compute_by(t, s, g, df):
 
     groups = df2.groupby(g)
 
-    d = dict((name, v.symbol) for name, v in zip(one.names, one.values))
+    d = dict((name, agg_func(v)) for name, v in zip(one.names, one.values))
 
     result = groups.agg(d)
 
@@ -399,6 +521,25 @@ def compute_up(t, df, **kwargs):
     return df.head(t.n)
 
 
+@dispatch(TopK, DataFrame)
+def compute_up(t, df, **kwargs):
+    if isinstance(t.key, _strtypes):
+        values = df[t.key].values
+        if can_partition(values):
+            if list(df.columns) == [t.key]:
+                return df.iloc[top_k_index(values, t.n, t.ascending)]
+            # Let the sort decide between rows tied with the n-th
+            df = df.iloc[top_k_candidates(values, t.n, t.ascending)]
+    return df.sort(t.key, ascending=t.ascending).head(t.n)
+
+
+@dispatch(TopK, Series)
+def compute_up(t, s, **kwargs):
+    if can_partition(s.values):
+        return s.iloc[top_k_index(s.values, t.n, t.ascending)]
+    return s.order(ascending=t.ascending).head(t.n)
+
+
 @dispatch(Label, DataFrame)
 def compute_up(t, df, **kwargs):
     return DataFrame(df, columns=[t.label])
@@ -1,5 +1,33 @@
+""" Parallel map functions for chunked computation
+
+Chunked backends (``Chunks``, bcolz, CSV) compute on each chunk with a
+``map`` function.  By default this is the builtin ``map``.  Swap in a
+parallel map globally with ``set_default_pmap`` or for a single call with
+``compute(expr, data, map=...)``.
+
+>>> from blaze.compute.pmap import ThreadPoolMap
+>>> with ThreadPoolMap(2) as pmap:
+...     pmap(abs, [-1, 2, -3])
+[1, 2, 3]
+"""
 from __future__ import absolute_import, division, print_function
 
+import os
+import tempfile
+from functools import partial
+from multiprocessing import cpu_count
+from multiprocessing.pool import Pool, ThreadPool
+
+import numpy as np
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+__all__ = ['set_default_pmap', 'get_default_pmap', 'ThreadPoolMap',
+           'ProcessPoolMap']
+
 default_map = [map]
 
 def set_default_pmap(func):
@@ -8,3 +36,170 @@ def set_default_pmap(func):
 
 def get_default_pmap():
     return default_map[0]
+
+
+class PoolMap(object):
+    """ Parallel map over a pool of workers, created on first use
+
+    Use as a context manager, or call ``close`` when done, to shut the pool
+    down.
+    """
+    pool_type = None
+
+    def __init__(self, nworkers=None):
+        self.nworkers = nworkers or cpu_count()
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = self.pool_type(self.nworkers)
+        return self._pool
+
+    def __call__(self, func, seq):
+        return self.pool.map(func, seq)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ThreadPoolMap(PoolMap):
+    """ Parallel map backed by a pool of threads
+
+    Good for kernels that release the GIL, like most of NumPy and pandas.
+
+    Parameters
+    ----------
+
+    nworkers: int, optional
+        Number of threads, defaults to the number of CPUs
+    """
+    pool_type = ThreadPool
+
+
+# Prefer a RAM backed filesystem for arrays shared with worker processes
+shared_memory_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+class SharedArray(object):
+    """ Reference to a NumPy array stored in a memory mappable ``.npy`` file
+
+    Only this small reference is pickled when sending work to another process.
+    The array itself is still serialized once, by ``np.save`` into the file,
+    but workers memory map that file rather than each unpickling a private
+    copy of the data.
+    """
+    __slots__ = 'path',
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        return np.load(self.path, mmap_mode='r')
+
+
+def share(x, dirname=None):
+    """ Store NumPy arrays to memory mappable files, pass through all else
+
+    The caller owns the file and removes it when done.
+    """
+    if not isinstance(x, np.ndarray) or x.dtype.hasobject:
+        return x
+    fd, path = tempfile.mkstemp(suffix='.npy', dir=dirname)
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, x)
+    return SharedArray(path)
+
+
+def call_shared(func, x):
+    if isinstance(x, SharedArray):
+        x = x.load()
+    return func(x)
+
+
+# The object most recently loaded by this process, see ``SharedObject``
+_loaded = dict()
+
+
+class SharedObject(object):
+    """ Reference to an object pickled once into a file
+
+    Tasks sent to worker processes carry only this reference.  Each worker
+    unpickles the object on first use and keeps it for later tasks, so a
+    large object reaches each worker once rather than with every task.
+    Workers keep only the most recent object.
+    """
+    __slots__ = 'path',
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if self.path not in _loaded:
+            _loaded.clear()
+            with open(self.path, 'rb') as f:
+                _loaded[self.path] = pickle.load(f)
+        return _loaded[self.path]
+
+
+def share_object(obj, dirname=None):
+    """ Pickle ``obj`` into a file once, return a ``SharedObject``
+
+    The caller owns the file and removes it when done.
+    """
+    fd, path = tempfile.mkstemp(suffix='.pkl', dir=dirname)
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+    return SharedObject(path)
+
+
+def call_object(shared, x):
+    """ Call the function referenced by ``SharedObject`` ``shared`` on ``x`` """
+    return shared.load()(x)
+
+
+class ProcessPoolMap(PoolMap):
+    """ Parallel map backed by a pool of processes
+
+    Good for kernels that hold the GIL, like row-wise Python computation.
+    Both ``func`` and the results must be pickleable.
+
+    Parameters
+    ----------
+
+    nworkers: int, optional
+        Number of processes, defaults to the number of CPUs
+    shared: bool, optional
+        Send NumPy chunks to workers through memory mapped files (in
+        ``/dev/shm`` where available) rather than pickling each chunk into
+        the task queue.  Defaults to True.
+    dirname: str, optional
+        Directory in which to place shared arrays
+    """
+    pool_type = Pool
+
+    def __init__(self, nworkers=None, shared=True, dirname=None):
+        super(ProcessPoolMap, self).__init__(nworkers)
+        self.shared = shared
+        self.dirname = dirname or shared_memory_dir
+
+    def __call__(self, func, seq):
+        if not self.shared:
+            return self.pool.map(func, seq)
+
+        parts = [share(x, self.dirname) for x in seq]
+        try:
+            return self.pool.map(partial(call_shared, func), parts)
+        finally:
+            for part in parts:
+                if isinstance(part, SharedArray):
+                    os.remove(part.path)
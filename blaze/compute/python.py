@@ -12,6 +12,7 @@
 """
 from __future__ import absolute_import, division, print_function
 
+import heapq
 import itertools
 import numbers
 import fnmatch
@@ -20,7 +21,7 @@ import re
 from collections import Iterator
 from functools import partial
 import toolz
-from toolz import map, filter, compose, juxt, identity, tail
+from toolz import map, filter, compose, juxt, identity, tail, partition_all
 try:
     from cytoolz import groupby, reduceby, unique, take, concat, nth, pluck
 except ImportError:
@@ -28,17 +29,21 @@ except ImportError:
 import datetime
 import toolz
 import math
+import numpy as np
 from datashape.predicates import isscalar, iscollection
+from odo import chunks, into
 
 from ..dispatch import dispatch
 from ..expr import (Projection, Field, Broadcast, Map, Label, ReLabel,
                     Merge, Join, Selection, Reduction, Distinct,
-                    By, Sort, Head, Apply, Summary, Like,
+                    By, Sort, Head, TopK, Apply, Summary, Like,
                     DateTime, Date, Time, Millisecond, ElemWise, symbol,
                     Symbol, Slice, Expr, Arithmetic, ndim, DateTimeTruncate,
-                    UTCFromTimestamp)
+                    UTCFromTimestamp, path)
 from ..expr import reductions
-from ..expr import count, nunique, mean, var, std
+from ..expr.split import path_split
+from ..expr import count, nunique, mean, var, std, hll, hll_union, hll_count
+from ..expr import quantile, median, tdigest, tdigest_union, tdigest_quantile
 from ..expr import (BinOp, UnaryOp, RealMath, IntegerMath, BooleanMath, USub,
                     Not, nelements)
 from ..compatibility import builtins, apply, unicode, _inttypes
@@ -46,8 +51,13 @@ from .core import compute, compute_up, optimize, base
 
 from ..utils import listpack
 from ..expr.broadcast import broadcast_collect
+from ..expr.optimize import push_predicates, fuse_top_k
 from .pyfunc import lambdify
 from . import pydatetime
+from .. import hyperloglog
+from ..hyperloglog import HyperLogLog
+from .. import tdigest as td
+from ..tdigest import TDigest
 
 # Dump exp, log, sin, ... into namespace
 import math
@@ -60,7 +70,7 @@ Sequence = (tuple, list, Iterator, type(dict().items()))
 
 
 @dispatch(Expr, Sequence)
-def pre_compute(expr, seq, scope=None, **kwargs):
+def pre_compute(expr, seq, scope=None, batchsize=None, **kwargs):
     try:
         if isinstance(seq, Iterator):
             first = next(seq)
@@ -71,14 +81,121 @@ def pre_compute(expr, seq, scope=None, **kwargs):
         return []
     if isinstance(first, dict):
         leaf = expr._leaves()[0]
-        return pluck(leaf.fields, seq)
-    else:
-        return seq
+        seq = pluck(leaf.fields, seq)
+    if batchsize and batch_node(expr) is not None:
+        return Batched(seq, batchsize)
+    return seq
 
 
 @dispatch(Expr, Sequence)
 def optimize(expr, seq):
-    return broadcast_collect( expr)
+    return broadcast_collect(fuse_top_k(push_predicates(expr)))
+
+
+# Expressions that batch mode computes on one batch of rows at a time
+batchable = (ElemWise, Selection, Like, Reduction, Summary, By, Distinct,
+             TopK, Sort)
+
+
+class Batched(object):
+    """ Rows of a Python sequence to compute on ``batchsize`` at a time
+
+    ``pre_compute`` wraps rows in ``Batched`` when we call
+    ``compute(expr, rows, batchsize=...)`` on an expression that can run batch
+    by batch.  Without ``batchsize`` rows stay plain sequences.
+    """
+    __slots__ = 'seq', 'batchsize'
+
+    def __init__(self, seq, batchsize):
+        self.seq = seq
+        self.batchsize = batchsize
+
+
+def batch_node(expr):
+    """ The part of ``expr`` to compute batch by batch, None if there is none
+
+    >>> t = symbol('t', 'var * {name: string, amount: int64}')
+    >>> batch_node(t.amount.sum().label('total'))
+    sum(t.amount)
+    >>> batch_node(t.head(2).amount.sum()) is None
+    True
+    """
+    leaves = expr._leaves()
+    if len(leaves) != 1 or leaves[0].ndim != 1:
+        return None
+    leaf = leaves[0]
+    node = path_split(leaf, expr)
+    if node is not None and all(isinstance(e, batchable)
+                                for e in path(node, leaf) if e is not leaf):
+        return node
+    return None
+
+
+@dispatch(Expr, Batched)
+def optimize(expr, seq):
+    return broadcast_collect(fuse_top_k(push_predicates(expr)))
+
+
+def batches(seq, leaf, batchsize):
+    """ NumPy arrays of ``batchsize`` rows at a time
+
+    >>> t = symbol('t', 'var * {name: string, amount: int64}')
+    >>> part = next(batches([('Alice', 1), ('Bob', 2), ('Charlie', 3)], t, 2))
+    >>> part['amount']
+    array([1, 2])
+    """
+    for rows in partition_all(batchsize, seq):
+        yield into(np.ndarray, list(rows), dshape=leaf.dshape)
+
+
+def unbox(expr, result):
+    """ Python objects from the NumPy result of a batched computation """
+    if iscollection(expr.dshape):
+        return into(list, result)
+    if isinstance(result, tuple):
+        return tuple(x.item() if isinstance(x, np.generic) else x
+                     for x in result)
+    if isinstance(result, np.generic):
+        return result.item()
+    return result
+
+
+@dispatch(Expr, Batched)
+def compute_down(expr, batched, **kwargs):
+    """ Compute on NumPy columns of ``batchsize`` rows at a time
+
+    Row by row Python spends most of its time interpreting each element.
+    With ``compute(expr, rows, batchsize=...)`` we group the rows into
+    batches, convert each batch to a NumPy array and run the NumPy kernels on
+    it.  Row-local expressions stream their results back out batch by batch.
+    Reductions, sorts and split-apply-combine run through the chunked
+    executor (see ``blaze.compute.chunks``) which folds the results of each
+    batch as they arrive.  Either way we never hold more than a few batches
+    of the input in memory.
+
+    >>> t = symbol('t', 'var * {name: string, amount: int64}')
+    >>> rows = iter([('Alice', 100), ('Bob', -50), ('Charlie', -20)])
+    >>> compute(t.amount.sum(), rows, batchsize=2)
+    30
+    """
+    leaf = expr._leaves()[0]
+    node = batch_node(expr)
+    if node is None:
+        return compute(expr, {leaf: batched.seq}, **kwargs)
+
+    data = batches(batched.seq, leaf, batched.batchsize)
+
+    if not isinstance(node, (ElemWise, Selection, Like)):
+        result = compute(expr, {leaf: chunks(np.ndarray)(data)}, **kwargs)
+        return unbox(expr, result)
+
+    rows = concat(into(list, compute(node, {leaf: part})) for part in data)
+    if node.isidentical(expr):
+        return rows
+
+    # Whatever sits above the row-local part, like a Head, stays lazy
+    batched = symbol('batched', node.dshape)
+    return compute(expr._subs({node: batched}), {batched: rows})
 
 
 def child(x):
@@ -357,15 +474,49 @@ def _mean(seq):
 
 
 def _var(seq, unbiased):
-    total = 0
-    total_squared = 0
+    """ Variance in one pass with Welford's update
+
+    Accumulating the squared deviations from a running mean rather than the
+    sum of squares avoids cancellation when the data lie far from zero.  The
+    data are shifted by their first item so that the running mean stays small
+    and keeps its precision.
+
+    >>> _var([1e9 + 1, 1e9 + 2, 1e9 + 3], False)  # doctest: +ELLIPSIS
+    0.666...
+    """
+    shift = None
+    mean = 0.0
+    m2 = 0.0
     count = 0
     for item in seq:
-        total += item
-        total_squared += item * item
+        if shift is None:
+            shift = item
+        item = item - shift
         count += 1
+        delta = item - mean
+        mean += delta / count
+        m2 += delta * (item - mean)
+
+    return m2 / (count - unbiased)
+
+
+def _quantile(seq, q):
+    """ Quantile interpolating linearly between the nearest ranks
 
-    return (total_squared - (total * total) / count) / (count - unbiased)
+    Missing values (None and NaN) are skipped, as in numpy's ``nanpercentile``
+    and pandas.  The quantile of no values is None.
+
+    >>> _quantile([4, 1, None, 3, 2, float('nan')], 0.5)
+    2.5
+    >>> _quantile([None], 0.5)
+    """
+    seq = sorted(x for x in seq if x is not None and x == x)
+    if not seq:
+        return None
+    position = q * (len(seq) - 1)
+    lo = int(math.floor(position))
+    hi = builtins.min(lo + 1, len(seq) - 1)
+    return float(seq[lo] + (seq[hi] - seq[lo]) * (position - lo))
 
 
 def _std(seq, unbiased):
@@ -393,9 +544,51 @@ def compute_up(t, seq, **kwargs):
 
 @dispatch(nunique, Sequence)
 def compute_up_1d(t, seq, **kwargs):
+    if t.approx:
+        return HyperLogLog().update(list(seq)).count()
     return len(set(seq))
 
 
+@dispatch(hll, Sequence)
+def compute_up_1d(t, seq, **kwargs):
+    return HyperLogLog().update(list(seq))
+
+
+@dispatch(hll_union, Sequence)
+def compute_up_1d(t, seq, **kwargs):
+    return hyperloglog.union(seq)
+
+
+@dispatch(hll_count, Sequence)
+def compute_up_1d(t, seq, **kwargs):
+    return hyperloglog.union(seq).count()
+
+
+@dispatch(quantile, Sequence)
+def compute_up_1d(t, seq, **kwargs):
+    return _quantile(seq, t.q)
+
+
+@dispatch(median, Sequence)
+def compute_up_1d(t, seq, **kwargs):
+    return _quantile(seq, 0.5)
+
+
+@dispatch(tdigest, Sequence)
+def compute_up_1d(t, seq, **kwargs):
+    return TDigest().update(list(seq))
+
+
+@dispatch(tdigest_union, Sequence)
+def compute_up_1d(t, seq, **kwargs):
+    return td.union(seq)
+
+
+@dispatch(tdigest_quantile, Sequence)
+def compute_up_1d(t, seq, **kwargs):
+    return td.union(seq).quantile(t.q)
+
+
 @dispatch(mean, Sequence)
 def compute_up_1d(t, seq, **kwargs):
     return _mean(seq)
@@ -588,19 +781,40 @@ def compute_up(t, lhs, rhs, **kwargs):
     return map(assemble, pairs)
 
 
-@dispatch(Sort, Sequence)
-def compute_up(t, seq, **kwargs):
-    if isscalar(t._child.dshape.measure) and t.key == t._child._name:
-        key = identity
+def sort_key(t, seq):
+    """ Python key function for a ``Sort`` or ``TopK`` expression
+
+    A column named as the key of a scalar child, as in
+    ``t.amount.sort('amount')``, can only be the child itself, even once that
+    has been renamed, e.g. to a chunk of the original data.
+    """
+    if (isscalar(t._child.dshape.measure) and
+            isinstance(t.key, (str, unicode, tuple, list))):
+        return identity
     elif isinstance(t.key, (str, unicode, tuple, list)):
-        key = rowfunc(t._child[t.key])
+        return rowfunc(t._child[t.key])
     else:
-        key = rrowfunc(optimize(t.key, seq), t._child)
+        return rrowfunc(optimize(t.key, seq), t._child)
+
+
+@dispatch(Sort, Sequence)
+def compute_up(t, seq, **kwargs):
     return sorted(seq,
-                  key=key,
+                  key=sort_key(t, seq),
                   reverse=not t.ascending)
 
 
+@dispatch(TopK, Sequence)
+def compute_up(t, seq, **kwargs):
+    """ Keep a heap of the best ``n`` elements seen so far
+
+    Same result as ``sorted(seq, key)[:n]`` in ``O(len(seq) * log(n))`` time
+    and ``O(n)`` memory
+    """
+    select = heapq.nsmallest if t.ascending else heapq.nlargest
+    return select(t.n, seq, key=sort_key(t, seq))
+
+
 @dispatch(Head, Sequence)
 def compute_up(t, seq, **kwargs):
     if t.n < 100:
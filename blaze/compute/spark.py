@@ -8,9 +8,10 @@ from ..expr import (Expr, ElemWise, Selection, Sort, Apply, Distinct, Join,
 from .python import (compute, rrowfunc, rowfunc, ElemWise, pair_assemble,
                      reduce_by_funcs, binops, like_regex_predicate)
 from ..expr.broadcast import broadcast_collect
+from ..expr.optimize import push_predicates
 from ..compatibility import builtins, unicode
 from ..expr import reductions
-from ..dispatch import dispatch
+from ..dispatch import dispatch, register
 
 from .core import compute, compute_up
 
@@ -49,7 +50,7 @@ except:
 
 @dispatch(Expr, RDD)
 def optimize(expr, seq):
-    return broadcast_collect(expr)
+    return broadcast_collect(push_predicates(expr))
 
 
 @dispatch(ElemWise, RDD)
@@ -81,6 +82,13 @@ def compute_up(t, rdd, **kwargs):
     return rdd_reductions[type(t)](rdd)
 
 
+@dispatch(reductions.nunique, RDD)
+def compute_up(t, rdd, **kwargs):
+    if t.approx:
+        return rdd.countApproxDistinct()
+    return rdd_reductions[type(t)](rdd)
+
+
 def istruthy(x):
     return not not x
 
@@ -138,14 +146,14 @@ def jgetattr(data, attr, default=None):
         return default
 
 
-@compute_up.register(Join, SparkDataFrame, SparkDataFrame)
+@register(compute_up, Join, SparkDataFrame, SparkDataFrame)
 def spark_df_join(t, lhs, rhs, **kwargs):
     # ship to rdd land, so we can reuse handling of combining records code
     rdd = compute_up(t, lhs.rdd, rhs.rdd, **kwargs)
     return lhs.sql_ctx.createDataFrame(rdd)
 
 
-@compute_up.register(Join, RDD, RDD)
+@register(compute_up, Join, RDD, RDD)
 def spark_join(t, lhs, rhs, **kwargs):
     on_left = rowfunc(t.lhs[t.on_left])
     on_right = rowfunc(t.rhs[t.on_right])
@@ -22,6 +22,8 @@ from sqlalchemy import sql, Table, MetaData, Column
 from sqlalchemy.sql import Selectable, Select
 from sqlalchemy.sql.elements import ClauseElement, ColumnElement
 from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 from operator import and_, eq
 import itertools
 from copy import copy
@@ -29,15 +31,17 @@ import toolz
 from multipledispatch import MDNotImplementedError
 from odo.backends.sql import metadata_of_engine
 
-from ..dispatch import dispatch
+from ..dispatch import dispatch, register
 from ..expr import Projection, Selection, Field, Broadcast, Expr
 from ..expr import (BinOp, UnaryOp, USub, Join, mean, var, std, Reduction,
                     count, FloorDiv, UnaryStringFunction)
 from ..expr import nunique, Distinct, By, Sort, Head, Label, ReLabel, Merge
+from ..expr import quantile, median
 from ..expr import common_subexpression, Summary, Like, nelements
 from ..compatibility import reduce
 from .core import compute_up, compute, base
 from ..utils import listpack
+from datashape.predicates import iscollection, isrecord
 
 __all__ = ['sqlalchemy', 'select']
 
@@ -94,8 +98,8 @@ def compute_up(t, data, **kwargs):
         return t.op(t.lhs, data)
 
 
-@compute_up.register(BinOp, (ColumnElement, base), ColumnElement)
-@compute_up.register(BinOp, ColumnElement, (ColumnElement, base))
+@register(compute_up, BinOp, (ColumnElement, base), ColumnElement)
+@register(compute_up, BinOp, ColumnElement, (ColumnElement, base))
 def binop_sql(t, lhs, rhs, **kwargs):
     return t.op(lhs, rhs)
 
@@ -108,8 +112,8 @@ def compute_up(t, data, **kwargs):
         return sa.func.floor(t.rhs / data)
 
 
-@compute_up.register(FloorDiv, (ColumnElement, base), ColumnElement)
-@compute_up.register(FloorDiv, ColumnElement, (ColumnElement, base))
+@register(compute_up, FloorDiv, (ColumnElement, base), ColumnElement)
+@register(compute_up, FloorDiv, ColumnElement, (ColumnElement, base))
 def binop_sql(t, lhs, rhs, **kwargs):
     return sa.func.floor(lhs / rhs)
 
@@ -321,6 +325,14 @@ def compute_up(t, s, **kwargs):
     return result.label(t._name)
 
 
+@dispatch((quantile, median), sql.elements.ClauseElement)
+def compute_up(t, s, **kwargs):
+    if t.axis != (0,):
+        raise ValueError('axis not equal to 0 not defined for SQL reductions')
+    q = getattr(t, 'q', 0.5)
+    return sa.func.percentile_cont(q).within_group(s).label(t._name)
+
+
 @dispatch(count, Selectable)
 def compute_up(t, s, **kwargs):
     return compute_up(t, select(s), **kwargs)
@@ -360,10 +372,55 @@ def compute_up(t, s, **kwargs):
     return select([list(inner_columns(result))[0].label(t._name)])
 
 
+class approx_count_distinct(FunctionElement):
+    """ Estimated number of distinct values
+
+    Compiles to the native estimate of databases that have one and to an exact
+    ``count(DISTINCT ...)`` elsewhere.
+
+    >>> print(approx_count_distinct(sa.column('name')))
+    count(DISTINCT name)
+    >>> from sqlalchemy.dialects import oracle
+    >>> print(approx_count_distinct(sa.column('name')).compile(
+    ...     dialect=oracle.dialect()))
+    APPROX_COUNT_DISTINCT(name)
+    """
+    type = sa.types.BigInteger()
+    name = 'approx_count_distinct'
+
+
+@compiles(approx_count_distinct)
+def compile_approx_count_distinct(element, compiler, **kwargs):
+    return 'count(DISTINCT %s)' % compiler.process(element.clauses, **kwargs)
+
+
+@compiles(approx_count_distinct, 'oracle')
+@compiles(approx_count_distinct, 'mssql')
+@compiles(approx_count_distinct, 'bigquery')
+@compiles(approx_count_distinct, 'snowflake')
+def compile_native_approx_count_distinct(element, compiler, **kwargs):
+    return 'APPROX_COUNT_DISTINCT(%s)' % compiler.process(element.clauses,
+                                                          **kwargs)
+
+
+@compiles(approx_count_distinct, 'redshift')
+def compile_redshift_approx_count_distinct(element, compiler, **kwargs):
+    return 'APPROXIMATE COUNT(DISTINCT %s)' % compiler.process(
+            element.clauses, **kwargs)
+
+
+@compiles(approx_count_distinct, 'vertica')
+def compile_vertica_approx_count_distinct(element, compiler, **kwargs):
+    return 'APPROXIMATE_COUNT_DISTINCT(%s)' % compiler.process(
+            element.clauses, **kwargs)
+
+
 @dispatch(nunique, sqlalchemy.Column)
 def compute_up(t, s, **kwargs):
     if t.axis != (0,):
         raise ValueError('axis not equal to 0 not defined for SQL reductions')
+    if t.approx:
+        return approx_count_distinct(s)
     return sa.func.count(s.distinct())
 
 
@@ -614,3 +671,17 @@ def compute_up(expr, data, **kwargs):
 @dispatch(Expr, sa.sql.elements.ClauseElement)
 def post_compute(_, s, **kwargs):
     return select(s)
+
+
+@dispatch(Expr, Select)
+def share_result(expr, s):
+    """ Tables used several times in a query become common table expressions
+
+    The compute traversal calls this on subexpressions that occur more than
+    once, e.g. both sides of ``join(t[t.amount > 0], t[t.amount > 0], ...)``.
+    Rendering them as a ``WITH`` clause lets the database evaluate the
+    subquery once rather than once per reference.
+    """
+    if iscollection(expr.dshape) and isrecord(expr.dshape.measure):
+        return s.cte()
+    return s
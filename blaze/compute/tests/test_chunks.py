@@ -1,6 +1,9 @@
 from blaze.compute.chunks import chunks, Chunks
-from blaze import discover, into, compute, symbol
+from blaze import discover, into, compute, symbol, summary, join, by
+from blaze.expr import Sort
 from datashape.predicates import iscollection
+import numpy as np
+import pandas as pd
 
 
 L = [1, 2, 3, 4, 5, 6]
@@ -19,6 +22,182 @@ def test_chunks_compute():
         assert result == expected
 
 
+def test_chunks_sort_head():
+    for asc in [True, False]:
+        expr = s.sort(ascending=asc).head(4)
+        assert into(list, compute(expr, cL)) == into(list, compute(expr, L))
+
+
+def test_chunks_sort():
+    cL = chunks(list)([[3., 1., 2.], [6., 4.], [5.]])
+    for asc in [True, False]:
+        assert list(compute(s.sort(ascending=asc), cL)) == \
+                sorted(L, reverse=not asc)
+    assert list(compute((s.sort() + 1)[s.sort() > 2], cL, inflight=1)) == \
+            [4., 5., 6., 7.]
+
+    t = symbol('t', 'var * {name: string, amount: float64}')
+    cT = chunks(list)([[('a', 3.), ('b', 1.)], [('c', 2.), ('d', 6.)]])
+    for expr in [Sort(t.amount, 'amount', True),
+                 Sort(t.amount, ('amount',), False)]:
+        assert list(compute(expr, cT)) == \
+                sorted([3., 1., 2., 6.], reverse=not expr.ascending)
+
+
+def test_chunks_sort_keeps_chunk_type():
+    x = np.array([3., 1., 2., 6., 4., 5.])
+    cx = chunks(np.ndarray)([x[:3], x[3:]])
+    result = compute(s.sort(), cx)
+    assert isinstance(result, np.ndarray)
+    assert result.tolist() == sorted(x)
+
+    df = pd.DataFrame({'a': [3, 1, 2, 6], 'b': list('cabd')})
+    t = symbol('t', discover(df))
+    result = compute(t.sort('a'), chunks(pd.DataFrame)([df[:2], df[2:]]))
+    assert isinstance(result, pd.DataFrame)
+    assert result.a.tolist() == [1, 2, 3, 6]
+    assert result.b.tolist() == list('abcd')
+
+
+def test_chunks_reduction_of_sort_does_not_sort(monkeypatch):
+    from blaze.compute import chunks as blaze_chunks
+
+    def fail(*args, **kwargs):
+        raise AssertionError("sorted unnecessarily")
+    monkeypatch.setattr(blaze_chunks, 'compute_sorted', fail)
+
+    assert compute(s.sort().sum(), cL) == 21
+    assert compute(s.sort()[s.sort() > 2].count(), cL) == 4
+
+
+def test_chunks_join():
+    a = symbol('a', 'var * {id: int64, x: int64}')
+    b = symbol('b', 'var * {id: int64, y: int64}')
+    ca = chunks(list)([[(1, 10), (2, 20)], [(3, 30), (4, 40)]])
+    cb = chunks(list)([[(2, 200), (4, 400)], [(4, 401), (5, 500)]])
+    expr = join(a[a.x > 10], b, 'id')
+
+    result = compute(expr, {a: ca, b: cb}, nbuckets=3)
+    assert sorted(into(list, into(pd.DataFrame, result))) == \
+            [(2, 20, 200), (4, 40, 400), (4, 40, 401)]
+
+
+def test_chunks_join_repartitions_large_buckets():
+    a = symbol('a', 'var * {id: int64, x: int64}')
+    b = symbol('b', 'var * {id: int64, y: int64}')
+    A = [(i % 50, i) for i in range(400)]
+    B = [(i, -i) for i in range(0, 60, 3)]
+    ca = chunks(list)([A[:200], A[200:]])
+    cb = chunks(list)([B])
+
+    result = compute(join(a, b, 'id'), {a: ca, b: cb}, nbuckets=2,
+                     comfortable_memory=1)
+    expected = compute(join(a, b, 'id'), {a: A, b: B})
+    assert sorted(into(list, into(pd.DataFrame, result))) == \
+            sorted(into(list, expected))
+
+    expr = join(a, b, 'id', how='left').x.sum()
+    result = compute(expr, {a: ca, b: cb}, nbuckets=2, comfortable_memory=1)
+    assert result == compute(expr, {a: A, b: B})
+
+
+def test_grace_join_removes_files_of_discarded_results(tmpdir):
+    from blaze.compute.chunks import grace_join
+    a = symbol('a', 'var * {id: int64, x: int64}')
+    b = symbol('b', 'var * {id: int64, y: int64}')
+    left = [pd.DataFrame({'id': [1, 2], 'x': [10, 20]})]
+    right = [pd.DataFrame({'id': [2, 3], 'y': [200, 300]})]
+
+    grace_join(join(a, b, 'id'), left, right, dirname=str(tmpdir))
+    assert not tmpdir.listdir()
+
+    result = iter(grace_join(join(a, b, 'id'), left, right, map=map,
+                             dirname=str(tmpdir)))
+    next(result)
+    assert tmpdir.listdir()
+    del result
+    assert not tmpdir.listdir()
+
+
+def test_chunks_broadcast_join():
+    a = symbol('a', 'var * {id: int64, x: int64}')
+    b = symbol('b', 'var * {id: int64, y: int64}')
+    ca = chunks(list)([[(1, 10), (2, 20)], [(3, 30), (4, 40)]])
+    df = pd.DataFrame([[2, 200], [4, 400], [4, 401], [5, 500]],
+                      columns=['id', 'y'])
+
+    result = compute(join(a[a.x > 10], b, 'id'), {a: ca, b: df})
+    assert sorted(into(list, into(pd.DataFrame, result))) == \
+            [(2, 20, 200), (4, 40, 400), (4, 40, 401)]
+
+    result = compute(join(b, a, 'id', how='outer').id.count(),
+                     {a: ca, b: df})
+    assert result == 6
+
+    result = compute(join(a, b, 'id', how='right').y.sum(), {a: ca, b: df})
+    assert result == 200 + 400 + 401 + 500
+
+
+def test_chunks_by_spills_past_memory_limit():
+    t = symbol('t', 'var * {name: string, amount: int64}')
+    data = [('Alice', 1), ('Bob', 2), ('Alice', 3), ('Charlie', 4),
+            ('Bob', 2), ('Dan', 5)]
+    c = chunks(list)([data[:2], data[2:4], data[4:]])
+
+    for expr in [by(t.name, total=t.amount.sum(), avg=t.amount.mean()),
+                 by(t.name, n=t.amount.nunique())]:
+        expected = sorted(compute(expr, data))
+        for memory in [1, 1e9]:
+            result = compute(expr, {t: c}, comfortable_memory=memory,
+                             nbuckets=2, inflight=1)
+            assert sorted(into(list, result)) == expected
+
+
+def test_chunks_moments_far_from_zero():
+    x = 1e9 + np.random.RandomState(0).randn(10000) * 1e-2
+    c = chunks(np.ndarray)(np.array_split(x, 7))
+    d = symbol('d', 'var * float64')
+    for expr, expected in [(d.var(), np.var(x)),
+                           (d.std(unbiased=True), np.std(x, ddof=1))]:
+        assert np.allclose(compute(expr, {d: c}), expected, rtol=1e-6)
+
+    c = chunks(list)([part.tolist() for part in np.array_split(x, 7)])
+    assert np.allclose(compute(summary(a=d.var(), b=d.mean()).a, {d: c}),
+                       np.var(x), rtol=1e-6)
+
+    i = (10**12 + np.arange(10000)).astype('i8')
+    c = chunks(np.ndarray)(np.array_split(i, 7))
+    d = symbol('d', 'var * int64')
+    assert np.allclose(compute(d.var(), {d: c}), np.var(i), rtol=1e-9)
+
+
+def test_chunks_approximate_nunique():
+    x = np.random.RandomState(0).randint(0, 20000, size=100000)
+    d = symbol('d', 'var * int64')
+    for c in [chunks(np.ndarray)(np.array_split(x, 7)),
+              chunks(list)([part.tolist() for part in np.array_split(x, 7)])]:
+        result = compute(d.nunique(approx=True), {d: c})
+        assert abs(result - len(np.unique(x))) < 0.03 * len(np.unique(x))
+
+        result = compute(summary(n=d.nunique(approx=True), total=d.sum()),
+                         {d: c})
+        assert result[1] == x.sum()
+
+
+def test_chunks_quantile():
+    x = np.random.RandomState(0).lognormal(size=100000)
+    d = symbol('d', 'var * float64')
+    for c in [chunks(np.ndarray)(np.array_split(x, 7)),
+              chunks(list)([p.tolist() for p in np.array_split(x, 7)])]:
+        for q in [0.5, 0.95, 0.99]:
+            result = compute(d.quantile(q), {d: c}, inflight=2)
+            assert abs((x < result).mean() - q) < 0.002
+
+        p50, total = compute(summary(p50=d.median(), total=d.sum()), {d: c})
+        assert abs(p50 - np.median(x)) < 0.01
+        assert np.allclose(total, x.sum())
+
+
 def test_chunks_head():
     assert compute(s.head(2), cL) == (1., 2.)
 
@@ -36,3 +215,23 @@ def test_pmap_default():
     compute(s + 1, cL)
 
     assert flag[0] is True
+
+
+def test_chunks_compute_streams_with_bounded_inflight():
+    data = chunks(list)([[1., 2.], [3., 4.], [5., 6.], [7.]])
+    exprs = [s.sum(), s.count(), s.mean(), s.nunique(),
+             summary(a=s.sum(), b=s.mean())]
+    for e in exprs:
+        assert compute(e, {s: data}, inflight=1) == \
+                compute(e, {s: [1., 2., 3., 4., 5., 6., 7.]})
+
+
+def test_compute_chunks_batches_calls_to_map():
+    batches = []
+
+    def mymap(func, seq):
+        batches.append(len(seq))
+        return map(func, seq)
+
+    compute(s.sum(), {s: cL}, map=mymap, inflight=1)
+    assert batches == [1, 1]
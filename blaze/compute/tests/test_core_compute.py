@@ -1,13 +1,14 @@
 from __future__ import absolute_import, division, print_function
 
 import pytest
+from collections import Iterator
 
 from datashape import discover, dshape
 
 from blaze.compute.core import (compute_up, compute, bottom_up_until_type_break,
                                 top_then_bottom_then_top_again_etc,
-                                swap_resources_into_scope)
-from blaze.expr import by, symbol, Expr, Symbol
+                                swap_resources_into_scope, compile_plan)
+from blaze.expr import by, symbol, Expr, Symbol, Head
 from blaze.dispatch import dispatch
 from blaze.compatibility import raises
 from blaze.utils import example
@@ -137,3 +138,189 @@ def test_raises_on_valid_expression_but_no_implementation():
     df = [(1.0,), (2.0,), (3.0,)]
     with pytest.raises(NotImplementedError):
         compute(expr, df)
+
+
+def test_implemented_remembers_misses_until_new_signatures():
+    from blaze.compute.core import implemented
+    from blaze.dispatch import register, invalidate
+    from multipledispatch import Dispatcher
+
+    class Foo(object):
+        pass
+
+    class Bar(object):
+        pass
+
+    f = Dispatcher('f')
+    assert not implemented(f, Foo())
+
+    register(f, Foo)(lambda x: x)
+    assert implemented(f, Foo())
+
+    assert not implemented(f, Bar())
+    f.add((Bar,), lambda x: x)
+    assert implemented(f, Bar())
+
+    class Baz(object):
+        pass
+
+    assert not implemented(f, Baz())
+    f.register(Baz)(lambda x: x)
+    assert implemented(f, Baz())
+
+    invalidate(f)
+    assert implemented(f, Baz())
+
+
+def test_compile_reuses_plan_across_data():
+    t = symbol('t', 'var * {name: string, amount: int64, id: int64}')
+    expr = by(t.name, total=t.amount.sum())
+    plan = compile_plan(expr)
+
+    for n in range(3):
+        df = pd.DataFrame([['Alice', 100 + n, 1], ['Bob', 200, 2],
+                           ['Alice', 50, 3]],
+                          columns=['name', 'amount', 'id'])
+        result = plan({t: df})
+        expected = compute(expr, {t: df})
+        assert str(result) == str(expected)
+
+    assert len(plan.traces) == 1
+
+
+def test_compile_records_one_trace_per_input_type():
+    t = symbol('t', 'var * {name: string, amount: int64}')
+    plan = compile_plan(t.amount.sum() + 1)
+    L = [('Alice', 100), ('Bob', 200)]
+    df = pd.DataFrame(L, columns=['name', 'amount'])
+
+    assert plan(L) == plan(df) == 301
+    assert plan(L) == plan(df) == 301
+    assert len(plan.traces) == 2
+
+
+def test_compile_checks_leaf_types():
+    t = symbol('t', 'var * {name: string, amount: int64}')
+    plan = compile_plan(t.amount.sum(), {t: list})
+    with pytest.raises(TypeError):
+        plan(pd.DataFrame([('Alice', 100)], columns=['name', 'amount']))
+
+
+def test_compile_records_one_trace_per_compute_keywords():
+    t = symbol('t', 'var * {name: string, amount: int64}')
+    plan = compile_plan(t.amount.sum())
+    L = [('Alice', 100), ('Bob', 200)]
+
+    assert plan(L) == plan(L, post_compute=lambda e, r, **kw: r * 2) / 2
+    assert plan(L) == plan(L, post_compute=None) == 300
+    assert len(plan.traces) == 3
+
+
+def test_plan_lets_compute_errors_propagate():
+    t = symbol('t', 'var * {name: string, amount: int64}')
+    plan = compile_plan(t.amount.sum())
+    calls = []
+
+    def post(expr, result, **kwargs):
+        calls.append(result)
+        if len(calls) > 1:
+            raise KeyError('amount')
+        return result
+
+    assert plan([('Alice', 100)], post_compute=post) == 100
+    with raises(KeyError):
+        plan([('Bob', 200)], post_compute=post)
+    assert calls == [100, 200]
+
+
+def test_plan_does_not_reread_inputs_when_pre_compute_types_change():
+    t = symbol('t', 'var * int64')
+    plan = compile_plan(t.sum())
+
+    def pre(expr, data, **kwargs):
+        if not isinstance(data, Iterator):
+            return data
+        data = list(data)
+        return data if len(data) < 3 else tuple(data)
+
+    assert plan(iter([1, 2]), pre_compute=pre) == 3
+    assert plan(iter([1, 2, 3]), pre_compute=pre) == 6
+    assert plan(iter([4, 5]), pre_compute=pre) == 9
+    assert len(plan.traces) == 1
+
+
+class ReadOnce(object):
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        assert self.data is not None, "read twice"
+        data, self.data = self.data, None
+        return data
+
+
+@dispatch(Head, ReadOnce)
+def compute_up(expr, data, **kwargs):
+    data = data.read()[:expr.n]
+    return data if len(data) < 3 else tuple(data)
+
+
+def test_plan_goes_on_from_partial_results_when_types_change():
+    t = symbol('t', 'var * int64')
+    plan = compile_plan(t.head(5).sum())
+
+    assert plan(ReadOnce([1, 2])) == 3
+    assert plan(ReadOnce([1, 2, 3])) == 6
+    assert plan(ReadOnce([4, 5])) == 9
+    assert len(plan.traces) == 1
+
+
+def test_concurrent_computations_dont_share_leaf_names():
+    from multiprocessing.pool import ThreadPool
+
+    t = symbol('t', 'var * {name: string, amount: int64, id: int64}')
+    df = pd.DataFrame([['Alice', 100, 1], ['Bob', 200, 2], ['Alice', 50, 3]],
+                      columns=['name', 'amount', 'id'])
+    exprs = [(t.amount + 1).sum(),
+             t[t.amount > 60].id.count(),
+             by(t.name, total=t.amount.sum()).total.max(),
+             (t.amount * 2).mean() + t.id.sum()]
+    expected = [compute(e, {t: df}) for e in exprs]
+
+    def run(i):
+        e = exprs[i % len(exprs)]
+        return compute(e, {t: df}) == expected[i % len(exprs)]
+
+    pool = ThreadPool(8)
+    try:
+        assert all(pool.map(run, range(400)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def test_nested_compute_keeps_outer_leaf_names():
+    from blaze.compute.core import makeleaf, leaf_names
+
+    t = symbol('t', 'var * {x: int, y: int}')
+    with leaf_names():
+        outer = makeleaf(t.x + 1)
+        compute(t.x.sum(), {t: [(1, 2), (3, 4)]})
+        assert makeleaf(t.x + 1) is outer
+        assert not makeleaf(t.x * 2).isidentical(outer)
+
+
+def test_repeated_subexpressions_are_computed_once():
+    calls = []
+
+    def inc(x):
+        calls.append(x)
+        return x + 1
+
+    t = symbol('t', 'var * {a: int64, b: int64}')
+    df = pd.DataFrame([[1, 2], [3, 4]], columns=['a', 'b'])
+    a = t.a.map(inc, 'int64')
+    expr = a / a.sum()
+
+    assert list(compute(expr, {t: df})) == [2. / 6, 4. / 6]
+    assert len(calls) == len(df)
\ No newline at end of file
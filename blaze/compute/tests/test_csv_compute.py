@@ -36,6 +36,33 @@ def test_compute_chunks_on_single_csv():
     assert compute(expr, {s: csv}, comfortable_memory=10, chunksize=50) == 7.9
 
 
+def test_chunked_csv_forwards_groupby_options(monkeypatch, tmpdir):
+    from blaze.compute import csv as blaze_csv, chunks as blaze_chunks
+    from blaze import by
+
+    seen = dict()
+    compute_grouped = blaze_csv.compute_grouped
+
+    def spy(*args, **kwargs):
+        seen.update(kwargs)
+        return compute_grouped(*args, **kwargs)
+    # odo reads large files as either a TextFileReader or chunks(DataFrame)
+    monkeypatch.setattr(blaze_csv, 'compute_grouped', spy)
+    monkeypatch.setattr(blaze_chunks, 'compute_grouped', spy)
+
+    csv = CSV(example('iris.csv'))
+    s = symbol('s', discover(csv))
+    expr = by(s.species, total=s.petal_width.count())
+    result = compute(expr, {s: csv}, comfortable_memory=10, chunksize=50,
+                     nbuckets=2, dirname=str(tmpdir))
+    expected = compute(expr, {s: into(DataFrame, csv)})
+
+    assert sorted(into(list, result)) == sorted(into(list, expected))
+    assert seen['comfortable_memory'] == 10
+    assert seen['nbuckets'] == 2
+    assert seen['dirname'] == str(tmpdir)
+
+
 def test_pre_compute_with_projection_projects_on_data_frames():
     csv = CSV(example('iris.csv'))
     s = symbol('s', discover(csv))
@@ -0,0 +1,116 @@
+from __future__ import absolute_import, division, print_function
+
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+import pytest
+numba = pytest.importorskip('numba')
+
+from blaze import compute
+from blaze.expr import symbol, exp
+from blaze.expr import reductions
+from blaze.expr.broadcast import Broadcast, BroadcastReduction
+from blaze.compute import numba as blaze_numba
+from blaze.compute.numba import get_kernel, optimize_ndarray, reduce_numba
+from blaze.compute.numpy import optimize_ndarray as optimize_numpy
+
+
+x = symbol('x', 'var * float64')
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmpdir, monkeypatch):
+    """ Keep generated kernel modules out of the home directory """
+    monkeypatch.setattr(blaze_numba, 'cache_dir', str(tmpdir))
+    return str(tmpdir)
+
+
+def test_kernels_are_typed_by_data():
+    expr = optimize_ndarray(x + 1)
+    assert isinstance(expr, Broadcast)
+
+    floats = get_kernel(expr, [np.arange(3, dtype='f8')])
+    ints = get_kernel(expr, [np.arange(3, dtype='i4')])
+    assert floats is not ints
+    assert list(ints(np.arange(3, dtype='i4'))) == [1, 2, 3]
+    assert get_kernel(expr, [np.arange(3, dtype='f8')]) is floats
+
+
+def test_kernels_cache_to_disk(cache_dir):
+    expr = optimize_ndarray(exp(-x ** 2) + 2 * x)
+    kernel = get_kernel(expr, [np.arange(3.0)])
+    a = np.arange(3.0)
+    np.testing.assert_allclose(kernel(a), np.exp(-a ** 2) + 2 * a)
+    assert any(fn.startswith('kernel_') and fn.endswith('.py')
+               for fn in os.listdir(cache_dir))
+
+
+def test_broadcast_series():
+    t = symbol('t', 'var * {x: float64, y: int32}')
+    df = pd.DataFrame({'x': [1.0, 2.0, 3.0],
+                       'y': np.array([1, 2, 3], dtype='i4')},
+                      index=[10, 20, 30])
+    result = compute(t.x * 2 + t.y, df)
+    assert isinstance(result, pd.Series)
+    assert list(result.index) == [10, 20, 30]
+    assert list(result) == [3.0, 6.0, 9.0]
+
+    result = compute((t.x + 1).sum(), df)
+    assert result == 9.0
+
+
+def test_fallback_on_objects():
+    s = symbol('s', 'var * string')
+    data = pd.Series(['a', 'b'], name='s')
+    result = compute(s.map(lambda v: v.upper(), 'string'), data)
+    assert list(result) == ['A', 'B']
+
+    assert get_kernel(optimize_ndarray(s.map(len, 'int64')),
+                      [np.array(['a', 'bb'], dtype=object)]) is None
+
+
+def test_fused_reductions():
+    a = np.array([1.0, 5.0, -2.0, 4.0])
+    b = np.array([3, -1, 4, 0], dtype='i4')
+    d = symbol('d', 'var * int32')
+    data = {x: a, d: b}
+    for reduction in ['sum', 'mean', 'min', 'max', 'any', 'all']:
+        expr = getattr(reductions, reduction)(x * d + 1)
+        fused = optimize_numpy(expr, a, b)
+        assert isinstance(fused, BroadcastReduction)
+        expected = getattr(np, reduction)(a * b + 1)
+        result = reduce_numba(fused, *[data[c] for c in fused._inputs])
+        assert np.allclose(result, expected)
+        assert np.allclose(compute(expr, {x: a, d: b}), expected)
+
+
+def test_fused_reductions_propagate_nan():
+    a = np.array([1.0, np.nan, 3.0])
+    for reduction in ['sum', 'min', 'max']:
+        expr = getattr(reductions, reduction)(x + 1)
+        assert np.isnan(reduce_numba(optimize_numpy(expr, a), a))
+
+
+def test_fused_reductions_fall_back():
+    expr = optimize_numpy((x + 1).sum(), np.arange(3.0))
+    with pytest.raises(NotImplementedError):
+        reduce_numba(expr, np.arange(0.0))
+    assert compute((x + 1).sum(), np.arange(0.0)) == 0
+    assert compute((x + 1).sum(keepdims=True), np.arange(3.0)).tolist() == [6]
+
+
+def test_fused_sums_are_compensated_and_typed():
+    a = np.full(100000, 0.1)
+    a[:3] = [1e16, 1.0, -1e16]
+    total = math.fsum(a)
+    for reduction, expected in [('sum', total), ('mean', total / len(a))]:
+        expr = optimize_numpy(getattr(reductions, reduction)(x * 1.0), a)
+        assert abs(reduce_numba(expr, a) - expected) <= 1e-12 * expected
+
+    f = symbol('f', 'var * float32')
+    b = np.array([1.5, -2.5, 3.0], dtype='f4')
+    result = reduce_numba(optimize_numpy((-f).min(), b), b)
+    assert isinstance(result, np.float32) and result == -3.0
@@ -0,0 +1,77 @@
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+import pandas as pd
+
+import pytest
+numexpr = pytest.importorskip('numexpr')
+
+from blaze import compute
+from blaze.expr import symbol, sin, isnan
+from blaze.expr.broadcast import Broadcast
+from blaze.compute.numexpr import (broadcast_numexpr, print_numexpr,
+                                   broadcast_numexpr_collect, reduce_numexpr)
+from blaze.expr.broadcast import BroadcastReduction
+
+
+t = symbol('t', 'var * {x: float64, y: int64, name: string}')
+x = np.array([(1.0, 1, 'a'), (np.nan, 2, 'b'), (3.0, -3, 'c')],
+             dtype=[('x', 'f8'), ('y', 'i8'), ('name', 'O')])
+df = pd.DataFrame(x)
+
+
+def test_print_isnan():
+    s = symbol('s', 'float64')
+    assert print_numexpr([s], isnan(s)) == 's != s'
+
+
+def test_broadcast_numexpr():
+    expr = broadcast_numexpr_collect(sin(t.x) * 2 + t.y / 2)
+    assert isinstance(expr, Broadcast)
+    result = broadcast_numexpr(expr, x['x'], x['y'])
+    np.testing.assert_allclose(result, np.sin(x['x']) * 2 + x['y'] / 2)
+
+    with pytest.raises(NotImplementedError):
+        broadcast_numexpr(broadcast_numexpr_collect(t.x // 2), x['x'])
+
+
+def test_compute_numpy_and_pandas():
+    for data in [x, df]:
+        result = compute(t.x * 2 + t.y, data)
+        np.testing.assert_array_equal(np.asarray(result), [3.0, np.nan, 3.0])
+
+        result = compute(t[(t.x > 0) & (t.y > 0)].name, data)
+        assert list(result) == ['a']
+
+        assert compute(t[t.y ** 2 < 5].y.sum(), data) == 3
+
+
+def test_series_keep_index():
+    s = pd.Series([1.0, 2.0, 3.0], index=[5, 6, 7], name='x')
+    expr = broadcast_numexpr_collect(t.x + 1)
+    result = broadcast_numexpr(expr, s)
+    assert list(result.index) == [5, 6, 7]
+    assert result.name == 'x'
+
+
+def test_reduce_numexpr():
+    a = np.array([1.0, 2.0, 3.0])
+    b = np.array([1, 2, 3])
+    expr = BroadcastReduction(broadcast_numexpr_collect((t.y * 2 + 1).sum()))
+    assert reduce_numexpr(expr, b) == 15
+
+    expr = BroadcastReduction(broadcast_numexpr_collect((t.y * 2).mean()))
+    assert reduce_numexpr(expr, b) == 4.0
+
+    expr = BroadcastReduction(broadcast_numexpr_collect((t.y * 2).max()))
+    with pytest.raises(NotImplementedError):
+        reduce_numexpr(expr, b)
+
+    # Floating point sums are left to engines that compensate for rounding
+    expr = BroadcastReduction(broadcast_numexpr_collect((t.x * 2 + t.y).sum()))
+    with pytest.raises(NotImplementedError):
+        reduce_numexpr(expr, a, b)
+
+    expr = BroadcastReduction(broadcast_numexpr_collect((t.x * 2).mean()))
+    with pytest.raises(NotImplementedError):
+        reduce_numexpr(expr, a)
@@ -2,11 +2,13 @@ from __future__ import absolute_import, division, print_function
 
 import pytest
 
+import operator
 import numpy as np
 import pandas as pd
 from datetime import datetime, date
 
 from blaze.compute.core import compute, compute_up
+from blaze.compatibility import reduce
 from blaze.expr import symbol, by, exp, summary, Broadcast, join
 from blaze import sin
 from odo import into
@@ -83,6 +85,9 @@ def test_Reductions():
     assert compute(t['amount'].var(unbiased=True), x) == x['amount'].var(ddof=1)
     assert compute(t['amount'].std(unbiased=True), x) == x['amount'].std(ddof=1)
     assert compute((t['amount'] > 150).any(), x) == True
+    assert compute(t['amount'].median(), x) == np.median(x['amount'])
+    assert compute(t['amount'].quantile(0.9), x) == \
+            np.percentile(x['amount'], 90)
     assert compute((t['amount'] > 250).all(), x) == False
     assert compute(t['amount'][0], x) == x['amount'][0]
     assert compute(t['amount'][-1], x) == x['amount'][-1]
@@ -138,6 +143,32 @@ def test_head():
               x[:2])
 
 
+def test_sort_head():
+    assert eq(compute(t.sort('amount').head(2), x),
+              np.sort(x, order='amount')[:2])
+
+    assert eq(compute(t.sort('amount', ascending=False).head(2), x),
+              np.sort(x, order='amount')[::-1][:2])
+
+    assert eq(compute(t.amount.sort(ascending=False).head(10), x),
+              np.sort(x['amount'])[::-1])
+
+    y = np.array([1.0, np.nan, 3.0, 2.0])
+    s = symbol('s', discover(y))
+    assert eq(compute(s.sort().head(2), y), np.sort(y)[:2])
+
+
+def test_sort_head_breaks_ties_like_sort():
+    y = np.array([(2, 'c'), (1, 'z'), (1, 'b'), (3, 'a'), (1, 'a'), (3, 'b')],
+                 dtype=[('key', 'i8'), ('name', 'U1')])
+    s = symbol('s', discover(y))
+    for n in range(1, len(y) + 1):
+        assert eq(compute(s.sort('key').head(n), y),
+                  np.sort(y, order='key')[:n])
+        assert eq(compute(s.sort('key', ascending=False).head(n), y),
+                  np.sort(y, order='key')[::-1][:n])
+
+
 def test_label():
     expected = x['amount'] * 10
     expected = np.array(expected, dtype=[('foo', 'i8')])
@@ -368,6 +399,15 @@ def test_broadcast_compute_against_numbers_and_arrays():
     assert eq(result, x + 10)
 
 
+def test_broadcast_many_arrays():
+    symbols = [symbol(name, '5 * float64') for name in 'abcdefg']
+    arrays = [np.arange(5.0) + i for i in range(len(symbols))]
+    expr = reduce(operator.add, symbols)
+    expected = sum(arrays)
+    assert eq(compute(expr, dict(zip(symbols, arrays))), expected)
+    assert compute(expr.sum(), dict(zip(symbols, arrays))) == expected.sum()
+
+
 def test_map():
     pytest.importorskip('numba')
     a = np.arange(10.0)
@@ -71,6 +71,15 @@ def test_arithmetic():
                            df.amount % df.id)
 
 
+def test_broadcast_many_columns():
+    s = symbol('s', 'var * {a: float64, b: float64, c: float64, d: float64, '
+                    'e: float64, f: float64}')
+    frame = DataFrame(np.arange(18.0).reshape(3, 6), columns=list('abcdef'))
+    expr = s.a + s.b + s.c + s.d + s.e + s.f
+    tm.assert_series_equal(compute(expr, frame), frame.sum(axis=1),
+                           check_names=False)
+
+
 def test_join():
     left = DataFrame(
         [['Alice', 100], ['Bob', 200]], columns=['name', 'amount'])
@@ -92,6 +101,22 @@ def test_join():
     assert list(result.columns) == list(joined.fields)
 
 
+def test_selection_on_join():
+    left = DataFrame(
+        [['Alice', 100], ['Bob', 200]], columns=['name', 'amount'])
+    right = DataFrame([['Alice', 1], ['Bob', 2]], columns=['name', 'id'])
+
+    lsym = symbol('L', 'var * {name: string, amount: int}')
+    rsym = symbol('R', 'var * {name: string, id: int}')
+    joined = join(lsym, rsym, 'name')
+    expr = joined[(joined.amount > 150) & (joined.id > 0)]
+
+    result = compute(expr, {lsym: left, rsym: right})
+
+    assert list(result.itertuples(index=False)) == [('Bob', 200, 2)]
+    assert list(result.columns) == list(joined.fields)
+
+
 def test_multi_column_join():
     left = [(1, 2, 3),
             (2, 3, 4),
@@ -160,6 +185,18 @@ def test_reductions():
     assert compute(t.amount[-1], df) == df.amount.iloc[-1]
 
 
+def test_quantile():
+    assert compute(t.amount.median(), df) == df.amount.median()
+    assert compute(t.amount.quantile(0.9), df) == df.amount.quantile(0.9)
+
+    result = compute(by(t.name, p90=t.amount.quantile(0.9),
+                        p50=t.amount.median()), df)
+    expected = DataFrame([['Alice', 75.0, 50 + 0.9 * 50],
+                          ['Bob', 200.0, 200.0]],
+                         columns=['name', 'p50', 'p90'])
+    tm.assert_frame_equal(result, expected)
+
+
 def test_reductions_on_dataframes():
     assert compute(count(t), df) == 3
     assert shape(compute(count(t, keepdims=True), df)) == (1,)
@@ -305,6 +342,17 @@ def test_head():
     tm.assert_frame_equal(compute(t.head(1), df), df.head(1))
 
 
+def test_sort_head():
+    tm.assert_frame_equal(compute(t.sort('amount').head(2), df),
+                          df.sort('amount').head(2))
+
+    tm.assert_frame_equal(compute(t.sort('amount', ascending=False).head(2), df),
+                          df.sort('amount', ascending=False).head(2))
+
+    tm.assert_series_equal(compute(t.amount.sort('amount').head(2), df),
+                           df.amount.order().head(2))
+
+
 def test_label():
     expected = df['amount'] * 10
     expected.name = 'foo'
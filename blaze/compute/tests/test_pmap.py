@@ -1,4 +1,12 @@
-from blaze import compute, resource, symbol, discover
+import os
+
+import numpy as np
+
+import pandas as pd
+
+from blaze import compute, resource, symbol, discover, join, into
+from blaze.compute.pmap import (ThreadPoolMap, ProcessPoolMap, SharedArray,
+                                share, call_shared, share_object, call_object)
 from blaze.utils import example
 
 
@@ -17,3 +25,74 @@ def test_map_called_on_resource_star():
     b = compute(s.count(), r, map=mymap)
     assert a == b
     assert flag[0]
+
+
+def test_thread_pool_map():
+    from blaze.compute.chunks import chunks
+    cL = chunks(list)([[1, 2, 3], [4, 5, 6]])
+    s = symbol('s', discover(cL))
+
+    pmap = ThreadPoolMap(2)
+    try:
+        assert compute(s.sum(), cL, map=pmap) == 21
+    finally:
+        pmap.close()
+
+
+def test_process_pool_map_shares_numpy_chunks():
+    pmap = ProcessPoolMap(2)
+    try:
+        x = np.arange(10)
+        result = pmap(np.sum, [x[:5], x[5:]])
+        assert result == [10, 35]
+        assert not any(isinstance(r, SharedArray) for r in result)
+    finally:
+        pmap.close()
+
+
+def test_share_passes_through_non_arrays():
+    assert share([1, 2, 3]) == [1, 2, 3]
+
+    x = np.arange(5)
+    shared = share(x)
+    try:
+        assert isinstance(shared, SharedArray)
+        assert (call_shared(np.asarray, shared) == x).all()
+    finally:
+        os.remove(shared.path)
+
+
+def test_pools_are_created_lazily():
+    pmap = ProcessPoolMap(2)
+    assert pmap._pool is None
+    pmap.close()
+    assert pmap._pool is None
+
+
+def test_pool_map_as_context_manager():
+    with ThreadPoolMap(2) as pmap:
+        assert pmap(abs, [-1, 2]) == [1, 2]
+        assert pmap._pool is not None
+    assert pmap._pool is None
+
+
+def test_shared_objects_are_loaded_once():
+    shared = share_object(abs)
+    try:
+        assert shared.load() is shared.load()
+        assert call_object(shared, -1) == 1
+    finally:
+        os.remove(shared.path)
+
+
+def test_broadcast_join_under_process_pool():
+    from blaze.compute.chunks import chunks
+    a = symbol('a', 'var * {id: int64, x: int64}')
+    b = symbol('b', 'var * {id: int64, y: int64}')
+    ca = chunks(list)([[(1, 10), (2, 20)], [(3, 30), (4, 40)]])
+    df = pd.DataFrame([[2, 200], [4, 400]], columns=['id', 'y'])
+
+    with ProcessPoolMap(2) as pmap:
+        result = compute(join(a, b, 'id'), {a: ca, b: df}, map=pmap)
+        assert sorted(into(list, into(pd.DataFrame, result))) == \
+                [(2, 20, 200), (4, 40, 400)]
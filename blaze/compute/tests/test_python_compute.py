@@ -6,10 +6,11 @@ import operator
 import pytest
 from datetime import datetime, date
 import datashape
+from datashape.predicates import iscollection
 from collections import Iterator, Iterable
 
 import blaze
-from blaze.compute.python import (nunique, mean, rrowfunc, rowfunc,
+from blaze.compute.python import (nunique, mean, rrowfunc, rowfunc, Batched,
                                   reduce_by_funcs, optimize)
 from blaze import dshape
 from blaze.compute.core import compute, compute_up, pre_compute
@@ -103,10 +104,19 @@ def test_reductions():
     assert compute(count(t['amount']), data) == 3
     assert compute(any(t['amount'] > 150), data) is True
     assert compute(any(t['amount'] > 250), data) is False
+    assert compute(t.amount.median(), data) == 100
+    assert compute(t.amount.quantile(0.75), data) == 150
     assert compute(t.amount[0], data) == 100
     assert compute(t.amount[-1], data) == 50
 
 
+def test_quantile_skips_missing_values():
+    s = symbol('s', 'var * {amount: ?float64}')
+    rows = [(1.0,), (None,), (3.0,), (float('nan'),)]
+    assert compute(s.amount.median(), rows) == 2.0
+    assert compute(s.amount.quantile(0.5), [(None,)]) is None
+
+
 def test_1d_reductions_keepdims():
     for r in [sum, min, max, nunique, count]:
         assert compute(r(t.amount, keepdims=True), data) == \
@@ -153,6 +163,14 @@ def test_std():
                        np.var(amt, ddof=1))
 
 
+def test_var_far_from_zero():
+    x = (1e9 + np.random.RandomState(0).randn(1000) * 1e-2).tolist()
+    s = symbol('s', 'var * float64')
+    assert np.allclose(compute(s.var(), x), np.var(x), rtol=1e-6)
+    assert np.allclose(compute(s.std(unbiased=True), x), np.std(x, ddof=1),
+                       rtol=1e-6)
+
+
 def test_by_no_grouper():
     names = t['name']
     assert set(compute(by(names, count=names.count()), data)) == \
@@ -332,6 +350,15 @@ def test_head():
     assert len(list(compute(e, p))) == 101
 
 
+def test_sort_head():
+    for asc in [True, False]:
+        assert list(compute(t.sort('amount', ascending=asc).head(2), data)) == \
+                sorted(data, key=lambda x: x[1], reverse=not asc)[:2]
+
+    assert list(compute(t.sort(-t.amount).head(2).name, data)) == \
+            ['Bob', 'Alice']
+
+
 def test_graph_double_join():
     idx = [['A', 1],
            ['B', 2],
@@ -831,3 +858,33 @@ def test_compute_up_on_base():
     d = datetime.now()
     s = symbol('s', 'datetime')
     assert compute(s.minute, d) == d.minute
+
+
+def test_batch_mode():
+    ordered = [t.amount + 1,
+               t[t.amount > 60].name,
+               (t.amount * 2).head(2),
+               t.sort('amount').name]
+    unordered = [t.name.distinct(),
+                 by(t.name, total=t.amount.sum())]
+    scalars = [t.amount.sum(),
+               t.amount.mean(),
+               summary(total=t.amount.sum(), n=t.id.count())]
+    batched = lambda expr: compute(expr, iter(data), batchsize=2)
+    for expr in ordered:
+        assert list(batched(expr)) == list(compute(expr, data))
+    for expr in unordered:
+        assert sorted(batched(expr)) == sorted(compute(expr, data))
+    for expr in scalars:
+        assert batched(expr) == compute(expr, data)
+
+    assert list(compute(t.amount + 1, [], batchsize=2)) == []
+
+
+def test_batch_mode_only_with_batchsize():
+    assert isinstance(pre_compute(t.amount.sum(), data, batchsize=2),
+                      Batched)
+    assert pre_compute(t.amount.sum(), data) is data
+    assert pre_compute(t.head(2).amount.sum(), data, batchsize=2) is data
+    assert compute(t.head(2).amount.sum(), iter(data), batchsize=2) == \
+            compute(t.head(2).amount.sum(), data)
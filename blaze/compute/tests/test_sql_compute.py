@@ -292,6 +292,25 @@ def test_nunique():
     assert 'amount' in result.lower()
 
 
+def test_approximate_nunique():
+    result = str(computefull(t.amount.nunique(approx=True), s))
+    assert 'count(distinct accounts.amount)' in result.lower()
+
+    from sqlalchemy.dialects import oracle
+    result = computefull(t.amount.nunique(approx=True), s)
+    assert 'APPROX_COUNT_DISTINCT(accounts.amount)' in \
+            str(result.compile(dialect=oracle.dialect()))
+
+
+def test_quantile():
+    result = str(computefull(t.amount.quantile(0.9), s)).lower()
+    assert 'percentile_cont' in result
+    assert 'within group (order by accounts.amount)' in result
+
+    result = str(computefull(t.amount.median(), s)).lower()
+    assert 'percentile_cont' in result
+
+
 @xfail(reason="Fails because SQLAlchemy doesn't seem to know binary reductions")
 def test_binary_reductions():
     assert str(compute(any(t['amount'] > 150), s)) == \
@@ -382,6 +401,21 @@ def test_by_summary_single_column():
 
 
 
+def test_repeated_subquery_is_one_common_table_expression():
+    metadata = sa.MetaData()
+    amounts = sa.Table('amounts', metadata,
+                       sa.Column('name', sa.String),
+                       sa.Column('amount', sa.Integer))
+
+    L = symbol('L', 'var * {name: string, amount: int}')
+    positive = L[L.amount > 0]
+    result = normalize(str(compute(join(positive, positive, 'name'),
+                                   {L: amounts})))
+
+    assert result.count('with ') == 1
+    assert result.count('amounts.amount >') == 1
+
+
 def test_join_projection():
     metadata = sa.MetaData()
     lhs = sa.Table('amounts', metadata,
@@ -1,12 +1,86 @@
 from __future__ import absolute_import, division, print_function
 
 from datashape.dispatch import namespace
-from multipledispatch import dispatch
-from functools import partial
+from multipledispatch import dispatch as _dispatch
 
 
-__all__ = 'dispatch', 'namespace'
+__all__ = 'dispatch', 'namespace', 'register', 'resolve', 'invalidate'
 
 
-dispatch = partial(dispatch, namespace=namespace)
+def dispatch(*types, **kwargs):
+    """ Register a function in the Blaze namespace
 
+    Like ``multipledispatch.dispatch`` but also forgets the memoized
+    resolutions of the dispatcher, see ``resolve``.
+    """
+    kwargs.setdefault('namespace', namespace)
+    add = _dispatch(*types, **kwargs)
+
+    def _(func):
+        dispatcher = add(func)
+        invalidate(dispatcher)
+        return dispatcher
+    return _
+
+
+def register(dispatcher, *types):
+    """ Like ``dispatcher.register(*types)`` but also forgets its resolutions
+
+    >>> from multipledispatch import Dispatcher
+    >>> f = Dispatcher('f')
+    >>> @register(f, int)
+    ... def inc(x):
+    ...     return x + 1
+    >>> f(1)
+    2
+    """
+    def _(func):
+        dispatcher.add(types, func)
+        invalidate(dispatcher)
+        return func
+    return _
+
+
+# Memoized implementation lookups, misses included, keyed on dispatcher.
+# Each holds the number of signatures of the dispatcher when it was filled.
+_resolutions = dict()
+
+
+def invalidate(dispatcher=None):
+    """ Forget memoized resolutions of ``dispatcher``, or of all dispatchers
+
+    New signatures, however they are added, invalidate the resolutions of a
+    dispatcher on their own.  Call this after replacing the implementation of
+    a signature that was already registered.
+    """
+    if dispatcher is None:
+        _resolutions.clear()
+    else:
+        _resolutions.pop(dispatcher, None)
+
+
+def resolve(dispatcher, *types):
+    """ Memoized ``dispatcher.dispatch(*types)``
+
+    Returns ``None`` if no implementation matches the given types.  Unlike
+    multipledispatch's own cache this also remembers failed lookups, which
+    otherwise walk every registered signature each time.  Results are kept
+    until the dispatcher gains a signature or ``invalidate`` is called.
+
+    >>> from multipledispatch import Dispatcher
+    >>> f = Dispatcher('f')
+    >>> print(resolve(f, int))
+    None
+    >>> f.add((int,), lambda x: x + 1)
+    >>> resolve(f, int)(1)
+    2
+    """
+    version, cache = _resolutions.get(dispatcher, (None, None))
+    if version != len(dispatcher.funcs):
+        cache = dict()
+        _resolutions[dispatcher] = len(dispatcher.funcs), cache
+    try:
+        return cache[types]
+    except KeyError:
+        result = cache[types] = dispatcher.dispatch(*types)
+        return result
@@ -10,8 +10,9 @@ from .expressions import Field, Map
 from .arithmetic import maxshape, Arithmetic, UnaryOp
 from .math import Math, sin
 from .datetime import DateTime
+from . import reductions
 
-__all__ = ['broadcast', 'Broadcast', 'scalar_symbols']
+__all__ = ['broadcast', 'Broadcast', 'BroadcastReduction', 'scalar_symbols']
 
 
 def broadcast(expr, leaves, scalars=None):
@@ -105,7 +106,7 @@ WantToBroadcast = (Arithmetic, Math, Map, DateTime, UnaryOp)
 
 
 def broadcast_collect(expr, Broadcastable=Broadcastable,
-                            WantToBroadcast=WantToBroadcast):
+                            WantToBroadcast=WantToBroadcast, maxleaves=None):
     """ Collapse expression down using Broadcast - Tabular cases only
 
     Expressions of type Broadcastables are swallowed into Broadcast
@@ -121,15 +122,85 @@ def broadcast_collect(expr, Broadcastable=Broadcastable,
     >>> expr = t.x + 2 * exp(-(t.x - 1.3) ** 2)
     >>> broadcast_collect(expr)
     Broadcast(_children=(t,), _scalars=(t,), _scalar_expr=t.x + (2 * (exp(-((t.x - 1.3) ** 2)))))
+
+    Backends that implement ``Broadcast`` for a fixed number of inputs pass
+    ``maxleaves``.  We then fuse smaller subexpressions instead.
+
+    >>> from blaze.expr import Arithmetic
+    >>> expr = t.x + t.y + t.z
+    >>> broadcast_collect(expr, Broadcastable=Arithmetic,
+    ...                   WantToBroadcast=Arithmetic, maxleaves=2)
+    (Broadcast(_children=(t.x, t.y), _scalars=(x, y), _scalar_expr=x + y)) + t.z
     """
     if (isinstance(expr, WantToBroadcast) and
         iscollection(expr.dshape)):
         leaves = leaves_of_type(Broadcastable, expr)
-        expr = broadcast(expr, sorted(leaves, key=str))
+        if maxleaves is None or len(leaves) <= maxleaves:
+            expr = broadcast(expr, sorted(leaves, key=str))
+
+    # Recurse down
+    children = [broadcast_collect(i, Broadcastable, WantToBroadcast,
+                                  maxleaves)
+                for i in expr._inputs]
+    return expr._subs(dict(zip(expr._inputs, children)))
+
+
+class BroadcastReduction(Expr):
+    """ A reduction of a Broadcast fused into a single pass
+
+    >>> t = symbol('t', 'var * {x: int, y: int}')
+    >>> expr = broadcast_collect((t.x * t.y + 1).sum())
+    >>> fused = BroadcastReduction(expr)
+    >>> fused._inputs
+    (t,)
+    >>> fused.dshape
+    dshape("int64")
+
+    Backends that can evaluate the scalar expression inside the loop of the
+    reduction never materialize the elementwise result.  All others compute
+    ``_reduction`` as usual.
+    """
+    __slots__ = '_hash', '_reduction'
+
+    @property
+    def _broadcast(self):
+        return self._reduction._child
+
+    @property
+    def _inputs(self):
+        return self._broadcast._children
+
+    @property
+    def dshape(self):
+        return self._reduction.dshape
+
+    @property
+    def _name(self):
+        return self._reduction._name
+
+
+Fusable = (reductions.sum, reductions.mean, reductions.min, reductions.max,
+           reductions.any, reductions.all)
+
+
+def fuse_broadcast_reductions(expr, Fusable=Fusable):
+    """ Fuse full reductions of one dimensional Broadcasts
+
+    >>> t = symbol('t', 'var * {x: int, y: int}')
+    >>> expr = broadcast_collect((t.x * t.y + 1).sum() + 1)
+    >>> fused = fuse_broadcast_reductions(expr)
+    >>> type(fused.lhs).__name__
+    'BroadcastReduction'
+    >>> fused.lhs._reduction.isidentical(expr.lhs)
+    True
+    """
+    if (isinstance(expr, Fusable) and
+        isinstance(expr._child, Broadcast) and
+        expr._child.ndim == 1):
+        return BroadcastReduction(expr)
 
     # Recurse down
-    children = [broadcast_collect(i, Broadcastable, WantToBroadcast)
-            for i in expr._inputs]
+    children = [fuse_broadcast_reductions(i, Fusable) for i in expr._inputs]
     return expr._subs(dict(zip(expr._inputs, children)))
 
 
@@ -8,7 +8,7 @@ from datashape.predicates import isscalar, iscollection, isrecord
 from .core import common_subexpression
 from .expressions import Expr, ElemWise, label
 
-__all__ = ['Sort', 'Distinct', 'Head', 'Merge', 'distinct', 'merge',
+__all__ = ['Sort', 'Distinct', 'Head', 'TopK', 'Merge', 'distinct', 'merge',
            'head', 'sort', 'Join', 'join', 'transform']
 
 class Sort(Expr):
@@ -145,6 +145,52 @@ def head(child, n=10):
 head.__doc__ = Head.__doc__
 
 
+class TopK(Expr):
+    """ First ``n`` elements of collection in sorted order
+
+    Equivalent to ``child.sort(key, ascending).head(n)`` but backends can find
+    these elements without sorting the entire collection.  The optimizer
+    produces this from a ``Head`` of a ``Sort``.
+
+    Examples
+    --------
+    >>> from blaze import symbol
+    >>> accounts = symbol('accounts', 'var * {name: string, amount: int}')
+    >>> TopK(accounts, 'amount', False, 5).dshape
+    dshape("5 * {name: string, amount: int32}")
+
+    See Also
+    --------
+
+    blaze.expr.optimize.fuse_top_k
+    """
+    __slots__ = '_hash', '_child', '_key', 'ascending', 'n'
+
+    @property
+    def dshape(self):
+        return self.n * self._child.dshape.subshape[0]
+
+    @property
+    def key(self):
+        if self._key is () or self._key is None:
+            return self._child.fields[0]
+        if isinstance(self._key, tuple):
+            return list(self._key)
+        else:
+            return self._key
+
+    def _len(self):
+        return min(self._child._len(), self.n)
+
+    @property
+    def _name(self):
+        return self._child._name
+
+    def __str__(self):
+        return "%s.sort(%s, ascending=%s).head(%d)" % (
+                self._child, repr(self._key), self.ascending, self.n)
+
+
 def merge(*exprs, **kwargs):
     if len(exprs) + len(kwargs) == 1:
         if exprs:
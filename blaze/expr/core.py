@@ -1,14 +1,16 @@
 from __future__ import absolute_import, division, print_function
 
+import math
 import numbers
 import toolz
 import inspect
+from weakref import WeakValueDictionary
 
 from toolz import unique, concat, compose, partial
 import toolz
 from pprint import pprint
 
-from ..compatibility import StringIO, _strtypes, builtins
+from ..compatibility import StringIO, _strtypes, builtins, with_metaclass
 from ..dispatch import dispatch
 
 __all__ = ['Node', 'path', 'common_subexpression', 'eval_str']
@@ -16,7 +18,56 @@ __all__ = ['Node', 'path', 'common_subexpression', 'eval_str']
 
 base = (numbers.Number,) + _strtypes
 
-class Node(object):
+
+# Hash-consing table, {(type, argument key): node}
+_interned = WeakValueDictionary()
+
+
+def _intern_key(arg):
+    """ Hashable key for an argument, exact in type and identity of nodes
+
+    Arguments of interned nodes are themselves interned, so we key on their
+    identity.  Types are part of the key so that ``1``, ``1.0`` and ``True``
+    stay distinct, and so are the signs of reals so that ``0.0`` and ``-0.0``
+    do.
+
+    >>> _intern_key(0.0) == _intern_key(-0.0)
+    False
+    """
+    if isinstance(arg, Node):
+        return (Node, id(arg))
+    if isinstance(arg, (tuple, list)):
+        return (type(arg), tuple(map(_intern_key, arg)))
+    if isinstance(arg, numbers.Real) and not isinstance(arg, numbers.Integral):
+        return (type(arg), arg, math.copysign(1, arg))
+    return (type(arg), arg)
+
+
+class Interned(type):
+    """ Metaclass that hash-conses nodes on construction
+
+    Constructing a node that is structurally identical to a living node returns
+    that existing node instead.  Identical subtrees then share memory and
+    identity checks, hashing and lookups in scope dictionaries take constant
+    time.  Nodes with unhashable arguments are not interned.
+
+    >>> from blaze.expr import symbol
+    >>> t = symbol('t', 'var * {x: int, y: int}')
+    >>> (t.x + 1) is (t.x + 1)
+    True
+    >>> (t.x + 1) is (t.x + 1.0)
+    False
+    """
+    def __call__(cls, *args, **kwargs):
+        node = type.__call__(cls, *args, **kwargs)
+        try:
+            key = (cls, _intern_key(node._args))
+            return _interned.setdefault(key, node)
+        except (TypeError, ValueError):  # unhashable or incomparable arguments
+            return node
+
+
+class Node(with_metaclass(Interned, object)):
     """ Node in a tree
 
     This serves as the base class for ``Expr``.  This class holds all of the
@@ -120,11 +171,8 @@ class Node(object):
     def __contains__(self, other):
         return other in set(self._subterms())
 
-    def __getstate__(self):
-        return self._args
-
-    def __setstate__(self, state):
-        self.__init__(*state)
+    def __reduce__(self):
+        return type(self), self._args
 
     def __eq__(self, other):
         ident = self.isidentical(other)
@@ -246,6 +294,8 @@ def isidentical(a, b):
     >>> isidentical((x, x + 1), (x, x + 2))
     False
     """
+    if a is b:
+        return True
     if isinstance(a, base) and isinstance(b, base):
         return a == b
     if type(a) != type(b):
@@ -341,7 +391,10 @@ def _subs(o, d):
     >>> subs(t, {'balance': 'amount'}).fields
     ['name', 'amount']
     """
-    newargs = [subs(arg, d) for arg in o._args]
+    args = o._args
+    newargs = [subs(arg, d) for arg in args]
+    if all(a is b for a, b in zip(args, newargs)):
+        return o
     return type(o)(*newargs)
 
 
@@ -366,12 +419,12 @@ def path(a, b):
     """
     while not a.isidentical(b):
         yield a
-        if not a._inputs:
-            break
         for child in a._inputs:
-            if any(b.isidentical(node) for node in child._traverse()):
+            if any(b.isidentical(node) for node in child._subterms()):
                 a = child
                 break
+        else:
+            break
     yield a
 
 
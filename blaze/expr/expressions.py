@@ -469,11 +469,40 @@ def selection(table, predicate):
         raise TypeError("Must select over a boolean predicate.  Got:\n"
                         "%s[%s]" % (table, predicate))
 
+    # A table with values that look at all of the rows of ``subexpr``, like a
+    # Merge holding a mean, must be computed before we filter it
+    if isrecord(table.dshape.measure) and _combines_rows(table, subexpr):
+        # Stand in for each column with a symbol, then with a field of table
+        columns = [(table._get_field(name),
+                    symbol('_%d' % i, table._get_field(name).dshape),
+                    Field(table, name))
+                   for i, name in enumerate(table.fields)]
+        predicate2 = predicate._subs(dict((col, sym)
+                                          for col, sym, _ in columns))
+        if not builtins.any(node.isidentical(subexpr)
+                            for node in predicate2._subterms()):
+            return Selection(table, predicate2._subs(
+                dict((sym, field) for _, sym, field in columns)))
+
     return table._subs({subexpr: Selection(subexpr, predicate)})
 
 selection.__doc__ = Selection.__doc__
 
 
+def _combines_rows(expr, child):
+    """ Does ``expr`` hold a value computed from many rows of ``child``?
+
+    >>> t = symbol('t', 'var * {x: int}')
+    >>> _combines_rows(t.x + 1, t), _combines_rows(t.x - t.x.mean(), t)
+    (False, True)
+    """
+    return builtins.any(
+        not isinstance(node, (ElemWise, Symbol)) and
+        not node.isidentical(child) and
+        builtins.any(sub.isidentical(child) for sub in node._subterms())
+        for node in expr._subterms())
+
+
 class Label(ElemWise):
     """A Labeled expression
 
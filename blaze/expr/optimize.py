@@ -1,16 +1,20 @@
 from __future__ import absolute_import, division, print_function
 
-from datashape.predicates import isscalar
+import operator
+
+from datashape.predicates import isscalar, isboolean
 from multipledispatch import MDNotImplementedError
 
 from .expressions import *
 from .strings import *
+from .strings import isstring
 from .arithmetic import *
 from .collections import *
 from .split_apply_combine import *
 from .broadcast import *
 from .reductions import *
 from ..dispatch import dispatch
+from ..compatibility import builtins, reduce
 
 
 def lean_projection(expr):
@@ -229,3 +233,324 @@ def _lean(expr, fields=None):
         The fields that this expression requires to execute
     """
     raise NotImplementedError()
+
+
+def fuse_top_k(expr):
+    """ Replace ``Head`` of ``Sort`` with a single ``TopK``
+
+    Backends compute ``TopK`` with a heap or a partial sort rather than by
+    sorting everything and then throwing most of it away.
+
+    >>> t = symbol('t', 'var * {name: string, amount: int}')
+    >>> expr = fuse_top_k(t.sort('amount', ascending=False).head(10).name)
+    >>> type(expr._child).__name__
+    'TopK'
+    """
+    inputs = expr._inputs
+    if not inputs:
+        return expr
+    expr = expr._subs(dict(zip(inputs, map(fuse_top_k, inputs))))
+    if isinstance(expr, Head) and isinstance(expr._child, Sort):
+        sort = expr._child
+        return TopK(sort._child, sort._key, sort.ascending, expr.n)
+    return expr
+
+
+# Nodes that pass rows through without their result depending on row order
+_order_blind = (ElemWise, Selection, Distinct, Like)
+
+
+def drop_sorts(expr, ordered=True):
+    """ Remove sorts whose order can not affect the result
+
+    A sort that only feeds reductions, through elementwise operations and
+    selections, changes nothing but may cost a full external sort on chunked
+    data.
+
+    >>> t = symbol('t', 'var * {name: string, amount: int}')
+    >>> drop_sorts(t.sort('name').amount.sum())
+    sum(t.amount)
+    >>> drop_sorts(t.sort('name').amount)
+    t.sort('name', ascending=True).amount
+    """
+    if isinstance(expr, Sort) and not ordered:
+        return drop_sorts(expr._child, ordered)
+    if isinstance(expr, (Reduction, Summary)):
+        ordered = False
+    elif not isinstance(expr, _order_blind):
+        ordered = True
+    inputs = expr._inputs
+    if not inputs:
+        return expr
+    return expr._subs(dict((i, drop_sorts(i, ordered)) for i in inputs))
+
+
+def push_predicates(expr):
+    """ Move selections as close to the data as possible
+
+    Conjunctive predicates are split apart so that each piece sinks as far as
+    it can on its own.  Pieces that stay together are applied cheap first so
+    that string comparisons and user functions see as few rows as possible.
+
+    >>> t = symbol('t', 'var * {name: string, amount: int, id: int}')
+    >>> s = t.sort('amount')
+    >>> push_predicates(s[s.amount > 0])
+    t[t.amount > 0].sort('amount', ascending=True)
+
+    >>> push_predicates(t[(t.name == 'Alice') & (t.amount > 0)])
+    t[t.amount > 0][(t[t.amount > 0].name) == 'Alice']
+
+    Predicates that look at more than one row, like comparisons to a
+    reduction, stay where they are
+
+    >>> push_predicates(s[s.amount > s.amount.mean()])
+    t.sort('amount', ascending=True)[(t.sort('amount', ascending=True).amount) > (mean(t.sort('amount', ascending=True).amount))]
+    """
+    inputs = expr._inputs
+    if not inputs:
+        return expr
+    children = [push_predicates(i) for i in inputs]
+    if isinstance(expr, Selection):
+        child = children[0]
+        predicate = expr.predicate._subs({expr._child: child})
+        if not _elementwise(predicate, child):
+            return Selection(child, predicate)
+        return _select(child, conjuncts(predicate))
+    return expr._subs(dict(zip(inputs, children)))
+
+
+# Nodes whose value depends on all of the rows of their child
+_whole = (Reduction, Summary, By, Distinct, Head, Sort, TopK, Slice)
+
+
+def _elementwise(predicate, child):
+    """ Does ``predicate`` look at each row of ``child`` on its own?
+
+    Only such predicates may be split, moved below other operations or
+    rewritten onto a filtered ``child``.
+
+    >>> t = symbol('t', 'var * {name: string, amount: int}')
+    >>> _elementwise((t.amount > 0) & (t.name == 'Alice'), t)
+    True
+    >>> _elementwise(t.name == t.name.max(), t)
+    False
+    """
+    return not builtins.any(
+        isinstance(node, _whole) and not node.isidentical(child) and
+        builtins.any(sub.isidentical(child) for sub in node._subterms())
+        for node in predicate._subterms())
+
+
+def conjuncts(predicate):
+    """ Split a predicate on ``&``
+
+    >>> t = symbol('t', 'var * {x: int, y: int}')
+    >>> conjuncts((t.x > 0) & (t.y < 10) & (t.x < t.y))
+    [t.x > 0, t.y < 10, t.x < t.y]
+    """
+    if (isinstance(predicate, And) and
+            isinstance(predicate.lhs, Expr) and
+            isinstance(predicate.rhs, Expr) and
+            isboolean(predicate.lhs.dshape) and
+            isboolean(predicate.rhs.dshape)):
+        return conjuncts(predicate.lhs) + conjuncts(predicate.rhs)
+    return [predicate]
+
+
+# Relative per-row cost of nodes within a predicate
+_expensive_cost = 10
+
+
+def predicate_cost(predicate):
+    """ Rough relative cost of evaluating a predicate
+
+    String operations and user functions count for much more than numeric
+    arithmetic and comparisons.
+
+    >>> t = symbol('t', 'var * {name: string, amount: int}')
+    >>> predicate_cost(t.amount > 0) < predicate_cost(t.name == 'Alice')
+    True
+    """
+    return builtins.sum(_expensive_cost
+                        if isinstance(node, (Map, UnaryStringFunction))
+                        or isstring(node.dshape) else 1
+                        for node in predicate._subterms())
+
+
+def _select(child, predicates):
+    """ Select ``predicates`` from ``child``, pushing down where possible """
+    new_child, kept = _push_selection(child, predicates=predicates)
+    if new_child is not child:
+        kept = [p._subs({child: new_child}) for p in kept]
+    return _filter(new_child, kept)
+
+
+def _filter(child, predicates):
+    """ Apply predicates in one cheap selection then expensive ones singly """
+    cheap = [p for p in predicates if predicate_cost(p) < _expensive_cost]
+    expensive = sorted((p for p in predicates
+                        if predicate_cost(p) >= _expensive_cost),
+                       key=predicate_cost)
+    if cheap:
+        expensive.insert(0, reduce(operator.and_, cheap))
+
+    result = child
+    for predicate in expensive:
+        result = Selection(result, predicate._subs({child: result}))
+    return result
+
+
+def _fields_used(predicate, expr):
+    """ Fields of ``expr`` used by ``predicate``
+
+    Returns None if the predicate uses ``expr`` other than through its fields
+    """
+    if predicate.isidentical(expr):
+        return None
+    names = set()
+    for node in predicate._subterms():
+        if builtins.any(i.isidentical(expr) for i in node._inputs):
+            if not isinstance(node, Field):
+                return None
+            names.add(node._name)
+    return names
+
+
+def _selected(expr):
+    while isinstance(expr, Selection):
+        expr = expr._child
+    return expr
+
+
+@dispatch(Sort)
+def _push_selection(expr, predicates=()):
+    child = expr._child
+    child2 = _select(child, [p._subs({expr: child}) for p in predicates])
+    return expr._subs({child: child2}), []
+
+
+@dispatch(ReLabel)
+def _push_selection(expr, predicates=()):
+    reverse_labels = dict((v, k) for k, v in expr.labels)
+    fields = dict((Field(expr, name),
+                   Field(expr._child, reverse_labels.get(name, name)))
+                  for name in expr.fields)
+    return _push_fields(expr, fields, predicates)
+
+
+@dispatch(Merge)
+def _push_selection(expr, predicates=()):
+    # Filtering first would change values like t.amount - t.amount.mean()
+    if not _elementwise(expr, expr._child):
+        return expr, predicates
+    fields = dict((Field(expr, name), expr._get_field(name))
+                  for name in expr.fields)
+    return _push_fields(expr, fields, predicates)
+
+
+@dispatch(Projection)
+def _push_selection(expr, predicates=()):
+    fields = dict((Field(expr, name), Field(expr._child, name))
+                  for name in expr.fields)
+    new_expr, kept = _push_fields(expr, fields, predicates)
+
+    # Filtering below a projection only pays if the selection sinks further
+    if _selected(new_expr._child).isidentical(expr._child):
+        return expr, predicates
+    return new_expr, kept
+
+
+def _push_fields(expr, fields, predicates):
+    """ Push predicates that only use fields of ``expr`` into its child
+
+    ``fields`` maps each field of ``expr`` to the equivalent expression on
+    ``expr._child``.
+    """
+    pushed, kept = [], []
+    for p in predicates:
+        if _fields_used(p, expr) is None:
+            kept.append(p)
+            continue
+        new = p._subs(fields)
+        if _elementwise(new, expr._child):
+            pushed.append(new)
+        else:  # e.g. a Merge value that compares to a reduction
+            kept.append(p)
+    if not pushed:
+        return expr, kept
+    child = expr._child
+    return expr._subs({child: _select(child, pushed)}), kept
+
+
+@dispatch(Join)
+def _push_selection(expr, predicates=()):
+    """ Push predicates into the side of a join that holds their fields
+
+    Predicates on the preserved side of an outer join may move, those on the
+    nullable side may not.  Predicates on only the join columns of an inner
+    join filter both sides.
+    """
+    on_left, on_right = expr.on_left, expr.on_right
+    if not isinstance(on_left, list):
+        on_left, on_right = [on_left], [on_right]
+    keys = dict(zip(on_left, on_right))
+
+    left_other = [f for f in expr.lhs.fields if f not in on_left]
+    right_other = [f for f in expr.rhs.fields if f not in on_right]
+    overlap = set(left_other) & set(right_other)
+    left = dict((f + '_left' if f in overlap else f, f) for f in left_other)
+    right = dict((f + '_right' if f in overlap else f, f) for f in right_other)
+    left.update((k, k) for k in keys)
+    right.update(keys)
+
+    into_left = expr.how in ('inner', 'left')
+    into_right = expr.how in ('inner', 'right')
+
+    lhs, rhs, kept = [], [], []
+    for p in predicates:
+        names = _fields_used(p, expr)
+        if not names or not _elementwise(p, expr):
+            kept.append(p)
+            continue
+        pushed = False
+        if into_left and names.issubset(left):
+            lhs.append(p._subs(dict((Field(expr, n), Field(expr.lhs, left[n]))
+                                    for n in names)))
+            pushed = True
+        if into_right and names.issubset(right) and (
+                not pushed or names.issubset(keys)):
+            rhs.append(p._subs(dict((Field(expr, n), Field(expr.rhs, right[n]))
+                                    for n in names)))
+            pushed = True
+        if not pushed:
+            kept.append(p)
+
+    if not lhs and not rhs:
+        return expr, kept
+    return Join(_select(expr.lhs, lhs) if lhs else expr.lhs,
+                _select(expr.rhs, rhs) if rhs else expr.rhs,
+                expr._on_left, expr._on_right, expr.how), kept
+
+
+@dispatch(Expr)
+def _push_selection(expr, predicates=()):
+    """ Push selection predicates into an expression
+
+    Parameters
+    ----------
+
+    expr : Expression
+        The expression being selected from
+    predicates : list of Expressions
+        Boolean predicates on ``expr``
+
+    Returns
+    -------
+
+    expr : Expression
+        An equivalent expression with some predicates applied within it
+    predicates : list of Expressions
+        The predicates, still on the original ``expr``, that remain to be
+        applied
+    """
+    return expr, predicates
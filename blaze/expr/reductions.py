@@ -15,7 +15,8 @@ class Reduction(Expr):
 
     Blaze supports the same class of reductions as NumPy and Pandas.
 
-        sum, min, max, any, all, mean, var, std, count, nunique
+        sum, min, max, any, all, mean, var, std, count, nunique,
+        median, quantile
 
     Examples
     --------
@@ -176,9 +177,114 @@ class count(Reduction):
 
 
 class nunique(Reduction):
+    """ The number of distinct elements
+
+    Pass ``approx=True`` to estimate it from a HyperLogLog sketch.  Chunked
+    backends then keep one small fixed size sketch per chunk rather than
+    every distinct element.
+
+    >>> from blaze import symbol
+    >>> t = symbol('t', 'var * {name: string, amount: float64}')
+    >>> t.name.nunique(approx=True)
+    nunique(t.name, approx=True)
+    """
+    __slots__ = '_hash', '_child', 'approx', 'axis', 'keepdims'
+    schema = dshape(ct.int32)
+
+    def __init__(self, child, approx=False, *args, **kwargs):
+        self.approx = approx
+        super(nunique, self).__init__(child, *args, **kwargs)
+
+    def __str__(self):
+        s = super(nunique, self).__str__()
+        if not self.approx:
+            s = s.replace(', approx=False', '')
+        return s
+
+
+class hll(Reduction):
+    """ HyperLogLog sketch of the distinct elements of a collection
+
+    See Also
+    --------
+
+    blaze.hyperloglog.HyperLogLog
+    """
+    schema = dshape(ct.object_)
+
+
+class hll_union(Reduction):
+    """ Union of a collection of HyperLogLog sketches """
+    schema = dshape(ct.object_)
+
+
+class hll_count(Reduction):
+    """ Estimated number of distinct elements seen by a collection of
+    HyperLogLog sketches """
     schema = dshape(ct.int32)
 
 
+class quantile(Reduction):
+    """ The ``q`` th quantile, ``0 <= q <= 1``
+
+    Interpolates linearly between the nearest ranks like
+    ``numpy.percentile`` and ``pandas.Series.quantile``.  Chunked backends
+    estimate it from a t-digest sketch of each chunk so that one pass over
+    the data in bounded memory suffices.
+
+    >>> from blaze import symbol
+    >>> t = symbol('t', 'var * {name: string, amount: float64}')
+    >>> t.amount.quantile(0.99)
+    quantile(t.amount, q=0.99)
+    """
+    __slots__ = '_hash', '_child', 'q', 'axis', 'keepdims'
+    schema = dshape(ct.real)
+
+    def __init__(self, child, q=0.5, *args, **kwargs):
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1, got %s" % q)
+        self.q = q
+        super(quantile, self).__init__(child, *args, **kwargs)
+
+
+class median(Reduction):
+    """ The middle value, the 0.5 quantile
+
+    See Also
+    --------
+
+    quantile
+    """
+    schema = dshape(ct.real)
+
+
+class tdigest(Reduction):
+    """ t-digest sketch of the distribution of a collection
+
+    See Also
+    --------
+
+    blaze.tdigest.TDigest
+    """
+    schema = dshape(ct.object_)
+
+
+class tdigest_union(Reduction):
+    """ Union of a collection of t-digest sketches """
+    schema = dshape(ct.object_)
+
+
+class tdigest_quantile(Reduction):
+    """ Estimated ``q`` th quantile of everything seen by a collection of
+    t-digest sketches """
+    __slots__ = '_hash', '_child', 'q', 'axis', 'keepdims'
+    schema = dshape(ct.real)
+
+    def __init__(self, child, q=0.5, *args, **kwargs):
+        self.q = q
+        super(tdigest_quantile, self).__init__(child, *args, **kwargs)
+
+
 class nelements(Reduction):
     """Compute the number of elements in a collection, including missing values.
 
@@ -306,7 +412,8 @@ dshape_method_list.extend([
     (lambda ds: iscollection(ds) and isboolean(ds),
         set([any, all, sum])),
     (lambda ds: iscollection(ds) and isnumeric(ds),
-        set([mean, sum, mean, min, max, std, var, vnorm])),
+        set([mean, sum, mean, min, max, std, var, vnorm, median,
+             quantile])),
     ])
 
 method_properties.update([nrows])
@@ -30,11 +30,27 @@ We needed the following expressions
 
 This module performs this transformation for a wide array of chunkable
 expressions.  It supports elementwise operations, reductions,
-split-apply-combine, and selections.  It notably does not support sorting,
-joining, or slicing.
+split-apply-combine, selections and sorting.  It notably does not support
+joining or slicing.
+
+Approximate distinct counts, ``nunique(approx=True)``, split into a
+HyperLogLog sketch of each chunk and the union of those sketches.  Quantiles
+and medians split the same way into t-digest sketches, so chunked backends
+estimate them in one pass with bounded memory.
+
+Sorting splits into a sort of each chunk and a sort of the concatenated
+sorted runs.  Executors that can not hold the runs in memory should spill
+them to disk and merge them instead (see ``blaze.compute.chunks``).  The first
+few elements of a sort (top-k) split into a top-k of each chunk and a top-k of
+the concatenated winners.
 
 If explicit chunksizes are given it can also reason about the size and shape of
 the intermediate aggregate.  It can also do this in N-Dimensions.
+
+For streaming execution ``split_combine`` provides a third expression that
+folds a concatenation of intermediate results back down into a single
+intermediate result of the same form.  This lets an executor aggregate partial
+results as they arrive rather than holding all of them in memory at once.
 """
 from __future__ import absolute_import, division, print_function
 
@@ -55,10 +71,10 @@ from .table import *
 from ..dispatch import dispatch
 from ..compatibility import builtins
 
-good_to_split = (Reduction, Summary, By, Distinct)
+good_to_split = (Reduction, Summary, By, Distinct, TopK, Sort)
 can_split = good_to_split + (Like, Selection, ElemWise, Apply)
 
-__all__ = ['path_split', 'split']
+__all__ = ['path_split', 'split', 'split_combine']
 
 def path_split(leaf, expr):
     """ Find the right place in the expression tree/line to parallelize
@@ -70,10 +86,19 @@ def path_split(leaf, expr):
 
     >>> path_split(t, t.amount.distinct().sort())
     distinct(t.amount)
+
+    >>> path_split(t, t.sort('amount').head(5).name)
+    t.sort('amount', ascending=True).head(5)
+
+    >>> path_split(t, t[t.amount > 0].sort('amount').name)
+    t[t.amount > 0].sort('amount', ascending=True)
     """
     last = None
-    for node in list(path(expr, leaf))[:-1][::-1]:
-        if isinstance(node, good_to_split):
+    nodes = list(path(expr, leaf))[:-1][::-1]
+    for node, parent in zip(nodes, nodes[1:] + [None]):
+        if isinstance(node, Sort) and isinstance(parent, Head):
+            return parent
+        elif isinstance(node, good_to_split):
             return node
         elif not isinstance(node, can_split):
             return last
@@ -129,6 +154,33 @@ def split(leaf, expr, chunk=None, agg=None, **kwargs):
             (agg, expr._subs({center: agg})._subs({agg: agg_expr})))
 
 
+def split_combine(leaf, expr, agg):
+    """ Expression to fold several intermediate results into one
+
+    Given the ``aggregate`` symbol produced by ``split`` this returns an
+    expression that, evaluated on the concatenation of several intermediate
+    results, produces a single intermediate result with the same datashape
+    measure as the chunk expression.  Executors use this to combine partial
+    results incrementally instead of concatenating all of them before
+    evaluating the aggregate expression.
+
+    >>> t = symbol('t', 'var * {name: string, amount: int, id: int}')
+    >>> expr = t.id.count()
+    >>> (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+    >>> split_combine(t, expr, agg)
+    sum(aggregate, keepdims=True)
+
+    Elementwise expressions and selections do not reduce, the combined
+    intermediate is the concatenation itself
+
+    >>> (chunk, chunk_expr), (agg, agg_expr) = split(t, t.amount + 1)
+    >>> split_combine(t, t.amount + 1, agg)
+    aggregate
+    """
+    center = path_split(leaf, expr)
+    return _split_combine(center, leaf=leaf, agg=agg)
+
+
 reductions = {sum: (sum, sum), count: (count, sum),
               min: (min, min), max: (max, max),
               any: (any, any), all: (all, all),
@@ -153,6 +205,11 @@ def _split_agg(expr, leaf=None, agg=None):
     a, b = reductions[type(expr)]
     return b(agg, axis=expr.axis, keepdims=expr.keepdims)
 
+@dispatch(tuple(reductions))
+def _split_combine(expr, leaf=None, agg=None, keepdims=True):
+    a, b = reductions[type(expr)]
+    return b(agg, axis=expr.axis, keepdims=keepdims)
+
 
 @dispatch(mean)
 def _split_chunk(expr, leaf=None, chunk=None, keepdims=True):
@@ -167,6 +224,12 @@ def _split_agg(expr, leaf=None, agg=None):
 
     return total / count
 
+@dispatch(mean)
+def _split_combine(expr, leaf=None, agg=None, keepdims=True):
+    return summary(total=agg.total.sum(axis=expr.axis),
+                   count=agg.count.sum(axis=expr.axis),
+                   keepdims=keepdims, axis=expr.axis)
+
 @dispatch((std, var))
 def _split_chunk(expr, leaf=None, chunk=None, keepdims=True):
     child = expr._subs({leaf: chunk})._child
@@ -199,6 +262,13 @@ def _split_agg(expr, leaf=None, agg=None):
 
     return sqrt(result)
 
+@dispatch((std, var))
+def _split_combine(expr, leaf=None, agg=None, keepdims=True):
+    return summary(x=agg.x.sum(axis=expr.axis),
+                   x2=agg.x2.sum(axis=expr.axis),
+                   n=agg.n.sum(axis=expr.axis),
+                   keepdims=keepdims, axis=expr.axis)
+
 @dispatch(Distinct)
 def _split_chunk(expr, leaf=None, chunk=None, **kwargs):
     return expr._subs({leaf: chunk})
@@ -207,18 +277,42 @@ def _split_chunk(expr, leaf=None, chunk=None, **kwargs):
 def _split_agg(expr, leaf=None, agg=None):
     return agg.distinct()
 
+@dispatch((Distinct, nunique))
+def _split_combine(expr, leaf=None, agg=None, keepdims=True, **kwargs):
+    if isinstance(expr, nunique) and expr.approx:
+        return hll_union(agg, keepdims=keepdims)
+    return agg.distinct()
+
 
 @dispatch(nunique)
-def _split_chunk(expr, leaf=None, chunk=None, **kwargs):
+def _split_chunk(expr, leaf=None, chunk=None, keepdims=True, **kwargs):
+    if expr.approx:
+        return hll(expr._child._subs({leaf: chunk}), keepdims=keepdims)
     return (expr._child
                 ._subs({leaf: chunk})
                 .distinct())
 
 @dispatch(nunique)
 def _split_agg(expr, leaf=None, agg=None):
+    if expr.approx:
+        return hll_count(agg, keepdims=expr.keepdims)
     return agg.distinct().count(keepdims=expr.keepdims)
 
 
+@dispatch((quantile, median))
+def _split_chunk(expr, leaf=None, chunk=None, keepdims=True, **kwargs):
+    return tdigest(expr._child._subs({leaf: chunk}), keepdims=keepdims)
+
+@dispatch((quantile, median))
+def _split_agg(expr, leaf=None, agg=None):
+    return tdigest_quantile(agg, getattr(expr, 'q', 0.5),
+                            keepdims=expr.keepdims)
+
+@dispatch((quantile, median))
+def _split_combine(expr, leaf=None, agg=None, keepdims=True, **kwargs):
+    return tdigest_union(agg, keepdims=keepdims)
+
+
 @dispatch(Summary)
 def _split_chunk(expr, leaf=None, chunk=None, keepdims=True):
     exprs = [(name, split(leaf, val, chunk=chunk,
@@ -253,8 +347,44 @@ def _split_agg(expr, leaf=None, chunk=None, agg=None, keepdims=True):
     return summary(**d)
 
 
+@dispatch(Summary)
+def _split_combine(expr, leaf=None, agg=None, keepdims=True):
+    d = dict()
+    for name, val in zip(expr.fields, expr.values):
+        (_, _), (a, _) = split(leaf, val, keepdims=False)
+        e = _split_combine(path_split(leaf, val), leaf=leaf, agg=a,
+                           keepdims=False)
+        if isinstance(e, Summary):  # For reductions like mean/var
+            for n, v in zip(e.names, e.values):
+                d[name + '_' + n] = v._subs({a: agg, n: name + '_' + n})
+        else:
+            d[name] = e._subs({a: agg[name]})
+    return summary(keepdims=keepdims, **d)
+
+
+def _by_nunique(expr):
+    """ The argument of the only reduction of a By if that is a nunique
+
+    Per-group distinct counts split into the distinct (group, value) pairs of
+    each chunk rather than into a reduction per group.
+
+    >>> t = symbol('t', 'var * {name: string, amount: int, id: int}')
+    >>> _by_nunique(by(t.name, n=t.amount.nunique()))
+    t.amount
+    >>> _by_nunique(by(t.name, n=t.amount.nunique(), total=t.amount.sum()))
+    """
+    values = expr.apply.values
+    if (len(values) == 1 and isinstance(values[0], nunique) and
+            values[0]._child._name not in expr.grouper.fields):
+        return values[0]._child
+
+
 @dispatch(By)
 def _split_chunk(expr, leaf=None, chunk=None, **kwargs):
+    child = _by_nunique(expr)
+    if child is not None:
+        return merge(expr.grouper, child)._subs({leaf: chunk}).distinct()
+
     chunk_apply = _split_chunk(expr.apply, leaf=leaf, chunk=chunk, keepdims=False)
     chunk_grouper = expr.grouper._subs({leaf: chunk})
 
@@ -262,11 +392,15 @@ def _split_chunk(expr, leaf=None, chunk=None, **kwargs):
 
 @dispatch(By)
 def _split_agg(expr, leaf=None, agg=None):
-    agg_apply = _split_agg(expr.apply, leaf=leaf, agg=agg)
-    agg_grouper = expr.grouper._subs({leaf: agg})
-
     ngroup = len(expr.grouper.fields)
 
+    if _by_nunique(expr) is not None:
+        # Pairs repeat across chunks, so count them distinctly here too
+        agg_apply = summary(**{expr.apply.fields[0]:
+                               agg[agg.fields[ngroup]].nunique()})
+    else:
+        agg_apply = _split_agg(expr.apply, leaf=leaf, agg=agg)
+
     if isscalar(expr.grouper.dshape.measure):
         agg_grouper = agg[agg.fields[0]]
     else:
@@ -276,6 +410,22 @@ def _split_agg(expr, leaf=None, agg=None):
               .relabel(dict(zip(agg.fields[:ngroup],
                                 expr.fields[:ngroup]))))
 
+@dispatch(By)
+def _split_combine(expr, leaf=None, agg=None, **kwargs):
+    if _by_nunique(expr) is not None:
+        return agg.distinct()
+
+    combine_apply = _split_combine(expr.apply, leaf=leaf, agg=agg,
+                                   keepdims=False)
+    ngroup = len(expr.grouper.fields)
+
+    if isscalar(expr.grouper.dshape.measure):
+        agg_grouper = agg[agg.fields[0]]
+    else:
+        agg_grouper = agg[list(agg.fields[:ngroup])]
+
+    return by(agg_grouper, combine_apply)
+
 
 @dispatch((ElemWise, Like, Selection))
 def _split_chunk(expr, leaf=None, chunk=None, **kwargs):
@@ -285,6 +435,36 @@ def _split_chunk(expr, leaf=None, chunk=None, **kwargs):
 def _split_agg(expr, leaf=None, agg=None):
     return agg
 
+@dispatch((ElemWise, Like, Selection, Apply))
+def _split_combine(expr, leaf=None, agg=None, **kwargs):
+    return agg
+
+
+@dispatch((Sort, Head, TopK))
+def _split_chunk(expr, leaf=None, chunk=None, **kwargs):
+    return expr._subs({leaf: chunk})
+
+@dispatch(Sort)
+def _split_agg(expr, leaf=None, agg=None):
+    return expr._subs({expr._child: agg})
+
+@dispatch(Sort)
+def _split_combine(expr, leaf=None, agg=None, **kwargs):
+    return agg
+
+@dispatch(Head)
+def _split_agg(expr, leaf=None, agg=None):
+    sort = expr._child
+    return sort._subs({sort._child: agg}).head(expr.n)
+
+@dispatch(TopK)
+def _split_agg(expr, leaf=None, agg=None):
+    return expr._subs({expr._child: agg})
+
+@dispatch((Head, TopK))
+def _split_combine(expr, leaf=None, agg=None, **kwargs):
+    return _split_agg(expr, leaf=leaf, agg=agg)
+
 
 @dispatch(Apply)
 def _split_chunk(expr, leaf=None, chunk=None, **kwargs):
@@ -1,6 +1,7 @@
 from blaze.expr import *
 from blaze.expr.broadcast import *
 from blaze.expr.broadcast import leaves_of_type, broadcast_collect
+from blaze.expr.broadcast import fuse_broadcast_reductions
 from blaze.compatibility import builtins
 from toolz import isdistinct
 
@@ -113,3 +114,27 @@ def test_broadcast_naming():
 
     for expr in [t.x, t.x + 1]:
         assert broadcast(expr, [t])._name == 'x'
+
+
+def test_fuse_broadcast_reductions():
+    t = symbol('t', 'var * {x: int, y: int}')
+    expr = broadcast_collect((t.x * t.y + 1).sum())
+    fused = fuse_broadcast_reductions(expr)
+    assert isinstance(fused, BroadcastReduction)
+    assert fused._reduction.isidentical(expr)
+    assert fused._inputs == (t,)
+    assert fused.dshape == expr.dshape
+    assert fused._name == expr._name
+
+    # Partial reductions and reductions without a fused loop are left alone
+    for expr in [broadcast_collect((x + 1).sum(axis=0)),
+                 broadcast_collect((t.x + 1).var()),
+                 broadcast_collect((t.x + 1).nunique())]:
+        assert fuse_broadcast_reductions(expr).isidentical(expr)
+
+
+def test_path_through_broadcast():
+    t = symbol('t', 'var * {x: int, y: int}')
+    expr = broadcast_collect(t.x * 2 + 1).head(2)
+    assert [type(e).__name__ for e in path(expr, t)] == \
+            ['Head', 'Broadcast', 'Symbol']
@@ -63,3 +63,53 @@ def test_hash():
 def test_subs_on_datashape():
     assert subs(dshape('3 * {foo: int}'), {'foo': 'bar'}) == dshape('3 * {bar: int}')
 """
+
+
+def test_structurally_identical_nodes_are_interned():
+    from blaze.expr import symbol, summary
+
+    t = symbol('t', 'var * {x: int, y: int}')
+    assert (t.x + 1) is (t.x + 1)
+    assert t[t.x > 0].y.sum() is t[t.x > 0].y.sum()
+    assert (summary(a=t.x.sum(), b=t.y.max()) is
+            summary(a=t.x.sum(), b=t.y.max()))
+    assert ((t.x + 1) - 2)._subs({2: 3}).lhs is (t.x + 1)
+
+
+def test_interning_respects_argument_types():
+    from blaze.expr import symbol
+
+    t = symbol('t', 'var * {x: int, y: int}')
+    assert (t.x + 1) is not (t.x + 1.0)
+    assert (t.x + 1) is not (t.x + True)
+    assert (t.x + 1).dshape != (t.x + 1.0).dshape
+    assert (t.x + 0.0) is not (t.x + -0.0)
+    assert str(t.x * -0.0) == 't.x * -0.0'
+
+
+def test_unpickled_nodes_are_interned():
+    import pickle
+    from blaze.expr import symbol
+
+    t = symbol('t', 'var * {x: int, y: int}')
+    expr = t[t.x > 0].y.sum()
+    assert pickle.loads(pickle.dumps(expr)) is expr
+
+
+def test_interning_skips_incomparable_arguments():
+    from blaze.expr import symbol
+
+    class Incomparable(object):
+        def __call__(self, x):
+            return x
+
+        def __hash__(self):
+            return 1
+
+        def __eq__(self, other):
+            raise ValueError("ambiguous comparison")
+
+    t = symbol('t', 'var * {x: int, y: int}')
+    a = t.x.map(Incomparable(), 'int')
+    b = t.x.map(Incomparable(), 'int')
+    assert a is not b
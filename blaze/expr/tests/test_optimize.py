@@ -1,4 +1,5 @@
-from blaze.expr.optimize import lean_projection, _lean
+from blaze.expr.optimize import (lean_projection, _lean, push_predicates,
+                                 fuse_top_k, drop_sorts)
 from blaze.expr import *
 
 t = symbol('t', 'var * {x: int, y: int, z: int, w: int}')
@@ -98,3 +99,116 @@ def test_like():
 
     result = lean_projection(expr)
     assert result._child._child.isidentical(t[['name', 'y']])
+
+
+def test_push_predicates_below_sort():
+    s = t.sort('x')
+    expr = s[s.y > 0].z
+    assert push_predicates(expr).isidentical(t[t.y > 0].sort('x').z)
+
+
+def test_push_predicates_below_relabel():
+    r = t.relabel(x='X')
+    expr = r[(r.X > 0) & (r.y < 10)]
+    expected = t[(t.x > 0) & (t.y < 10)].relabel(x='X')
+    assert push_predicates(expr).isidentical(expected)
+
+
+def test_push_predicates_below_merge():
+    m = merge(t.x, a=t.y + 1)
+    expr = Selection(m, Field(m, 'a') > 0)
+    selected = t[(t.y + 1).label('a') > 0]
+    expected = merge(selected.x, a=selected.y + 1)
+    assert push_predicates(expr).isidentical(expected)
+
+
+def test_push_predicates_below_projection_only_when_it_sinks():
+    p = t[['x', 'y']]
+    expr = Selection(p, Field(p, 'x') > 0)
+    assert push_predicates(expr).isidentical(expr)
+
+    s = t.sort('z')
+    p = s[['x', 'y']]
+    expr = Selection(p, Field(p, 'x') > 0)
+    assert push_predicates(expr).isidentical(t[t.x > 0].sort('z')[['x', 'y']])
+
+
+def test_push_predicates_into_join():
+    a = symbol('a', 'var * {id: int, x: int, v: int}')
+    b = symbol('b', 'var * {id: int, y: int, v: int}')
+    j = join(a, b, 'id')
+    expr = j[(j.x > 0) & (j.y < 0) & (j.v_left > j.v_right)]
+    expected = join(a[a.x > 0], b[b.y < 0], 'id')
+    expected = expected[expected.v_left > expected.v_right]
+    assert push_predicates(expr).isidentical(expected)
+
+
+def test_push_join_key_predicate_into_both_sides_of_inner_join():
+    a = symbol('a', 'var * {id: int, x: int}')
+    b = symbol('b', 'var * {key: int, y: int}')
+    j = join(a, b, 'id', 'key')
+    result = push_predicates(j[j.id > 0])
+    assert result.isidentical(join(a[a.id > 0], b[b.key > 0], 'id', 'key'))
+
+
+def test_push_predicates_respects_outer_joins():
+    a = symbol('a', 'var * {id: int, x: int}')
+    b = symbol('b', 'var * {id: int, y: int}')
+    j = join(a, b, 'id', how='left')
+    expr = j[(j.x > 0) & (j.y > 0)]
+    expected = join(a[a.x > 0], b, 'id', how='left')
+    expected = expected[expected.y > 0]
+    assert push_predicates(expr).isidentical(expected)
+
+    j = join(a, b, 'id', how='outer')
+    expr = j[j.x > 0]
+    assert push_predicates(expr).isidentical(expr)
+
+
+def test_push_predicates_filters_cheap_parts_first():
+    s = symbol('s', 'var * {name: string, amount: int, id: int}')
+    expr = s[(s.name == 'Alice') & (s.amount > 0) & (s.id < 10)]
+    cheap = s[(s.amount > 0) & (s.id < 10)]
+    assert push_predicates(expr).isidentical(cheap[cheap.name == 'Alice'])
+
+
+def test_push_predicates_leaves_predicates_on_reductions():
+    expr = t[(t.x > 0) & (t.y == t.y.max())]
+    assert push_predicates(expr).isidentical(expr)
+
+    a = symbol('a', 'var * {id: int, x: int}')
+    b = symbol('b', 'var * {id: int, y: int}')
+    j = join(a, b, 'id')
+    expr = j[j.x > j.x.mean()]
+    assert push_predicates(expr).isidentical(expr)
+
+
+def test_push_predicates_not_below_merge_with_reductions():
+    m = transform(t, dev=t.x - t.x.mean())
+    for expr in [m[m.dev > 3], m[m.y > 3]]:
+        assert isinstance(expr, Selection) and expr._child.isidentical(m)
+        assert push_predicates(expr).isidentical(expr)
+
+
+def test_fuse_top_k():
+    expr = t[t.x > 0].sort('y', ascending=False).head(3).z
+    result = fuse_top_k(expr)
+    assert result.isidentical(TopK(t[t.x > 0], 'y', False, 3).z)
+    assert result.dshape == expr.dshape
+
+    assert fuse_top_k(t.sort('y')).isidentical(t.sort('y'))
+    assert fuse_top_k(t.head(3)).isidentical(t.head(3))
+
+
+def test_drop_sorts_under_reductions():
+    assert drop_sorts(t.sort('x').y.sum()).isidentical(t.y.sum())
+    s = t.sort('x')
+    assert drop_sorts(s[s.y > 0].z.distinct().count()).isidentical(
+            t[t.y > 0].z.distinct().count())
+    assert drop_sorts(summary(a=t.sort('x').y.max(),
+                              b=t.sort('x').z.min())).isidentical(
+            summary(a=t.y.max(), b=t.z.min()))
+
+    for expr in [t.sort('x').y, t.sort('x').head(3).y.sum(),
+                 by(t.sort('x').y, total=t.sort('x').z.sum())]:
+        assert drop_sorts(expr).isidentical(expr)
@@ -1,5 +1,7 @@
 from blaze.expr import *
 from blaze.expr.split import *
+from blaze.expr.reductions import hll, hll_union, hll_count
+from blaze.expr.reductions import tdigest, tdigest_union, tdigest_quantile
 from datashape import dshape
 from datashape.predicates import isscalar, isrecord, iscollection
 
@@ -220,6 +222,16 @@ def test_by_mean():
         avg=(agg.avg_total.sum() / agg.avg_count.sum())))
 
 
+def test_by_nunique():
+    expr = by(t.name, n=t.amount.nunique())
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+
+    assert chunk_expr.isidentical(merge(chunk.name, chunk.amount).distinct())
+    assert agg.fields == ['name', 'amount']
+    assert agg_expr.isidentical(by(agg.name, n=agg.amount.nunique()))
+    assert split_combine(t, expr, agg).isidentical(agg.distinct())
+
+
 def test_embarassing_rowwise():
     (chunk, chunk_expr), (agg, agg_expr) = split(t, t.amount + 1)
 
@@ -306,6 +318,44 @@ def test_reductions():
     assert agg_expr.isidentical(agg.distinct().count(keepdims=True))
 
 
+def test_approximate_nunique():
+    expr = t.amount.nunique(approx=True)
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+
+    assert chunk_expr.isidentical(hll(chunk.amount, keepdims=True))
+    assert agg_expr.isidentical(hll_count(agg))
+    assert split_combine(t, expr, agg).isidentical(
+            hll_union(agg, keepdims=True))
+
+    expr = summary(n=t.name.nunique(approx=True), total=t.amount.sum())
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+
+    assert chunk_expr.isidentical(summary(n=hll(chunk.name),
+                                          total=chunk.amount.sum(),
+                                          keepdims=True))
+    assert agg_expr.isidentical(summary(n=hll_count(agg.n),
+                                        total=agg.total.sum()))
+
+
+def test_quantile():
+    expr = t.amount.quantile(0.99)
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+
+    assert chunk_expr.isidentical(tdigest(chunk.amount, keepdims=True))
+    assert agg_expr.isidentical(tdigest_quantile(agg, 0.99))
+    assert split_combine(t, expr, agg).isidentical(
+            tdigest_union(agg, keepdims=True))
+
+    expr = summary(p50=t.amount.median(), total=t.amount.sum())
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+
+    assert chunk_expr.isidentical(summary(p50=tdigest(chunk.amount),
+                                          total=chunk.amount.sum(),
+                                          keepdims=True))
+    assert agg_expr.isidentical(summary(p50=tdigest_quantile(agg.p50, 0.5),
+                                        total=agg.total.sum()))
+
+
 def test_by_with_single_field_child():
     x = symbol('x', 'var * int')
     (chunk, chunk_expr), (agg, agg_expr) = split(x, by(x, total=x.sum()))
@@ -333,3 +383,79 @@ def test_splittable_apply():
             chunk.amount.apply(f, 'var * int', splittable=True))
 
     assert agg_expr.isidentical(agg)
+
+
+def test_split_combine_reductions():
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, t.amount.count())
+    assert split_combine(t, t.amount.count(), agg).isidentical(
+            agg.sum(keepdims=True))
+
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, t.amount.nunique())
+    assert split_combine(t, t.amount.nunique(), agg).isidentical(
+            agg.distinct())
+
+
+def test_split_combine_mean():
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, t.amount.mean())
+    combine = split_combine(t, t.amount.mean(), agg)
+
+    assert combine.isidentical(summary(total=agg.total.sum(),
+                                       count=agg.count.sum(),
+                                       keepdims=True))
+    assert combine.fields == chunk_expr.fields
+    # Summing int32 counts widens them
+    assert combine.dshape.measure == \
+            dshape('{count: int64, total: int64}').measure
+
+
+def test_split_combine_summary():
+    expr = summary(a=t.amount.count(), b=t.id.mean() + 1)
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+    combine = split_combine(t, expr, agg)
+
+    assert combine.isidentical(summary(a=agg.a.sum(),
+                                       b_total=agg.b_total.sum(),
+                                       b_count=agg.b_count.sum(),
+                                       keepdims=True))
+    assert combine.fields == chunk_expr.fields
+    assert combine.dshape.measure == \
+            dshape('{a: int64, b_count: int64, b_total: int64}').measure
+
+
+def test_split_combine_by():
+    expr = by(t.name, avg=t.amount.mean())
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+    combine = split_combine(t, expr, agg)
+
+    assert combine.isidentical(by(agg.name,
+                                  avg_count=agg.avg_count.sum(),
+                                  avg_total=agg.avg_total.sum()))
+    assert combine.fields == chunk_expr.fields
+    assert combine.dshape.measure == \
+            dshape('{name: string, avg_count: int64, avg_total: int64}').measure
+
+
+def test_split_sort():
+    expr = t[t.amount > 0].sort('amount').name
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+
+    assert chunk_expr.isidentical(chunk[chunk.amount > 0].sort('amount'))
+    assert agg_expr.isidentical(agg.sort('amount').name)
+    assert split_combine(t, expr, agg).isidentical(agg)
+
+
+def test_split_top_k():
+    expr = t[t.amount > 0].sort('amount', ascending=False).head(5).name
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, expr)
+
+    assert chunk_expr.isidentical(
+        chunk[chunk.amount > 0].sort('amount', ascending=False).head(5))
+    assert agg_expr.isidentical(
+        agg.sort('amount', ascending=False).head(5).name)
+    assert split_combine(t, expr, agg).isidentical(
+        agg.sort('amount', ascending=False).head(5))
+
+
+def test_split_combine_elemwise():
+    (chunk, chunk_expr), (agg, agg_expr) = split(t, t[t.amount > 0])
+    assert split_combine(t, t[t.amount > 0], agg).isidentical(agg)
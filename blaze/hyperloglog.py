@@ -0,0 +1,179 @@
+""" HyperLogLog sketches for approximate distinct counts
+
+A sketch estimates how many distinct elements it has seen in a small fixed
+amount of memory, ``2**precision`` bytes.  Sketches of different pieces of a
+dataset merge into the sketch of the whole, so chunked backends sketch each
+chunk and take the union of the results.
+
+>>> sketch = HyperLogLog().update(range(1000))
+>>> abs(sketch.count() - 1000) < 50
+True
+
+The relative standard error is about ``1.04 / sqrt(2**precision)``, 0.8% by
+default.  Elements hash the same way in every process, so sketches built in
+parallel workers merge correctly.
+"""
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import math
+
+import numpy as np
+
+from .compatibility import unicode
+
+__all__ = ['HyperLogLog']
+
+
+def mix(x):
+    """ Scramble an array of 64 bit words (the splitmix64 finalizer) """
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def hash_object(x):
+    if isinstance(x, unicode):
+        x = x.encode('utf-8')
+    elif not isinstance(x, bytes):
+        x = repr(x).encode('utf-8')
+    return int(hashlib.md5(x).hexdigest()[:16], 16)
+
+
+def hash_ints(values):
+    return mix(np.asarray(values, dtype='i8').view('u8'))
+
+
+def hash_floats(values):
+    """ Hashes of floats, integral ones hash like the equal integer
+
+    >>> hash_floats([5.0]).tolist() == hash_ints([5]).tolist()
+    True
+    """
+    values = np.asarray(values, dtype='f8')
+    values = values[~np.isnan(values)] + 0.0  # drop NaN, fold -0.0 into 0.0
+    integral = (np.floor(values) == values) & (np.abs(values) < 2.0 ** 63)
+    result = mix(values.view('u8'))
+    result[integral] = hash_ints(values[integral].astype('i8'))
+    return result
+
+
+def hash64(values):
+    """ Stable 64 bit hashes of the non-null elements of ``values``
+
+    Equal numbers hash equally whatever their type, as they compare equal in
+    Python and pandas.
+
+    >>> hash64([1, 2, None]).tolist() == hash64(np.array([1, 2])).tolist()
+    True
+    >>> hash64([1, 2.5]).tolist() == hash64(np.array([1.0, 2.5])).tolist()
+    True
+    """
+    values = np.asarray(values)
+    kind = values.dtype.kind
+    if kind in 'biu':
+        return hash_ints(values.ravel().astype('i8'))
+    if kind == 'f':
+        return hash_floats(values.ravel())
+    if kind in 'Mm':
+        values = values.ravel().view('i8')
+        return hash_ints(values[values != np.iinfo('i8').min])
+
+    ints, floats, others = [], [], []
+    for v in values.ravel().tolist():
+        if v is None:
+            continue
+        elif isinstance(v, float):
+            floats.append(v)
+        elif isinstance(v, int) and -2**63 <= v < 2**63:
+            ints.append(v)
+        elif isinstance(v, int) and v.bit_length() < 1024 and float(v) == v:
+            floats.append(v)
+        else:
+            others.append(hash_object(v))
+    return np.concatenate([hash_ints(ints), hash_floats(floats),
+                           np.array(others, dtype='u8')])
+
+
+class HyperLogLog(object):
+    """ Sketch of the distinct elements of a collection
+
+    Parameters
+    ----------
+
+    precision: int, optional
+        Number of index bits; the sketch keeps ``2**precision`` registers
+
+    >>> a = HyperLogLog().update(['Alice', 'Bob'])
+    >>> b = HyperLogLog().update(['Bob', 'Charlie'])
+    >>> a.union(b).count()
+    3
+    """
+    def __init__(self, precision=14, registers=None):
+        self.precision = precision
+        if registers is None:
+            registers = np.zeros(2 ** precision, dtype='u1')
+        self.registers = registers
+
+    def update(self, values):
+        """ Add elements to the sketch, returns the sketch """
+        h = hash64(values)
+        p = self.precision
+        index = (h >> np.uint64(64 - p)).astype('i8')
+        rest = h & np.uint64(2 ** (64 - p) - 1)
+        # ``rest`` has at most 50 bits so its float exponent is exact
+        rank = (64 - p + 1) - np.frexp(rest.astype('f8'))[1]
+        np.maximum.at(self.registers, index, rank.astype('u1'))
+        return self
+
+    def union(self, *others):
+        """ Sketch of everything seen by this sketch and ``others`` """
+        registers = self.registers.copy()
+        for other in others:
+            if other.precision != self.precision:
+                raise ValueError("Can not merge sketches of precision %d and "
+                                 "%d" % (self.precision, other.precision))
+            np.maximum(registers, other.registers, out=registers)
+        return HyperLogLog(self.precision, registers)
+
+    def count(self):
+        """ Estimated number of distinct elements """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        harmonic = np.power(2.0, -self.registers.astype('f8')).sum()
+        estimate = alpha * m * m / harmonic
+        if estimate <= 2.5 * m:
+            zeros = int((self.registers == 0).sum())
+            if zeros:
+                estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __eq__(self, other):
+        return (isinstance(other, HyperLogLog) and
+                self.precision == other.precision and
+                (self.registers == other.registers).all())
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'HyperLogLog(precision=%d, count=%d)' % (self.precision,
+                                                        self.count())
+
+
+def union(sketches):
+    """ Union of a sequence of sketches
+
+    >>> union([HyperLogLog().update([1]), HyperLogLog().update([2])]).count()
+    2
+    """
+    sketches = iter(sketches)
+    try:
+        first = next(sketches)
+    except StopIteration:
+        return HyperLogLog()
+    return first.union(*sketches)
@@ -8,12 +8,18 @@ except ImportError:
     pass
 
 
-from odo import resource
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from odo import resource, chunks
 from datashape import dshape
+from datashape.predicates import iscollection, isrecord
 
 from ..expr import Expr
 from ..dispatch import dispatch
 from .server import DEFAULT_PORT
+from . import serialization
 
 # These are a hack for testing
 # It's convenient to use requests for live production but use
@@ -44,6 +50,20 @@ def reason(response):
         return response.reason
 
 
+def mimetype(response):
+    if isinstance(response, flask.Response):
+        return response.mimetype
+    if isinstance(response, requests.Response):
+        return response.headers.get('Content-Type', '').split(';')[0]
+
+
+def iter_content(response):
+    if isinstance(response, flask.Response):
+        return response.iter_encoded()
+    if isinstance(response, requests.Response):
+        return response.iter_content(chunk_size=2 ** 16)
+
+
 class Client(object):
 
     """ Client for Blaze Server
@@ -55,6 +75,16 @@ class Client(object):
 
     url : str
         URL of a Blaze server
+    columnar : bool, optional
+        Ask for collections in the binary columnar encoding and receive them
+        as NumPy arrays and pandas DataFrames rather than as lists through
+        JSON.  Defaults to False.
+    stream : bool, optional
+        Receive collections as a stream of columnar batches.  Results are
+        ``Chunks`` of DataFrames or arrays that issue the query each time they
+        are iterated and decode each batch as it arrives.  Defaults to False.
+    batchsize : int, optional
+        Rows per streamed batch, defaults to the choice of the server
 
     Examples
     --------
@@ -69,13 +99,17 @@ class Client(object):
 
     blaze.server.server.Server
     """
-    __slots__ = 'url'
+    __slots__ = 'url', 'columnar', 'stream', 'batchsize'
 
-    def __init__(self, url, **kwargs):
+    def __init__(self, url, columnar=False, stream=False, batchsize=None,
+                 **kwargs):
         url = url.strip('/')
         if not url[:4] == 'http':
             url = 'http://' + url
         self.url = url
+        self.columnar = columnar
+        self.stream = stream
+        self.batchsize = batchsize
 
     @property
     def dshape(self):
@@ -99,18 +133,53 @@ def discover(c):
     return c.dshape
 
 
+def stream_batches(ec, tree):
+    """ Request a streamed result and yield its batches as they arrive """
+    query = {'expr': tree}
+    if ec.batchsize:
+        query['batchsize'] = ec.batchsize
+    r = requests.get('%s/compute.json' % ec.url,
+                     data=json.dumps(query),
+                     headers={'Content-Type': 'application/json',
+                              'Accept': serialization.stream_mimetype},
+                     stream=True)
+
+    if not ok(r):
+        raise ValueError("Bad response: %s" % reason(r))
+
+    try:
+        for ds, data in serialization.load_batches(iter_content(r)):
+            yield data
+    finally:
+        r.close()
+
+
 @dispatch(Expr, Client)
 def compute_down(expr, ec, **kwargs):
     from .server import to_tree
     tree = to_tree(expr)
 
+    if ec.stream and iscollection(expr.dshape):
+        container = pd.DataFrame if isrecord(expr.dshape.measure) else \
+                np.ndarray
+        return chunks(container)(partial(stream_batches, ec, tree))
+
+    headers = {'Content-Type': 'application/json'}
+    if ec.columnar:
+        headers['Accept'] = '%s, application/json;q=0.5' % \
+                serialization.mimetype
+
     r = requests.get('%s/compute.json' % ec.url,
                      data=json.dumps({'expr': tree}),
-                     headers={'Content-Type': 'application/json'})
+                     headers=headers)
 
     if not ok(r):
         raise ValueError("Bad response: %s" % reason(r))
 
+    if mimetype(r) == serialization.mimetype:
+        ds, data = serialization.loads(content(r))
+        return data
+
     data = json.loads(content(r).decode('utf-8'))
 
     return data['data']
@@ -124,4 +193,4 @@ def resource_blaze(uri, **kwargs):
     if ':' not in tld:
         tld = tld + ':%d' % DEFAULT_PORT
     uri = '/'.join([tld] + list(rest))
-    return Client(uri)
+    return Client(uri, **kwargs)
@@ -0,0 +1,230 @@
+""" Binary columnar encoding of computed results
+
+The server sends collections in this encoding to clients that ask for it with
+the ``Accept`` header, and JSON to everyone else.  Each column travels as the
+raw bytes of its NumPy buffer, so neither side converts values one by one.
+
+A payload is laid out as
+
+    magic    4 bytes, ``BLZC``
+    length   4 bytes, little endian length of the header
+    header   JSON, the datashape and the location of every column's buffers
+    buffers  column buffers, each starting on an 8 byte boundary
+
+Fixed width columns (numbers, booleans, datetimes) are a single buffer.
+Columns of text are one UTF-8 buffer of the concatenated strings and a buffer
+of ``int64`` offsets into the decoded text.  If some strings are missing (None
+or NaN) a third ``uint8`` buffer flags the valid ones.  Anything else is sent
+as a JSON list inside the header.
+
+Streamed results are a sequence of such payloads, one per batch of rows, each
+preceded by its length as a little endian ``uint64``.  A zero length marks
+the end of the stream so that clients can tell a complete stream from one cut
+short by a failure on the server.
+
+>>> import numpy as np
+>>> payload = dumps(np.array([1.5, 2.5]), '2 * float64')
+>>> ds, data = loads(payload)
+>>> ds
+dshape("2 * float64")
+>>> data
+array([ 1.5,  2.5])
+"""
+from __future__ import absolute_import, division, print_function
+
+import json
+import struct
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from datashape import dshape, var
+from datashape.predicates import isrecord
+
+from odo import into
+from ..compatibility import unicode
+from ..utils import json_dumps
+
+__all__ = ['mimetype', 'stream_mimetype', 'dumps', 'loads', 'dump_batches',
+           'load_batches']
+
+
+mimetype = 'application/vnd.blaze.columns'
+stream_mimetype = 'application/vnd.blaze.columns-stream'
+
+magic = b'BLZC'
+alignment = 8
+
+
+def columns(result, ds):
+    """ Names and arrays of the columns of a collection
+
+    >>> columns([(1, 'Alice'), (2, 'Bob')], 'var * {id: int64, name: string}')
+    [('id', array([1, 2])), ('name', array(['Alice', 'Bob'], dtype=object))]
+    """
+    ds = dshape(ds)
+    if isrecord(ds.measure):
+        df = into(pd.DataFrame, result, dshape=ds)
+        return [(name, df[name].values) for name in ds.measure.names]
+    return [(None, into(np.ndarray, result, dshape=ds))]
+
+
+def as_bytes(x):
+    """ Flat ``uint8`` view of the memory of contiguous array ``x`` """
+    return x.reshape(-1).view('u1')
+
+
+def ismissing(v):
+    return v is None or isinstance(v, float) and v != v
+
+
+def encode(x):
+    """ Header entry and byte buffers of one array """
+    if x.dtype.kind != 'O':
+        x = np.ascontiguousarray(x)
+        return ({'kind': 'buffer', 'dtype': x.dtype.str,
+                 'shape': list(x.shape)},
+                [as_bytes(x)])
+    if x.ndim == 1 and all(isinstance(v, unicode) or ismissing(v) for v in x):
+        valid = np.fromiter((isinstance(v, unicode) for v in x), dtype='?',
+                            count=len(x))
+        strings = x[valid]
+        lengths = np.zeros(len(x), dtype='i8')
+        lengths[valid] = np.fromiter(map(len, strings), dtype='i8',
+                                     count=len(strings))
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype('i8')
+        text = np.frombuffer(u''.join(strings).encode('utf-8'), dtype='u1')
+        buffers = [as_bytes(offsets), text]
+        if not valid.all():
+            buffers.append(as_bytes(valid.view('u1')))
+        return {'kind': 'utf8'}, buffers
+    return {'kind': 'json', 'values': x.tolist()}, []
+
+
+def dumps(result, ds):
+    """ Encode collection ``result`` of datashape ``ds`` """
+    entries, buffers = [], []
+    position = 0
+    for name, x in columns(result, ds):
+        entry, bufs = encode(x)
+        entry['name'] = name
+        entry['buffers'] = []
+        for buf in bufs:
+            entry['buffers'].append([position, buf.nbytes])
+            padding = -buf.nbytes % alignment
+            buffers.extend([buf, np.zeros(padding, dtype='u1')])
+            position += buf.nbytes + padding
+        entries.append(entry)
+
+    header = json.dumps({'datashape': str(ds), 'columns': entries},
+                        default=json_dumps).encode('utf-8')
+    header += b' ' * (-(len(header) + 8) % alignment)
+
+    out = BytesIO()
+    out.write(magic)
+    out.write(struct.pack('<I', len(header)))
+    out.write(header)
+    for buf in buffers:
+        out.write(buf)
+    return out.getvalue()
+
+
+def decode(entry, payload, start):
+    """ Array of one header entry, sharing memory with ``payload`` """
+    buffers = [(start + offset, nbytes)
+               for offset, nbytes in entry['buffers']]
+    if entry['kind'] == 'buffer':
+        dtype = np.dtype(str(entry['dtype']))
+        (offset, nbytes), = buffers
+        x = np.frombuffer(payload, dtype=dtype, count=nbytes // dtype.itemsize,
+                          offset=offset)
+        return x.reshape(entry['shape'])
+    if entry['kind'] == 'utf8':
+        (offset, nbytes), (text_offset, text_nbytes) = buffers[:2]
+        offsets = np.frombuffer(payload, dtype='i8', count=nbytes // 8,
+                                offset=offset)
+        text = payload[text_offset:text_offset + text_nbytes].decode('utf-8')
+        x = np.empty(len(offsets) - 1, dtype=object)
+        x[:] = [text[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+        if len(buffers) == 3:
+            (valid_offset, valid_nbytes), = buffers[2:]
+            valid = np.frombuffer(payload, dtype='?', count=valid_nbytes,
+                                  offset=valid_offset)
+            x[~valid] = None
+        return x
+    return np.array(entry['values'])
+
+
+def loads(payload):
+    """ Datashape and data of an encoded collection
+
+    Records decode into a DataFrame, everything else into a NumPy array.
+    Arrays of fixed width types are read-only views on ``payload``.  The
+    columns of a DataFrame are not: pandas copies them into its blocks.
+
+    >>> ds, df = loads(dumps([(1, 'Alice'), (2, 'Bob')],
+    ...                      'var * {id: int64, name: string}'))
+    >>> df
+       id   name
+    0   1  Alice
+    1   2    Bob
+    """
+    if payload[:4] != magic:
+        raise ValueError("Not a Blaze columnar payload")
+    length, = struct.unpack('<I', payload[4:8])
+    header = json.loads(payload[8:8 + length].decode('utf-8'))
+    start = 8 + length
+    ds = dshape(header['datashape'])
+    arrays = [(entry['name'], decode(entry, payload, start))
+              for entry in header['columns']]
+    if isrecord(ds.measure):
+        return ds, pd.DataFrame(dict(arrays),
+                                columns=[name for name, _ in arrays])
+    (_, x), = arrays
+    return ds, x
+
+
+def dump_batches(batches, ds):
+    """ Encode each batch of rows of a collection of datashape ``ds``
+
+    Yields one length prefixed payload per batch and then the end marker.
+
+    >>> frames = list(dump_batches([[1, 2], [3]], 'var * int64'))
+    >>> [ds for ds, data in load_batches(frames)]
+    [dshape("var * int64"), dshape("var * int64")]
+    """
+    ds = var * dshape(ds).subshape[0]
+    for batch in batches:
+        payload = dumps(batch, ds)
+        yield struct.pack('<Q', len(payload)) + payload
+    yield struct.pack('<Q', 0)
+
+
+def load_batches(chunks):
+    """ Decode a stream of batches arriving in arbitrary pieces of bytes
+
+    >>> stream = b''.join(dump_batches([[1, 2], [3]], 'var * int64'))
+    >>> [data.tolist() for ds, data in load_batches([stream[:20],
+    ...                                              stream[20:]])]
+    [[1, 2], [3]]
+    """
+    buf = bytearray()
+    chunks = iter(chunks)
+    while True:
+        while len(buf) < 8:
+            buf.extend(next_chunk(chunks))
+        length, = struct.unpack('<Q', bytes(buf[:8]))
+        if not length:
+            return
+        while len(buf) < 8 + length:
+            buf.extend(next_chunk(chunks))
+        payload = bytes(buf[8:8 + length])
+        del buf[:8 + length]
+        yield loads(payload)
+
+
+def next_chunk(chunks):
+    try:
+        return next(chunks)
+    except StopIteration:
+        raise IOError("Stream of batches ended early")
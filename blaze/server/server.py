@@ -9,7 +9,11 @@ except ImportError:
 import blaze
 import socket
 import json
-from toolz import assoc
+from collections import Iterator
+import numpy as np
+import pandas as pd
+from odo import Chunks
+from toolz import assoc, partition_all
 from functools import partial, wraps
 from blaze import into, compute
 from blaze.expr import utils as expr_utils
@@ -17,7 +21,10 @@ from blaze.compute import compute_up
 from datashape.predicates import iscollection, isscalar
 from ..interactive import InteractiveSymbol, coerce_scalar
 from ..utils import json_dumps
+from ..compatibility import _inttypes
 from ..expr import Expr, symbol
+from ..cached import Cache, CachedDataset
+from . import serialization
 
 from datashape import Mono, discover
 
@@ -28,6 +35,9 @@ __all__ = 'Server', 'to_tree', 'from_tree'
 # http://en.wikipedia.org/wiki/List_of_TCP_and_UDP_port_numbers
 DEFAULT_PORT = 6363
 
+# Rows per batch of streamed results unless the request asks otherwise
+DEFAULT_BATCHSIZE = 100000
+
 
 class Server(object):
 
@@ -40,6 +50,12 @@ class Server(object):
     data : ``dict`` or ``None``, optional
         A dictionary mapping dataset name to any data format that blaze
         understands.
+    cache : ``blaze.cached.Cache``, optional
+        Keep results to answer repeated queries without recomputing them.
+        Results are stored in memory, even those of lazy backends like SQL,
+        and are labeled with the datasets they use so that ``invalidate``
+        can drop them when those datasets change.  Hits and misses are
+        served at ``/cache.json``.  Give each server its own cache.
 
     Examples
     --------
@@ -53,19 +69,37 @@ class Server(object):
 
     >>> server = Server({'accounts': df})
     >>> server.run() # doctest: +SKIP
+
+    Cache up to a gigabyte of results
+
+    >>> server = Server({'accounts': df}, cache=Cache(nbytes=1e9))
+    >>> server.invalidate('accounts')  # after accounts changes
     """
-    __slots__ = 'app', 'data', 'port'
+    __slots__ = 'app', 'data', 'port', 'cache'
 
-    def __init__(self, data=None):
+    def __init__(self, data=None, cache=None):
         app = self.app = Flask('blaze.server.server')
         if data is None:
             data = dict()
         self.data = data
+        self.cache = cache
+
+        if cache is not None:
+            data = CachedDataset(data, cache=cache)
 
         for args, kwargs, func in routes:
-            func2 = wraps(func)(partial(func, self.data))
+            func2 = wraps(func)(partial(func, data))
             app.route(*args, **kwargs)(func2)
 
+    def invalidate(self, *names):
+        """ Forget cached results that use the named datasets, or all """
+        if self.cache is None:
+            return
+        if not names:
+            self.cache.clear()
+        for name in names:
+            self.cache.invalidate(name)
+
     def run(self, *args, **kwargs):
         """Run the server"""
         port = kwargs.pop('port', DEFAULT_PORT)
@@ -92,6 +126,14 @@ def dataset(data):
     return str(discover(data))
 
 
+@route('/cache.json')
+def cache_stats(data):
+    if not isinstance(data, CachedDataset) or \
+            not isinstance(data.cache, Cache):
+        return ("Server has no cache", 404)
+    return json.dumps(data.cache.stats)
+
+
 def to_tree(expr, names=None):
     """ Represent Blaze expression with core data structures
 
@@ -261,6 +303,37 @@ def from_tree(expr, namespace=None):
         return expr
 
 
+def batches(result, batchsize=DEFAULT_BATCHSIZE):
+    """ Lazily split a computed collection into batches of rows
+
+    Chunked results keep their own chunks.  Iterators, like the rows of a
+    database cursor, are only pulled as batches are consumed.
+
+    >>> list(batches(iter([1, 2, 3, 4, 5]), batchsize=2))
+    [[1, 2], [3, 4], [5]]
+    """
+    if not valid_batchsize(batchsize):
+        raise ValueError("batchsize must be a positive integer, got %r"
+                         % (batchsize,))
+    if isinstance(result, Chunks):
+        return iter(result)
+    if isinstance(result, (np.ndarray, pd.DataFrame, pd.Series)):
+        return (result[i:i + batchsize]
+                for i in range(0, len(result), batchsize))
+    return (list(part)
+            for part in partition_all(batchsize, into(Iterator, result)))
+
+
+def valid_batchsize(batchsize):
+    """ Whether clients may ask for batches of ``batchsize`` rows
+
+    >>> valid_batchsize(100), valid_batchsize(0), valid_batchsize('10')
+    (True, False, False)
+    """
+    return (isinstance(batchsize, _inttypes) and
+            not isinstance(batchsize, bool) and batchsize > 0)
+
+
 @route('/compute.json', methods=['POST', 'PUT', 'GET'])
 def compserver(dataset):
     if request.headers['content-type'] != 'application/json':
@@ -270,6 +343,11 @@ def compserver(dataset):
     except ValueError:
         return ("Bad JSON.  Got %s " % request.data, 404)
 
+    batchsize = payload.get('batchsize', DEFAULT_BATCHSIZE)
+    if not valid_batchsize(batchsize):
+        return ("batchsize must be a positive integer, got %s"
+                % json.dumps(batchsize), 400)
+
     ns = payload.get('namespace', dict())
     ns[':leaf'] = symbol('leaf', discover(dataset))
 
@@ -277,11 +355,29 @@ def compserver(dataset):
     assert len(expr._leaves()) == 1
     leaf = expr._leaves()[0]
 
+    # Whatever clients name the data, the same query is the same expression,
+    # and so the same key in the cache
+    if leaf.dshape == ns[':leaf'].dshape:
+        expr = expr._subs({leaf: ns[':leaf']})
+        leaf = ns[':leaf']
+
     try:
         result = compute(expr, {leaf: dataset})
     except Exception as e:
         return ("Computation failed with message:\n%s" % e, 500)
 
+    # Clients list the binary columnar encodings in ``Accept`` to receive them
+    best = request.accept_mimetypes.best_match(['application/json',
+                                                serialization.mimetype,
+                                                serialization.stream_mimetype])
+    if iscollection(expr.dshape) and best == serialization.mimetype:
+        return flask.Response(serialization.dumps(result, expr.dshape),
+                              mimetype=serialization.mimetype)
+    if iscollection(expr.dshape) and best == serialization.stream_mimetype:
+        parts = batches(result, batchsize)
+        return flask.Response(serialization.dump_batches(parts, expr.dshape),
+                              mimetype=serialization.stream_mimetype)
+
     if iscollection(expr.dshape):
         result = into(list, result)
     elif isscalar(expr.dshape):
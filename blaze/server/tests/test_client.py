@@ -3,7 +3,9 @@ from __future__ import absolute_import, division, print_function
 import pytest
 pytest.importorskip('flask')
 
+import pandas as pd
 from pandas import DataFrame
+from toolz import concat
 from blaze import compute, Data, by, into, discover
 from blaze.expr import Expr, symbol, Field
 from blaze.dispatch import dispatch
@@ -101,3 +103,45 @@ def test_custom_expressions():
 def test_client_dataset():
     d = Data('blaze://localhost::accounts')
     assert list(map(tuple, into(list, d))) == into(list, df)
+
+
+def test_columnar_client():
+    c = Client('localhost:6363', columnar=True)
+    t = symbol('t', discover(c))
+
+    result = compute(t.accounts, c)
+    assert isinstance(result, DataFrame)
+    assert into(list, result) == into(list, df)
+
+    assert list(compute(t.accounts.amount + 1, c)) == [101, 201]
+    assert compute(t.accounts.amount.sum(), c) == 300
+
+
+def test_columnar_resource():
+    c = resource('blaze://localhost:6363', columnar=True)
+    assert c.columnar
+
+
+class StreamingTestClient(object):
+    """ Flask test client that takes the ``stream`` keyword of requests """
+    def get(self, *args, **kwargs):
+        kwargs.pop('stream', None)
+        return test.get(*args, **kwargs)
+
+
+def test_streaming_client():
+    client.requests = StreamingTestClient()
+    try:
+        c = Client('localhost:6363', stream=True, batchsize=1)
+        t = symbol('t', discover(c))
+
+        result = compute(t.accounts, c)
+        parts = list(result)
+        assert len(parts) == 2
+        assert all(isinstance(part, DataFrame) for part in parts)
+        assert into(list, pd.concat(parts)) == into(list, df)
+
+        assert list(concat(compute(t.accounts.amount * 2, c))) == [200, 400]
+        assert compute(t.accounts.amount.sum(), c) == 300
+    finally:
+        client.requests = test
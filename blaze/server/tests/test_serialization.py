@@ -0,0 +1,52 @@
+from __future__ import absolute_import, division, print_function
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from blaze.server.serialization import dumps, loads
+
+
+def test_records():
+    df = pd.DataFrame({'name': ['Alice', u'B\xf6b', ''],
+                       'amount': [100.0, np.nan, -1.5],
+                       'when': [datetime(2000, 1, 1)] * 3},
+                      columns=['name', 'amount', 'when'])
+    ds = 'var * {name: string, amount: ?float64, when: datetime}'
+
+    result_ds, result = loads(dumps(df, ds))
+    assert str(result_ds) == ds
+    assert list(result.columns) == ['name', 'amount', 'when']
+    assert list(result.name) == list(df.name)
+    np.testing.assert_array_equal(result.amount, df.amount)
+    assert list(result.when) == list(df.when)
+
+
+def test_arrays():
+    x = np.arange(12, dtype='i4').reshape(3, 4)
+    ds, result = loads(dumps(x, '3 * 4 * int32'))
+    assert result.dtype == x.dtype
+    assert (result == x).all()
+
+    ds, result = loads(dumps(np.array([], dtype='f8'), '0 * float64'))
+    assert len(result) == 0
+
+
+def test_mixed_objects_fall_back_to_json():
+    x = np.array([1, None, 'a'], dtype=object)
+    ds, result = loads(dumps(x, 'var * ?string'))
+    assert list(result) == [1, None, 'a']
+
+
+def test_missing_strings():
+    x = np.array([u'Alice', None, u'B\xf6b', np.nan], dtype=object)
+    payload = dumps(x, 'var * ?string')
+    assert b'"json"' not in payload
+    ds, result = loads(payload)
+    assert list(result) == [u'Alice', None, u'B\xf6b', None]
+
+
+def test_buffers_are_aligned():
+    payload = dumps(np.arange(3, dtype='i1'), '3 * int8')
+    assert len(payload) % 8 == 0
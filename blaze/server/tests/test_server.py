@@ -13,7 +13,9 @@ from toolz import pipe
 from odo import odo
 from blaze.utils import example
 from blaze import discover, symbol, by, CSV, compute, join, into, resource
-from blaze.server.server import Server, to_tree, from_tree
+from blaze.server.server import Server, to_tree, from_tree, batches
+from blaze.server import serialization
+from blaze.cached import Cache
 
 
 accounts = DataFrame([['Alice', 100], ['Bob', 200]],
@@ -123,6 +125,90 @@ def test_compute():
     assert json.loads(response.data.decode('utf-8'))['data'] == expected
 
 
+def test_compute_columnar():
+    query = {'expr': to_tree(t.events)}
+    accept = '%s, application/json;q=0.5' % serialization.mimetype
+
+    response = test.post('/compute.json',
+                         data=json.dumps(query),
+                         content_type='application/json',
+                         headers={'Accept': accept})
+
+    assert 'OK' in response.status
+    assert response.mimetype == serialization.mimetype
+    ds, result = serialization.loads(response.data)
+    assert ds == discover(events)
+    assert list(result.columns) == ['value', 'when']
+    assert list(result.when) == list(events.when)
+
+    # Scalars and clients that do not ask for columns get JSON
+    for expr, headers in [(t.accounts.amount.sum(), {'Accept': accept}),
+                          (t.events, {})]:
+        response = test.post('/compute.json',
+                             data=json.dumps({'expr': to_tree(expr)}),
+                             content_type='application/json',
+                             headers=headers)
+        assert response.mimetype != serialization.mimetype
+        json.loads(response.data.decode('utf-8'))
+
+
+def test_compute_streamed():
+    query = {'expr': to_tree(t.accounts), 'batchsize': 1}
+
+    response = test.post('/compute.json',
+                         data=json.dumps(query),
+                         content_type='application/json',
+                         headers={'Accept': serialization.stream_mimetype})
+
+    assert 'OK' in response.status
+    assert response.mimetype == serialization.stream_mimetype
+    parts = [data for ds, data in
+             serialization.load_batches(response.iter_encoded())]
+    assert [list(part.name) for part in parts] == [['Alice'], ['Bob']]
+
+
+def test_compute_rejects_bad_batchsize():
+    for batchsize in [0, -1, 1.5, '10', None]:
+        query = {'expr': to_tree(t.accounts), 'batchsize': batchsize}
+        response = test.post('/compute.json',
+                             data=json.dumps(query),
+                             content_type='application/json',
+                             headers={'Accept': serialization.stream_mimetype})
+        assert response.status_code == 400
+
+
+def test_batches():
+    assert [list(b) for b in batches(np.arange(5), 2)] == [[0, 1], [2, 3], [4]]
+    assert len(list(batches(accounts, 1))) == 2
+    assert list(batches([(1, 'a'), (2, 'b')], 10)) == [[(1, 'a'), (2, 'b')]]
+
+
+def test_cached_server():
+    cached = Server(data, cache=Cache(nbytes=1e6))
+    client = cached.app.test_client()
+
+    def total(symbol_name):
+        s = symbol(symbol_name, discover(data))
+        query = {'expr': to_tree(s.accounts.amount.sum())}
+        response = client.post('/compute.json', data=json.dumps(query),
+                               content_type='application/json')
+        return json.loads(response.data.decode('utf-8'))['data']
+
+    assert total('t') == 300
+    assert total('other') == 300  # same query under another name
+    stats = json.loads(client.get('/cache.json').data.decode('utf-8'))
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+    cached.invalidate('cities')
+    assert total('t') == 300
+    cached.invalidate('accounts')
+    assert total('t') == 300
+    stats = json.loads(client.get('/cache.json').data.decode('utf-8'))
+    assert (stats['hits'], stats['misses']) == (2, 2)
+
+    assert 'OK' not in test.get('/cache.json').status
+
+
 def test_get_datetimes():
     expr = t.events
     query = {'expr': to_tree(expr)}
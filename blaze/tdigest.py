@@ -0,0 +1,127 @@
+""" t-digest sketches for approximate quantiles
+
+A sketch summarizes a collection of numbers with a few hundred weighted
+centroids.  Centroids are small near the tails and large near the median so
+that extreme quantiles like p99 stay accurate.  Sketches of different pieces
+of a dataset merge into a sketch of the whole, so chunked backends sketch each
+chunk and take the union of the results.
+
+>>> sketch = TDigest().update(range(1001))
+>>> abs(sketch.quantile(0.99) - 990) < 5
+True
+
+While every centroid holds a single point the estimates are exact and match
+``numpy.percentile``.
+
+>>> TDigest().update([1, 2, 3, 4]).quantile(0.5)
+2.5
+"""
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+__all__ = ['TDigest']
+
+
+def compress(means, weights, compression):
+    """ Merge sorted centroids into at most ``compression + 1`` centroids
+
+    Each centroid covers at most one unit of the scale function
+    ``k(q) = compression * (arcsin(2q - 1) / pi + 1/2)`` which is steep near
+    ``q = 0`` and ``q = 1`` and flat in the middle.
+    """
+    order = np.argsort(means, kind='mergesort')
+    means, weights = means[order], weights[order]
+    cumulative = np.cumsum(weights)
+    middle = (cumulative - weights / 2) / cumulative[-1]
+    k = np.floor(compression * (np.arcsin(2 * middle - 1) / np.pi + 0.5))
+    starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+    total = np.add.reduceat(weights, starts)
+    return np.add.reduceat(weights * means, starts) / total, total
+
+
+class TDigest(object):
+    """ Sketch of the distribution of a collection of numbers
+
+    Parameters
+    ----------
+
+    compression: int, optional
+        Bound on the number of centroids; larger is more accurate
+
+    >>> a = TDigest().update([1, 2, 3])
+    >>> b = TDigest().update([4, 5])
+    >>> a.union(b).quantile(0.5)
+    3.0
+    """
+    def __init__(self, compression=200, means=None, weights=None,
+                 min=np.inf, max=-np.inf):
+        self.compression = compression
+        self.means = np.empty(0) if means is None else means
+        self.weights = np.empty(0) if weights is None else weights
+        self.min = min
+        self.max = max
+
+    @property
+    def count(self):
+        """ Number of values seen """
+        return int(self.weights.sum())
+
+    def update(self, values):
+        """ Add values to the sketch, returns the sketch """
+        values = np.asarray(values, dtype='f8').ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.means, self.weights = compress(
+                np.concatenate([self.means, values]),
+                np.concatenate([self.weights, np.ones(len(values))]),
+                self.compression)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        return self
+
+    def union(self, *others):
+        """ Sketch of everything seen by this sketch and ``others`` """
+        sketches = [s for s in (self,) + others if len(s.weights)]
+        if not sketches:
+            return TDigest(self.compression)
+        means, weights = compress(
+                np.concatenate([s.means for s in sketches]),
+                np.concatenate([s.weights for s in sketches]),
+                self.compression)
+        return TDigest(self.compression, means, weights,
+                       min(s.min for s in sketches),
+                       max(s.max for s in sketches))
+
+    def quantile(self, q):
+        """ Estimated ``q`` th quantile, ``0 <= q <= 1``
+
+        Interpolates linearly between the centers of neighboring centroids
+        as ``numpy.percentile`` interpolates between neighboring values.
+        """
+        if not len(self.weights):
+            return np.nan
+        cumulative = np.cumsum(self.weights)
+        centers = cumulative - (self.weights + 1) / 2
+        position = np.r_[0, centers, cumulative[-1] - 1]
+        value = np.r_[self.min, self.means, self.max]
+        return float(np.interp(q * (cumulative[-1] - 1), position, value))
+
+    def __repr__(self):
+        return 'TDigest(compression=%d, count=%d)' % (self.compression,
+                                                      self.count)
+
+
+def union(sketches):
+    """ Union of a sequence of sketches
+
+    >>> union([TDigest().update([1]), TDigest().update([3])]).quantile(0.5)
+    2.0
+    """
+    sketches = iter(sketches)
+    try:
+        first = next(sketches)
+    except StopIteration:
+        return TDigest()
+    return first.union(*sketches)
@@ -1,5 +1,13 @@
-from blaze.cached import CachedDataset
-from blaze import symbol, discover, compute, into
+import gc
+import os
+import shutil
+import tempfile
+import weakref
+import pytest
+
+from blaze.cached import CachedDataset, Cache
+from blaze import symbol, discover, compute, into, by
+import numpy as np
 import pandas as pd
 from collections import Iterator
 
@@ -38,3 +46,199 @@ def test_streaming():
 
     assert not isinstance(d.cache[expr], Iterator)
     assert into(list, d.cache[expr]) == [2, 2]
+
+
+def test_lazy_results_too_big_to_cache_stay_lazy():
+    seq = [{'name': 'Alice', 'x': i} for i in range(5000)]
+    cache = Cache(nbytes=1000)
+    d = CachedDataset({'t': seq}, cache=cache)
+    s = symbol('s', discover(d))
+
+    result = compute(s.t.x * 2, d)
+    assert isinstance(result, Iterator)
+    assert list(result) == [2 * i for i in range(5000)]
+    assert len(cache) == 0
+
+
+def test_cache_evicts_least_recently_used():
+    c = Cache(nbytes=200)
+    c['a'] = np.zeros(10)
+    c['b'] = np.zeros(10)
+    c['a']
+    c['c'] = np.zeros(10)
+    assert sorted(c) == ['a', 'c']
+    assert c.stats['evictions'] == 1
+    assert c.stats['nbytes'] == 160
+
+    c['d'] = np.zeros(100)  # larger than the whole budget
+    assert 'd' not in c
+
+
+def test_cache_expires():
+    c = Cache(ttl=-1)
+    c['a'] = 1
+    assert 'a' not in c
+    assert c.stats['misses'] == 0
+
+
+def test_cached_dataset_with_cache():
+    ns = {'t': df, 'x': 10}
+    cache = Cache(nbytes=1e6)
+    d = CachedDataset(ns, cache=cache)
+    s = symbol('s', discover(d))
+
+    expr = s.t.amount.sum() + s.x
+    assert compute(expr, d) == 360
+    assert compute(expr, d) == 360
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 1
+
+    cache.invalidate('t')
+    assert expr not in cache
+
+    assert into(list, compute(s.t.amount + 1, d)) == [101, 201, 51]
+    cache.invalidate('x')
+    assert s.t.amount + 1 in cache
+
+
+def test_cache_policies():
+    c = Cache(nbytes=200, policy='lfu')
+    c['a'] = np.zeros(10)
+    c['b'] = np.zeros(10)
+    c['a'], c['a'], c['b']
+    c['c'] = np.zeros(10)
+    assert sorted(c) == ['a', 'c']
+
+    c = Cache(nbytes=200, policy='cost')
+    c.put('a', np.zeros(10), cost=5.0)
+    c.put('b', np.zeros(10), cost=1.0)
+    c.put('c', np.zeros(10), cost=2.0)
+    assert sorted(c) == ['a', 'c']
+
+    c = Cache(nbytes=150, policy=lambda entry: -entry.nbytes)
+    c['a'] = np.zeros(10)
+    c['b'] = np.zeros(5)
+    c['c'] = np.zeros(10)
+    assert sorted(c) == ['b', 'c']
+
+    for policy in ['LRU', 'fifo', None]:
+        with pytest.raises(ValueError):
+            Cache(policy=policy)
+
+
+def test_cache_spills_to_disk():
+    dirname = tempfile.mkdtemp()
+    try:
+        c = Cache(nbytes=200, spill=dirname)
+        assert os.listdir(dirname) == [os.path.basename(c.spill)]
+        c['a'] = np.arange(10.0)
+        c['b'] = df
+        c['c'] = np.ones(10)
+        assert c.stats['spilled'] >= 1
+        assert len(os.listdir(c.spill)) == c.stats['spilled']
+
+        assert c['a'].tolist() == list(range(10))
+        assert into(list, c['b']) == into(list, df)
+        assert c.stats['loads'] >= 1
+        assert c.stats['nbytes'] <= 200
+
+        c.clear()
+        assert not os.listdir(c.spill)
+
+        c['a'] = np.arange(10.0)
+        c['b'] = df
+        del c
+        gc.collect()
+        if hasattr(weakref, 'finalize'):
+            assert not os.listdir(dirname)
+    finally:
+        shutil.rmtree(dirname)
+
+
+def test_cached_dataset_is_bounded_by_default():
+    d = CachedDataset({'t': df})
+    assert isinstance(d.cache, Cache)
+    assert d.cache.available_bytes > 0
+
+    d = CachedDataset({'t': df}, nbytes=1, policy='lfu')
+    s = symbol('s', discover(d))
+    assert into(list, compute(s.t.amount + 1, d)) == [101, 201, 51]
+    assert len(d.cache) == 0
+
+
+def test_reuse_cached_subterms():
+    cache = Cache()
+    d = CachedDataset({'t': df}, cache=cache)
+    s = symbol('s', discover(d))
+
+    positive = s.t[s.t.amount > 60]
+    assert into(list, compute(positive, d)) == [('Alice', 100, 1),
+                                                ('Bob', 200, 2)]
+    assert compute(positive.amount.sum(), d) == 300
+    assert cache.stats['hits'] == 1
+
+    # Reuse in one branch, compute from the data in another
+    assert compute(positive.id.max() + s.t.id.count(), d) == 5
+    assert cache.stats['hits'] == 2
+
+
+def test_roll_up_cached_groupings():
+    data = pd.DataFrame([['Alice', 'NYC', 100],
+                         ['Alice', 'LA', 50],
+                         ['Bob', 'NYC', 200],
+                         ['Alice', 'NYC', 25]],
+                        columns=['name', 'city', 'amount'])
+    cache = Cache()
+    d = CachedDataset({'t': data}, cache=cache)
+    s = symbol('s', discover(d))
+    t = s.t
+
+    fine = by(t[['name', 'city']], total=t.amount.sum(), n=t.amount.count(),
+              top=t.amount.max())
+    compute(fine, d)
+    assert cache.stats['hits'] == 0
+
+    coarse = by(t.name, total=t.amount.sum(), n=t.amount.count())
+    assert sorted(into(list, compute(coarse, d))) == [('Alice', 3, 175),
+                                                      ('Bob', 1, 200)]
+    assert cache.stats['hits'] == 1
+
+    # Means do not follow from the means of subgroups
+    coarse = by(t.name, avg=t.amount.mean())
+    assert sorted(into(list, compute(coarse, d))) == [('Alice', 175 / 3.0),
+                                                      ('Bob', 200.0)]
+    assert cache.stats['hits'] == 1
+
+
+def test_do_not_roll_up_over_missing_keys():
+    data = pd.DataFrame([['Alice', 'NYC', 100],
+                         ['Alice', None, 50],
+                         ['Bob', 'NYC', 200]],
+                        columns=['name', 'city', 'amount'])
+    cache = Cache()
+    d = CachedDataset({'t': data}, cache=cache)
+    s = symbol('s', discover(d))
+    t = s.t
+
+    compute(by(t[['name', 'city']], total=t.amount.sum()), d)
+    coarse = by(t.name, total=t.amount.sum())
+    assert sorted(into(list, compute(coarse, d))) == [('Alice', 150),
+                                                      ('Bob', 200)]
+    assert cache.stats['hits'] == 0
+
+
+def test_do_not_roll_up_over_nan_keys():
+    data = pd.DataFrame([['Alice', 1.0, 100],
+                         ['Alice', np.nan, 50],
+                         ['Bob', 1.0, 200]],
+                        columns=['name', 'rate', 'amount'])
+    cache = Cache()
+    d = CachedDataset({'t': data}, cache=cache)
+    s = symbol('s', discover(d))
+    t = s.t
+
+    compute(by(t[['name', 'rate']], total=t.amount.sum()), d)
+    coarse = by(t.name, total=t.amount.sum())
+    assert sorted(into(list, compute(coarse, d))) == [('Alice', 150),
+                                                      ('Bob', 200)]
+    assert cache.stats['hits'] == 0
@@ -0,0 +1,43 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from blaze.hyperloglog import HyperLogLog, hash64, union
+
+
+def test_hyperloglog_accuracy():
+    for n in [10, 1000, 100000]:
+        estimate = HyperLogLog().update(np.arange(n)).count()
+        assert abs(estimate - n) <= max(1, 0.03 * n)
+
+
+def test_hyperloglog_union_matches_whole():
+    x = np.random.RandomState(0).randint(0, 50000, size=200000)
+    parts = np.array_split(x, 7)
+    whole = HyperLogLog().update(x)
+    assert union(HyperLogLog().update(part) for part in parts) == whole
+
+
+def test_hash64_is_stable_across_containers():
+    assert hash64([1, 2]).tolist() == hash64(np.array([1, 2])).tolist()
+    assert hash64(['a', u'b']).tolist() == \
+            hash64(pd.Series(['a', 'b']).values).tolist()
+    assert len(hash64([1.0, np.nan, None])) == 1
+    assert hash64([0.0]).tolist() == hash64([-0.0]).tolist()
+
+
+def test_hyperloglog_equal_ints_and_floats():
+    assert hash64([5]).tolist() == hash64([5.0]).tolist()
+    assert hash64(np.array([5, 2**70], dtype=object)).tolist() == \
+            hash64(np.array([5.0, 2.0**70])).tolist()
+    ints = HyperLogLog().update(np.array([1, 2, 3]))
+    floats = HyperLogLog().update(np.array([1.0, 2.0, 3.5]))
+    assert ints.union(floats).count() == 4
+    assert HyperLogLog().update([1, 2.0, 3.5]).count() == 3
+
+
+def test_hyperloglog_strings_and_pickle():
+    sketch = HyperLogLog().update(['Alice', 'Bob', 'Alice', None])
+    assert sketch.count() == 2
+    assert pickle.loads(pickle.dumps(sketch)) == sketch
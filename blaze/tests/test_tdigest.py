@@ -0,0 +1,38 @@
+import pickle
+
+import numpy as np
+
+from blaze.tdigest import TDigest, union
+
+
+def test_tdigest_accuracy():
+    x = np.random.RandomState(0).lognormal(size=200000)
+    sketch = TDigest().update(x)
+    for q in [0.001, 0.01, 0.5, 0.9, 0.99, 0.999]:
+        assert abs((x < sketch.quantile(q)).mean() - q) < 0.002
+    assert sketch.quantile(0) == x.min()
+    assert sketch.quantile(1) == x.max()
+    assert len(sketch.means) <= sketch.compression + 1
+
+
+def test_tdigest_union_matches_whole():
+    x = np.random.RandomState(1).randn(100000)
+    parts = np.array_split(x, 9)
+    merged = union(TDigest().update(part) for part in parts)
+    assert merged.count == len(x)
+    for q in [0.05, 0.5, 0.95]:
+        assert abs((x < merged.quantile(q)).mean() - q) < 0.002
+
+
+def test_tdigest_small_data_is_exact():
+    x = [5, 1, 4, 2, 3, np.nan]
+    sketch = TDigest().update(x)
+    for q in [0, 0.1, 0.25, 0.5, 0.9, 1]:
+        assert sketch.quantile(q) == np.percentile([1, 2, 3, 4, 5], q * 100)
+    assert np.isnan(TDigest().quantile(0.5))
+
+
+def test_tdigest_pickle():
+    sketch = TDigest().update(range(1000))
+    assert pickle.loads(pickle.dumps(sketch)).quantile(0.5) == \
+            sketch.quantile(0.5)
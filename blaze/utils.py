@@ -1,6 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
 import os
+import sys
 import datetime
 from functools import wraps
 
@@ -14,6 +15,7 @@ from odo.utils import tmpfile, filetext, filetexts, raises, keywords, ignoring
 
 import psutil
 import numpy as np
+import pandas as pd
 
 # Imports that replace older utils.
 from .compatibility import map, zip
@@ -135,6 +137,27 @@ def available_memory():
     return psutil.virtual_memory().available
 
 
+def nbytes(x):
+    """ Approximate number of bytes held by an in-memory result
+
+    >>> nbytes(np.zeros(10))
+    80
+    """
+    if isinstance(x, np.ndarray):
+        return x.nbytes
+    if isinstance(x, (pd.DataFrame, pd.Series)):
+        try:
+            return int(np.sum(x.memory_usage(index=True, deep=True)))
+        except (AttributeError, TypeError):  # older pandas
+            if isinstance(x, pd.Series):
+                return x.values.nbytes + x.index.nbytes
+            return (sum(x[c].values.nbytes for c in x.columns) +
+                    x.index.nbytes)
+    if isinstance(x, (list, tuple)):
+        return sys.getsizeof(x) + sum(map(sys.getsizeof, x))
+    return sys.getsizeof(x)
+
+
 def listpack(x):
     """
     >>> listpack(1)